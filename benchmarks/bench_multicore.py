@@ -0,0 +1,52 @@
+"""
+Throughput vs. worker count for multi-process capture.
+
+Writes a synthetic Ethernet/IPv4 pcap, then replays it through
+MultiCoreCapture (hash-partitioned pcap mode) with 1, 2, 4, ... workers.
+Rows go to a no-op store so the numbers show capture/decode/aggregate
+scaling rather than database speed.
+
+    python -m benchmarks.bench_multicore [--packets 400000] [--flows 2000] [--max-workers 8]
+"""
+import argparse
+import os
+import tempfile
+from benchmarks.traffic import write_synthetic_pcap
+from src.multicore import MultiCoreCapture
+from src.storage import StorageBackend
+
+class NullStore(StorageBackend):
+    def log_packets(self, rows):
+        return len(rows)
+
+    def log_flows(self, rows, update_rollups=False):
+        return len(rows)
+
+    def log_alerts(self, rows):
+        return len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=400000)
+    parser.add_argument("--flows", type=int, default=2000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pcap")
+        write_synthetic_pcap(path, args.packets, args.flows)
+
+        results = []
+        workers = 1
+        while workers <= args.max_workers:
+            result = MultiCoreCapture(workers, pcap_path=path, db_factory=NullStore).run()
+            results.append(result)
+            workers *= 2
+
+    base = results[0]['pps']
+    print("\nworkers  packets/s   speedup")
+    for result in results:
+        print(f"{result['workers']:>7}  {result['pps']:>9.0f}   {result['pps'] / base:>6.2f}x")
+
+if __name__ == "__main__":
+    main()
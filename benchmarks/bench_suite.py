@@ -0,0 +1,269 @@
+"""
+Reproducible benchmark suite with regression thresholds.
+
+Everything runs on synthetic traffic from benchmarks/traffic.py with fixed
+seeds, so two runs on the same machine measure the same work:
+
+  * pipeline  packets/s through packet_callback (decode + aggregate, no
+              storage), with and without the anomaly detector, best of
+              PIPELINE_RUNS
+  * writes    rows/s into the configured backend through log_packets() in
+              PacketWriter-sized batches, and through one-row log_packet()
+  * queries   dashboard/statistics query latency (median of --repeat runs)
+              once packet_logs holds each --rows tier
+
+Results go to a JSON file (--out). Each metric records which direction is
+better and how much worse than a baseline it may get before it counts as
+a regression (THRESHOLDS; latencies are noisier than throughput). With
+--baseline the run is compared metric by metric and the suite exits 1 if
+any metric regressed.
+
+    python -m benchmarks.bench_suite [--rows 1M,10M,100M] [--backend sqlite|mysql]
+        [--db-path bench.db] [--out results.json] [--baseline baseline.json]
+
+Tiers are filled through log_packets(), so the rollup tables are built
+as in a real capture; rows are spread over the FILL_DAYS days before the
+first fill. SQLite uses a temporary file unless --db-path names one to
+keep between runs (tiers it already holds are not filled again).
+--backend mysql uses the .env connection with DB_NAME set to --db-name,
+which must already exist: the suite writes millions of rows there, so
+never point it at a production database.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from benchmarks.traffic import TrafficSpec, generate, synthetic_rows
+
+FILL_DAYS = 30
+FILL_BATCH = 5000
+SINGLE_ROWS = 2000          # rows written one at a time by log_packet()
+PIPELINE_RUNS = 3           # best of, as other processes only ever slow a run down
+
+# Allowed slowdown against the baseline, by unit
+THRESHOLDS = {'packets/s': 0.10, 'rows/s': 0.15, 'ms': 0.25}
+
+def parse_count(text):
+    """'100k', '1M', '250000' -> int."""
+    text = text.strip().upper()
+    scale = {'K': 10 ** 3, 'M': 10 ** 6, 'G': 10 ** 9}.get(text[-1:], 1)
+    return int(float(text.rstrip('KMG')) * scale)
+
+def tier_name(rows):
+    for suffix, scale in (('G', 10 ** 9), ('M', 10 ** 6), ('k', 10 ** 3)):
+        if rows >= scale and rows % scale == 0:
+            return f"{rows // scale}{suffix}"
+    return str(rows)
+
+class Results:
+    def __init__(self, meta):
+        self.meta = meta
+        self.metrics = {}
+
+    def add(self, name, value, unit, **extra):
+        higher_is_better = unit != 'ms'
+        self.metrics[name] = dict(extra, value=round(value, 3), unit=unit,
+                                  higher_is_better=higher_is_better, threshold=THRESHOLDS[unit])
+        print(f"  {name:<44} {value:>12,.2f} {unit}")
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'meta': self.meta, 'metrics': self.metrics}, f, indent=2)
+
+def compare(current, baseline):
+    """[(name, baseline value, current value, change, regressed)] for metrics in both runs."""
+    rows = []
+    for name, metric in current.items():
+        old = baseline.get(name)
+        if not old or not old['value']:
+            continue
+        change = metric['value'] / old['value'] - 1
+        worse = -change if metric['higher_is_better'] else change
+        rows.append((name, old['value'], metric['value'], change, worse > metric['threshold']))
+    return rows
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+# --- PIPELINE ---
+def bench_pipeline(results, packets, seed, runs=PIPELINE_RUNS):
+    from src import backend_sniffer
+    from src.detection import AnomalyDetector
+    from src.fast_decode import decode_packet
+    spec = TrafficSpec(packets, flows=2000, seed=seed)
+    frames = [(ts, frame) for ts, frame in generate(spec)]
+
+    def replay(detector):
+        backend_sniffer.live_stats.reset()
+        for ts, frame in frames:
+            backend_sniffer.packet_callback(frame, None, 1, ts, len(frame), detector=detector)
+
+    def decode_only(_detector):
+        for _ts, frame in frames:
+            decode_packet(frame, 1, len(frame))
+
+    for name, run, detector in (("pipeline.packet_callback", replay, None),
+                                ("pipeline.packet_callback+detection", replay, AnomalyDetector(lambda alert: None)),
+                                # Decode alone, for telling a decoder regression from an aggregator one
+                                ("pipeline.decode_packet", decode_only, None)):
+        best = None
+        for _ in range(runs):
+            started = time.perf_counter()
+            run(detector)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results.add(name, len(frames) / best, 'packets/s', runs=runs)
+
+# --- STORAGE ---
+def stored_rows(db):
+    # Every row has weight 1, so the rollup totals count the rows without a COUNT(*)
+    return sum(packets for packets, _bytes in db.protocol_totals().values())
+
+def newest_row(db):
+    rows = db.recent_packets(1)
+    return rows[0][0].timestamp() if rows else None
+
+def fill(db, target, end, seed):
+    """Tops packet_logs up to `target` rows; returns rows/s for the rows added (None if none were)."""
+    from src.packet_writer import DEFAULT_BATCH_SIZE
+    have = stored_rows(db)
+    if have >= target:
+        print(f"  {tier_name(target)}: already holds {have:,} rows")
+        return None
+    missing = target - have
+    batch, written = [], 0
+    started = time.perf_counter()
+    # A new seed per tier, so topping up adds rows instead of repeating them
+    for row in synthetic_rows(missing, start=end - FILL_DAYS * 86400, end=end, seed=seed + have):
+        batch.append(row)
+        if len(batch) >= max(FILL_BATCH, DEFAULT_BATCH_SIZE):
+            written += db.log_packets(batch)
+            batch = []
+            print(f"\r  filling {tier_name(target)}: {have + written:,} rows", end="", flush=True)
+    if batch:
+        written += db.log_packets(batch)
+    print(f"\r  filling {tier_name(target)}: {have + written:,} rows")
+    return written / (time.perf_counter() - started)
+
+def bench_writes(results, db, end, seed):
+    from src.packet_writer import DEFAULT_BATCH_SIZE
+    rows = list(synthetic_rows(SINGLE_ROWS * 10, start=end - 3600, end=end, seed=seed))
+    started = time.perf_counter()
+    for i in range(0, len(rows), DEFAULT_BATCH_SIZE):
+        db.log_packets(rows[i:i + DEFAULT_BATCH_SIZE])
+    results.add("writes.log_packets", len(rows) / (time.perf_counter() - started), 'rows/s', batch=DEFAULT_BATCH_SIZE)
+    started = time.perf_counter()
+    for row in rows[:SINGLE_ROWS]:
+        db.log_packet(*row)
+    results.add("writes.log_packet", SINGLE_ROWS / (time.perf_counter() - started), 'rows/s')
+
+def dashboard_queries(end):
+    """(name, call) pairs: what the dashboard, Statistics page, Logs page and reports ask for."""
+    from src.log_query import parse_filter
+    day, week = end - 86400, end - 7 * 86400
+    return [
+        ("protocol_totals.all", lambda db: db.protocol_totals()),
+        ("protocol_totals.24h", lambda db: db.protocol_totals(day, end)),
+        ("top_talkers.src.24h", lambda db: db.top_talkers('src', day, end, limit=5)),
+        ("top_talkers.dst.7d", lambda db: db.top_talkers('dst', week, end, limit=10)),
+        ("traffic_series.1m.24h", lambda db: db.traffic_series(day, end, '1m')),
+        ("traffic_series.1h.30d", lambda db: db.traffic_series(end - FILL_DAYS * 86400, end, '1h')),
+        ("recent_packets", lambda db: db.recent_packets(100)),
+        ("search_logs.first_page", lambda db: db.search_logs('packet_logs')),
+        ("search_logs.proto", lambda db: db.search_logs('packet_logs', parse_filter(proto='UDP'))),
+        ("search_logs.cidr", lambda db: db.search_logs('packet_logs', parse_filter(ip='10.0.0.0/8'))),
+        ("search_logs.flags.24h", lambda db: db.search_logs('packet_logs', parse_filter(flags='PA', start=day, end=end))),
+    ]
+
+def bench_queries(results, db, tier, end, repeat):
+    for name, query in dashboard_queries(end):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query(db)
+            timings.append((time.perf_counter() - started) * 1000)
+        results.add(f"query.{tier}.{name}", statistics.median(timings), 'ms', max=round(max(timings), 3))
+
+def open_storage(args, tmp):
+    os.environ['DB_BACKEND'] = args.backend
+    if args.backend == 'sqlite':
+        os.environ['DB_PATH'] = args.db_path or os.path.join(tmp, "bench.db")
+    else:
+        os.environ['DB_NAME'] = args.db_name
+    from src.storage import get_storage
+    return get_storage()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="1M,10M,100M", help="packet_logs sizes to query at, e.g. 100k,1M")
+    parser.add_argument("--backend", choices=("sqlite", "mysql"), default="sqlite")
+    parser.add_argument("--db-path", help="SQLite file to fill and keep (default: a temporary one)")
+    parser.add_argument("--db-name", default="netguard_bench", help="MySQL database to fill (must exist)")
+    parser.add_argument("--packets", type=int, default=200000, help="frames for the pipeline benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip", action="append", default=[], choices=("pipeline", "writes", "queries"))
+    parser.add_argument("--out", default=f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    parser.add_argument("--baseline", help="earlier results to check for regressions")
+    args = parser.parse_args()
+    tiers = sorted(parse_count(text) for text in args.rows.split(','))
+
+    results = Results({
+        'started': datetime.now().isoformat(' ', 'seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'backend': args.backend,
+        'args': vars(args),
+    })
+
+    if "pipeline" not in args.skip:
+        print(f"Pipeline ({args.packets:,} frames):")
+        bench_pipeline(results, args.packets, args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = open_storage(args, tmp)
+        try:
+            end = newest_row(db) or time.time()
+            if "queries" not in args.skip:
+                for tier in tiers:
+                    name = tier_name(tier)
+                    print(f"Queries at {name} rows ({args.backend}):")
+                    rate = fill(db, tier, end, args.seed)
+                    if rate:
+                        results.add(f"fill.{name}", rate, 'rows/s')
+                    bench_queries(results, db, name, end, args.repeat)
+            # After the queries, so each tier holds exactly its rows on a fresh database
+            if "writes" not in args.skip:
+                print(f"Writes ({args.backend}):")
+                bench_writes(results, db, end, args.seed)
+        finally:
+            db.close()
+
+    results.save(args.out)
+    print(f"\nResults written to {args.out}.")
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows = compare(results.metrics, baseline['metrics'])
+    print(f"\nAgainst {args.baseline} ({baseline['meta'].get('commit') or 'unknown commit'}):")
+    for name, old, new, change, regressed in rows:
+        print(f"  {name:<44} {old:>12,.2f} -> {new:>12,.2f} {change * 100:+6.1f}%{'  REGRESSION' if regressed else ''}")
+    regressions = sum(regressed for *_, regressed in rows)
+    print(f"{regressions} regression(s) in {len(rows)} compared metrics.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Synthetic traffic for the benchmarks: reproducible Ethernet/IPv4 frames,
+pcap files and packet_logs rows.
+
+A TrafficSpec sets the packet count, the number of flows, the protocol mix,
+the packet sizes, the rate and any attacks mixed in. The same spec and
+seed always give the same bytes. Sizes are IP packet lengths:
+
+  * "imix"       the classic simple IMIX: 64/576/1500 bytes in a 7:4:1 ratio
+  * "64"         every packet the same size
+  * "64-1500"    uniform between the two
+
+Attacks (ATTACKS) are short bursts added on top of the traffic:
+syn_flood, horizontal_scan, vertical_scan and rate_spike, starting
+`attack_at` seconds in.
+
+    python -m benchmarks.traffic out.pcap [--packets 1000000] [--flows 5000]
+        [--mix tcp=80,udp=15,icmp=5] [--sizes imix] [--pps 10000] [--attack syn_flood]
+"""
+import argparse
+import heapq
+import random
+import socket
+import struct
+from collections import namedtuple
+from src.fast_decode import PROTO_TCP, PROTO_UDP, PROTO_ICMP, TCP_SYN, TCP_ACK
+
+BASE_TS = 1700000000.0
+ETHER_HEADER = b'\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00'
+IMIX = ((64, 7), (576, 4), (1500, 1))
+MIX_NAMES = {'tcp': PROTO_TCP, 'udp': PROTO_UDP, 'icmp': PROTO_ICMP}
+
+TrafficSpec = namedtuple('TrafficSpec', 'packets flows mix sizes pps attacks attack_at seed',
+                         defaults=(100000, 2000, 'tcp=80,udp=15,icmp=5', 'imix', 10000, (), 1.0, 1))
+
+# --- FRAMES / FILES ---
+def ip4(text):
+    return struct.unpack('!I', socket.inet_aton(text))[0]
+
+def ipv4_frame(src, dst, proto, sport, dport, flags=0, payload=b''):
+    if proto == PROTO_TCP:
+        l4 = struct.pack('!HHIIBBHHH', sport, dport, 0, 0, 0x50, flags, 65535, 0, 0)
+    elif proto == PROTO_UDP:
+        l4 = struct.pack('!HHHH', sport, dport, 8 + len(payload), 0)
+    else:
+        l4 = struct.pack('!BBHHH', 8, 0, 0, sport, dport)   # echo request: id, sequence
+    ip = struct.pack('!BBHHHBBHII', 0x45, 0, 20 + len(l4) + len(payload), 0, 0, 64, proto, 0, src, dst)
+    return ETHER_HEADER + ip + l4 + payload
+
+def write_pcap(path, packets):
+    """packets: iterable of (ts, frame), in time order. Returns the number written."""
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for ts, frame in packets:
+            f.write(struct.pack('<IIII', int(ts), int(ts % 1 * 1e6), len(frame), len(frame)))
+            f.write(frame)
+            count += 1
+    return count
+
+def merged(*streams):
+    """Time-ordered merge of (ts, frame) streams that are each already in time order."""
+    return heapq.merge(*streams, key=lambda packet: packet[0])
+
+# --- SPEC PARSING ---
+def parse_mix(text):
+    """'tcp=80,udp=15,icmp=5' -> [(proto, weight)]."""
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip().lower() not in MIX_NAMES:
+            raise ValueError(f"Unknown protocol '{name}' in mix (use {', '.join(MIX_NAMES)})")
+        mix.append((MIX_NAMES[name.strip().lower()], float(weight or 1)))
+    return mix
+
+def size_picker(text, rng):
+    """Callable returning the next IP packet length for a --sizes value."""
+    if text == 'imix':
+        sizes = [size for size, _ in IMIX]
+        weights = [weight for _, weight in IMIX]
+        return lambda: rng.choices(sizes, weights)[0]
+    low, _, high = text.partition('-')
+    if not high:
+        return lambda: int(low)
+    return lambda: rng.randint(int(low), int(high))
+
+def _flows(rng, count, mix):
+    protos = [proto for proto, _ in mix]
+    weights = [weight for _, weight in mix]
+    flows = []
+    for _ in range(count):
+        proto = rng.choices(protos, weights)[0]
+        dport = {PROTO_TCP: rng.choice((80, 443, 22, 3306)), PROTO_UDP: rng.choice((53, 123, 443))}.get(proto, 0)
+        flows.append((rng.getrandbits(32), rng.getrandbits(32), rng.randint(1024, 65535), dport, proto))
+    return flows
+
+# --- GENERATORS ---
+def flow_traffic(spec):
+    """Benign traffic: packets spread over spec.flows bidirectional flows, in time order."""
+    rng = random.Random(spec.seed)
+    flows = _flows(rng, spec.flows, parse_mix(spec.mix))
+    next_size = size_picker(spec.sizes, rng)
+    payloads = {}
+    for i in range(spec.packets):
+        src, dst, sport, dport, proto = flows[rng.randrange(len(flows))]
+        if i & 1:
+            src, dst, sport, dport = dst, src, dport, sport
+        header = 40 if proto == PROTO_TCP else 28
+        size = max(next_size() - header, 0)
+        payload = payloads.get(size)
+        if payload is None:
+            payload = payloads[size] = bytes(size)
+        yield BASE_TS + i / spec.pps, ipv4_frame(src, dst, proto, sport, dport, TCP_ACK | 0x08, payload)
+
+def background(rng, seconds, pps=200):
+    """A quiet LAN: established TCP sessions and DNS lookups between a few dozen hosts."""
+    clients = [ip4(f"10.0.0.{i}") for i in range(1, 40)]
+    servers = [ip4(f"172.16.0.{i}") for i in range(1, 10)]
+    for i in range(int(seconds * pps)):
+        ts = BASE_TS + i / pps
+        client, server = rng.choice(clients), rng.choice(servers)
+        if i % 10 == 0:
+            yield ts, ipv4_frame(client, server, PROTO_UDP, 40000 + i % 1000, 53)
+            yield ts, ipv4_frame(server, client, PROTO_UDP, 53, 40000 + i % 1000)
+        else:
+            flags = TCP_ACK | 0x08
+            yield ts, ipv4_frame(client, server, PROTO_TCP, 50000 + client % 1000, 443, flags)
+            yield ts, ipv4_frame(server, client, PROTO_TCP, 443, 50000 + client % 1000, flags)
+
+def generate(spec):
+    """Background plus the spec's attacks, as one time-ordered (ts, frame) stream."""
+    rng = random.Random(spec.seed + 1)
+    start = BASE_TS + spec.attack_at
+    return merged(flow_traffic(spec), *(ATTACKS[name](rng, start) for name in spec.attacks))
+
+def write_synthetic_pcap(path, packets, flows, seed=1, **spec):
+    """The pcap the throughput benchmarks replay; returns the number of frames."""
+    return write_pcap(path, generate(TrafficSpec(packets, flows, seed=seed, **spec)))
+
+def synthetic_rows(count, flows=5000, mix='tcp=80,udp=15,icmp=5', sizes='imix', start=None, end=None, seed=1):
+    """
+    packet_logs rows (see StorageBackend.log_packets) without building
+    frames, for filling a database; timestamps are evenly spread over
+    [start, end).
+    """
+    rng = random.Random(seed)
+    flow_list = [(socket.inet_ntoa(struct.pack('!I', src)), socket.inet_ntoa(struct.pack('!I', dst)), proto)
+                 for src, dst, _sport, _dport, proto in _flows(rng, flows, parse_mix(mix))]
+    next_size = size_picker(sizes, rng)
+    step = (end - start) / max(count, 1)
+    for i in range(count):
+        src, dst, proto = flow_list[rng.randrange(len(flow_list))]
+        if i & 1:
+            src, dst = dst, src
+        yield (src, dst, proto, next_size(), (TCP_ACK | 0x08) if proto == PROTO_TCP else 0, start + i * step, 1)
+
+# --- ATTACKS (each one a time-ordered list starting at `start`) ---
+def syn_flood(rng, start):
+    victim = ip4("172.16.0.1")
+    return [(start + i / 2000, ipv4_frame(rng.getrandbits(32), victim, PROTO_TCP, rng.randrange(1024, 65535), 80, TCP_SYN))
+            for i in range(6000)]
+
+def horizontal_scan(rng, start):
+    scanner = ip4("10.9.9.9")
+    return [(start + i / 100, ipv4_frame(scanner, ip4(f"172.16.1.{i}"), PROTO_TCP, 61000, 22, TCP_SYN))
+            for i in range(1, 200)]
+
+def vertical_scan(rng, start):
+    scanner, target = ip4("10.9.9.8"), ip4("172.16.0.2")
+    return [(start + port / 200, ipv4_frame(scanner, target, PROTO_UDP, 61001, port))
+            for port in range(1, 300)]
+
+def rate_spike(rng, start):
+    # A host with a steady 50 packets/s baseline that suddenly sends 2000/s
+    host, peer = ip4("10.0.0.200"), ip4("172.16.0.3")
+    steady = [(start - 20 + i / 50, ipv4_frame(host, peer, PROTO_TCP, 55555, 443, TCP_ACK)) for i in range(50 * 40)]
+    burst = [(start + 20 + i / 2000, ipv4_frame(host, peer, PROTO_TCP, 55555, 443, TCP_ACK)) for i in range(2000 * 4)]
+    return steady + burst
+
+ATTACKS = {
+    'syn_flood': syn_flood,
+    'horizontal_scan': horizontal_scan,
+    'vertical_scan': vertical_scan,
+    'rate_spike': rate_spike,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--packets", type=int, default=1000000)
+    parser.add_argument("--flows", type=int, default=5000)
+    parser.add_argument("--mix", default='tcp=80,udp=15,icmp=5')
+    parser.add_argument("--sizes", default='imix')
+    parser.add_argument("--pps", type=float, default=10000)
+    parser.add_argument("--attack", action="append", default=[], choices=sorted(ATTACKS))
+    parser.add_argument("--attack-at", type=float, default=1.0, help="seconds into the capture")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    spec = TrafficSpec(args.packets, args.flows, args.mix, args.sizes, args.pps, tuple(args.attack), args.attack_at, args.seed)
+    count = write_pcap(args.path, generate(spec))
+    print(f"{count} frames written to {args.path}.")
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,23 @@ from ttkbootstrap.constants import *
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.pyplot as plt
 import threading
-import pandas as pd
+import time
 from collections import deque
 from datetime import datetime
 import os
 
-# PDF Library
-from fpdf import FPDF
-from fpdf.enums import XPos, YPos  # <--- NEW: Required for modern PDF generation
-
 # Import our custom modules
-from src.database import DBManager
-from src.backend_sniffer import start_sniffing_thread, stop_sniffer_flag
+from src.storage import get_storage
+from src.backend_sniffer import start_sniffing_thread, start_ingest_thread, stop_sniffer_flag, live_stats, capture_mode
+from src.multicore import start_multicore_capture
+from src.daemon import read_state, decode_state
+from src.metrics import REGISTRY, start_metrics
+from src.capture_config import load_profiles, save_profile, compile_program, CaptureProfile, CaptureConfigError
+from scapy.all import get_if_list
+from src.fast_decode import proto_name, tcp_flags_str, PROTO_NAMES
+from src.export import export_logs, export_pdf, ExportCancelled
+from src.retention import load_policies, describe, start_retention
+from src.log_query import parse_filter, FilterError, PAGE_SIZE as LOGS_PAGE_SIZE
 
 # --- CONFIGURATION ---
 COLOR_BG = "#1e1e2f"        
@@ -26,6 +31,30 @@ COLOR_ACCENT = "#e14eca"
 COLOR_SUCCESS = "#00f2c3"   
 COLOR_WARNING = "#ff8d72"   
 
+# Statistics page time ranges (seconds back from now, None = all time)
+STATS_RANGES = {
+    "Last Hour": 3600,
+    "Last 24 Hours": 86400,
+    "Last 7 Days": 7 * 86400,
+    "Last 30 Days": 30 * 86400,
+    "All Time": None,
+}
+
+# Dashboard refresh: data is fetched off the Tk thread every DASHBOARD_REFRESH_MS
+DASHBOARD_REFRESH_MS = int(os.getenv('DASHBOARD_REFRESH_MS', '500'))
+LIVE_SECONDS = 60           # seconds of packets/s history on the live graph
+FRAME_TIME_BUDGET = 0.050   # a dashboard frame slower than this is reported
+FRAME_REPORT_EVERY = 120    # frames between frame-time log lines
+GUI_FRAME = REGISTRY.histogram('gui_frame_seconds', "Dashboard frame render time")
+
+# Logs page columns for per-packet rows and for flow rows
+PACKET_COLUMNS = ("Time", "Source", "Destination", "Protocol", "Length", "Flags")
+FLOW_COLUMNS = ("Last Seen", "Source", "Destination", "Protocol", "Packets", "Bytes", "Flags")
+
+# Logs page: keyset pages kept in the Treeview at once (pages scrolled out
+# of this window are dropped and fetched again when scrolled back to)
+LOGS_MAX_PAGES = 5
+
 # Styles
 plt.style.use('dark_background')
 plt.rcParams['figure.facecolor'] = COLOR_CARD
@@ -35,30 +64,6 @@ plt.rcParams['text.color'] = 'white'
 plt.rcParams['axes.spines.top'] = False
 plt.rcParams['axes.spines.right'] = False
 
-class PDFReport(FPDF):
-    def header(self):
-        # Professional Dark Header
-        self.set_fill_color(30, 30, 47) # Dark Navy
-        self.rect(0, 0, 210, 40, 'F')
-        
-        # Logo / Title Text (Switched to Helvetica to fix warning)
-        self.set_font('Helvetica', 'B', 20)
-        self.set_text_color(255, 255, 255)
-        # Updated positioning syntax
-        self.cell(0, 15, 'NetGuard Security Report', new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-        
-        # Timestamp
-        self.set_font('Helvetica', 'I', 10)
-        self.set_text_color(200, 200, 200)
-        self.cell(0, 10, f'Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}', new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-        self.ln(10)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Helvetica', 'I', 8)
-        self.set_text_color(128, 128, 128)
-        self.cell(0, 10, f'Page {self.page_no()}', new_x=XPos.RIGHT, new_y=YPos.TOP, align='C')
-
 class NetGuardApp(ttk.Window):
     def __init__(self):
         super().__init__(themename="superhero")
@@ -67,13 +72,20 @@ class NetGuardApp(ttk.Window):
         self.configure(bg=COLOR_BG)
         
         # Database & State
-        self.gui_db = DBManager()
+        self.gui_db = get_storage()
         self.sniffer_thread = None
         self.is_running = False
         self.current_page = "dashboard" 
         self.update_job = None
-        self.traffic_data = deque([0]*20, maxlen=20) 
         self.pages = {} 
+        # Dashboard render state (see render_dashboard)
+        self.closing = threading.Event()
+        self.render_pending = False
+        self.frame_times = deque(maxlen=FRAME_REPORT_EVERY)
+        self.donut_shares = None
+        self.last_recent = None
+        self.status_base = "Status: MONITORING ACTIVE"
+        self.retention = None
 
         # Init UI
         self.setup_sidebar()
@@ -83,9 +95,20 @@ class NetGuardApp(ttk.Window):
         self.build_dashboard_page()
         self.build_statistics_page()
         self.build_logs_page()
+        self.build_alerts_page()
         self.build_settings_page()
         self.show_page("dashboard")
+        # A headless capture (python -m src live) is running: watch it instead of capturing
+        self.daemon = read_state()
+        if self.daemon:
+            self.attach_daemon()
+        else:
+            # One-off scan so the cards continue from what is already stored
+            live_stats.seed({proto_name(p): totals for p, totals in self.gui_db.protocol_totals().items()})
+            # The daemon runs its own retention job; otherwise this process does
+            self.retention = start_retention()
         self.update_app_loop()
+        threading.Thread(target=self.dashboard_fetch_loop, name="DashboardFetch", daemon=True).start()
 
     # --- SIDEBAR & NAV ---
     def setup_sidebar(self):
@@ -100,6 +123,7 @@ class NetGuardApp(ttk.Window):
         self.create_nav_item(sidebar, "dashboard", "📊  Dashboard")
         self.create_nav_item(sidebar, "statistics", "📉  Statistics")
         self.create_nav_item(sidebar, "logs", "🛡  Security Logs")
+        self.create_nav_item(sidebar, "alerts", "🚨  Alerts")
         self.create_nav_item(sidebar, "settings", "⚙️  Settings")
 
         ctrl_panel = tk.Frame(sidebar, bg=COLOR_CARD)
@@ -134,6 +158,7 @@ class NetGuardApp(ttk.Window):
 
         if page_name == "logs": self.refresh_logs_table()
         if page_name == "statistics": self.refresh_stats_graph()
+        if page_name == "alerts": self.refresh_alerts_table()
 
     # --- PAGES ---
     def build_dashboard_page(self):
@@ -150,11 +175,20 @@ class NetGuardApp(ttk.Window):
 
         row2 = tk.Frame(page, bg=COLOR_BG)
         row2.pack(fill=BOTH, expand=True, pady=(0, 20))
-        frm_line = self.create_content_frame(row2, "Traffic Volume (Last 10s)")
+        frm_line = self.create_content_frame(row2, f"Traffic Volume (Last {LIVE_SECONDS}s)")
         frm_line.pack(side=LEFT, fill=BOTH, expand=True, padx=(0, 10))
         self.fig_live, self.ax_live = plt.subplots(figsize=(5,3))
         self.cvs_live = FigureCanvasTkAgg(self.fig_live, master=frm_line)
         self.cvs_live.get_tk_widget().pack(fill=BOTH, expand=True)
+        # Persistent animated artists: each tick only updates their data and
+        # blits the plot area over a cached background (axes, grid, title)
+        self.ax_live.set_title("Traffic Volume (Packets / s)", color="gray", fontsize=8)
+        self.ax_live.set_xlim(0, LIVE_SECONDS - 1)
+        self.ax_live.set_ylim(0, 10)
+        self.live_line, = self.ax_live.plot(range(LIVE_SECONDS), [0] * LIVE_SECONDS, color=COLOR_ACCENT, linewidth=2, animated=True)
+        self.live_fill = self.ax_live.fill_between(range(LIVE_SECONDS), 0, [0] * LIVE_SECONDS, color=COLOR_ACCENT, alpha=0.1, animated=True)
+        self.live_bg = None
+        self.cvs_live.mpl_connect('draw_event', self.on_live_draw)
 
         frm_donut = self.create_content_frame(row2, "Protocol Share")
         frm_donut.pack(side=RIGHT, fill=BOTH, expand=True, padx=(10, 0))
@@ -170,8 +204,18 @@ class NetGuardApp(ttk.Window):
     def build_statistics_page(self):
         page = tk.Frame(self.container, bg=COLOR_BG)
         self.pages['statistics'] = page
-        tk.Label(page, text="Deep Traffic Analysis", bg=COLOR_BG, fg="white", font=("Segoe UI", 18, "bold")).pack(anchor="w", pady=20)
-        frm_graph = self.create_content_frame(page, "Top 5 Source IP Addresses")
+        header = tk.Frame(page, bg=COLOR_BG)
+        header.pack(fill=X, pady=20)
+        tk.Label(header, text="Deep Traffic Analysis", bg=COLOR_BG, fg="white", font=("Segoe UI", 18, "bold")).pack(side=LEFT)
+        self.stats_range = ttk.Combobox(header, values=list(STATS_RANGES), state="readonly", width=15)
+        self.stats_range.set("Last 24 Hours")
+        self.stats_range.bind("<<ComboboxSelected>>", lambda e: self.refresh_stats_graph())
+        self.stats_range.pack(side=RIGHT)
+        self.stats_view = ttk.Combobox(header, values=["Source IPs", "Conversations", "Live Estimate"], state="readonly", width=15)
+        self.stats_view.set("Source IPs")
+        self.stats_view.bind("<<ComboboxSelected>>", lambda e: self.refresh_stats_graph())
+        self.stats_view.pack(side=RIGHT, padx=10)
+        frm_graph = self.create_content_frame(page, "Top 5 Talkers")
         frm_graph.pack(fill=BOTH, expand=True)
         self.fig_stats, self.ax_stats = plt.subplots(figsize=(8, 4))
         self.cvs_stats = FigureCanvasTkAgg(self.fig_stats, master=frm_graph)
@@ -184,11 +228,65 @@ class NetGuardApp(ttk.Window):
         header.pack(fill=X, pady=20)
         tk.Label(header, text="Security Audit Logs", bg=COLOR_BG, fg="white", font=("Segoe UI", 18, "bold")).pack(side=LEFT)
         ttk.Button(header, text="🔃 Refresh Data", bootstyle="info-outline", command=self.refresh_logs_table).pack(side=RIGHT)
-        
-        cols = ("Time", "Source", "Destination", "Protocol", "Length")
-        self.tree = ttk.Treeview(page, columns=cols, show='headings', bootstyle="dark")
-        for col in cols: self.tree.heading(col, text=col)
-        self.tree.pack(fill=BOTH, expand=True)
+        # Flows are the default view when packet rows aren't being stored
+        self.logs_view = ttk.Combobox(header, values=["Packets", "Flows"], state="readonly", width=10)
+        self.logs_view.set("Flows" if capture_mode() == 'flows' else "Packets")
+        self.logs_view.bind("<<ComboboxSelected>>", lambda e: self.refresh_logs_table())
+        self.logs_view.pack(side=RIGHT, padx=10)
+
+        # Filters run in the database (see src/log_query.py), not on the loaded rows
+        filters = tk.Frame(page, bg=COLOR_BG)
+        filters.pack(fill=X, pady=(0, 10))
+        self.var_log_ip = tk.StringVar()
+        self.var_log_proto = tk.StringVar(value="Any")
+        self.var_log_flags = tk.StringVar()
+        self.var_log_range = tk.StringVar(value="All Time")
+        fields = [
+            ("IP / CIDR", ttk.Entry(filters, textvariable=self.var_log_ip, width=20)),
+            ("Protocol", ttk.Combobox(filters, textvariable=self.var_log_proto, values=["Any"] + list(PROTO_NAMES.values()), state="readonly", width=8)),
+            ("TCP Flags", ttk.Entry(filters, textvariable=self.var_log_flags, width=6)),
+            ("Range", ttk.Combobox(filters, textvariable=self.var_log_range, values=list(STATS_RANGES), state="readonly", width=14)),
+        ]
+        for label, widget in fields:
+            tk.Label(filters, text=label, bg=COLOR_BG, fg="#a9a9a9").pack(side=LEFT, padx=(0, 5))
+            widget.pack(side=LEFT, padx=(0, 15))
+            widget.bind("<Return>", lambda e: self.refresh_logs_table())
+        ttk.Button(filters, text="🔍 Apply", bootstyle="info", command=self.refresh_logs_table).pack(side=LEFT)
+        self.lbl_logs_info = tk.Label(filters, text="", bg=COLOR_BG, fg="#a9a9a9")
+        self.lbl_logs_info.pack(side=RIGHT)
+
+        body = tk.Frame(page, bg=COLOR_BG)
+        body.pack(fill=BOTH, expand=True)
+        self.tree = ttk.Treeview(body, columns=FLOW_COLUMNS, show='headings', bootstyle="dark")
+        self.logs_scroll = ttk.Scrollbar(body, orient=VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_logs_scroll)
+        self.logs_scroll.pack(side=RIGHT, fill=Y)
+        self.tree.pack(side=LEFT, fill=BOTH, expand=True)
+
+        # Paging state: pages are (newest id, oldest id, item ids), newest page first
+        self.logs_db = None
+        self.logs_pages = deque()
+        self.logs_generation = 0
+        self.logs_loading = False     # a fetch thread is running (they share logs_db, so one at a time)
+        self.logs_more_older = False
+        self.logs_more_newer = False
+        self.logs_filter = None
+        self.logs_sort = None
+
+    def build_alerts_page(self):
+        page = tk.Frame(self.container, bg=COLOR_BG)
+        self.pages['alerts'] = page
+        header = tk.Frame(page, bg=COLOR_BG)
+        header.pack(fill=X, pady=20)
+        tk.Label(header, text="Detected Anomalies", bg=COLOR_BG, fg="white", font=("Segoe UI", 18, "bold")).pack(side=LEFT)
+        ttk.Button(header, text="🔃 Refresh Data", bootstyle="info-outline", command=self.refresh_alerts_table).pack(side=RIGHT)
+
+        cols = ("Time", "Type", "Severity", "Source", "Destination", "Details")
+        self.alerts_tree = ttk.Treeview(page, columns=cols, show='headings', bootstyle="dark")
+        for col in cols: self.alerts_tree.heading(col, text=col)
+        self.alerts_tree.column("Details", width=360)
+        self.alerts_tree.tag_configure("high", foreground=COLOR_WARNING)
+        self.alerts_tree.pack(fill=BOTH, expand=True)
 
     def build_settings_page(self):
         page = tk.Frame(self.container, bg=COLOR_BG)
@@ -197,8 +295,62 @@ class NetGuardApp(ttk.Window):
         card_exp = self.create_content_frame(page, "Data Management")
         card_exp.pack(fill=X, pady=10)
         
-        ttk.Button(card_exp, text="📄 Generate PDF Report", bootstyle="warning", command=self.export_pdf).pack(anchor="w", padx=20, pady=10)
-        ttk.Button(card_exp, text="🗑  Flush/Clear Database", bootstyle="danger", command=self.flush_db).pack(anchor="w", padx=20, pady=10)
+        # Exports run on a worker thread; one at a time
+        form = tk.Frame(card_exp, bg=COLOR_CARD)
+        form.pack(fill=X, padx=20, pady=(10, 0))
+        self.var_export_range = tk.StringVar(value="Last 24 Hours")
+        self.var_export_table = tk.StringVar(value="Packets")
+        tk.Label(form, text="Range", bg=COLOR_CARD, fg="#a9a9a9").pack(side=LEFT, padx=(0, 5))
+        ttk.Combobox(form, textvariable=self.var_export_range, values=list(STATS_RANGES), state="readonly", width=14).pack(side=LEFT, padx=(0, 15))
+        tk.Label(form, text="Raw Data", bg=COLOR_CARD, fg="#a9a9a9").pack(side=LEFT, padx=(0, 5))
+        ttk.Combobox(form, textvariable=self.var_export_table, values=["Packets", "Flows"], state="readonly", width=8).pack(side=LEFT)
+        buttons = tk.Frame(card_exp, bg=COLOR_CARD)
+        buttons.pack(fill=X, padx=20, pady=10)
+        ttk.Button(buttons, text="📄 Generate PDF Report", bootstyle="warning", command=self.export_report).pack(side=LEFT, padx=(0, 10))
+        ttk.Button(buttons, text="📊 Export CSV / Parquet", bootstyle="warning", command=self.export_raw).pack(side=LEFT)
+        status = tk.Frame(card_exp, bg=COLOR_CARD)
+        status.pack(fill=X, padx=20)
+        self.export_progress = ttk.Progressbar(status, maximum=1.0, bootstyle="warning-striped", length=300)
+        self.export_progress.pack(side=LEFT)
+        self.btn_export_cancel = ttk.Button(status, text="✖ Cancel", bootstyle="secondary", state=DISABLED, command=self.cancel_export)
+        self.btn_export_cancel.pack(side=LEFT, padx=10)
+        self.lbl_export = tk.Label(status, text="", bg=COLOR_CARD, fg="#a9a9a9")
+        self.lbl_export.pack(side=LEFT)
+        self.export_cancel = None
+
+        self.btn_import = ttk.Button(card_exp, text="📂 Import PCAP/PCAPNG File", bootstyle="info", command=self.import_pcap)
+        self.btn_import.pack(anchor="w", padx=20, pady=10)
+        self.btn_flush = ttk.Button(card_exp, text="🗑  Flush/Clear Database", bootstyle="danger", command=self.flush_db)
+        self.btn_flush.pack(anchor="w", padx=20, pady=10)
+        tk.Label(card_exp, text=f"Retention: {describe(load_policies())} (RETAIN_* in .env)",
+                 bg=COLOR_CARD, fg="#a9a9a9").pack(anchor="w", padx=20, pady=(0, 10))
+
+        # Capture profile: applied the next time monitoring starts or a file is imported
+        card_cap = self.create_content_frame(page, "Capture Profile")
+        card_cap.pack(fill=X, pady=10)
+        self.profiles, active = load_profiles()
+        self.var_profile = tk.StringVar(value=active if active in self.profiles else 'default')
+        self.var_iface = tk.StringVar()
+        self.var_bpf = tk.StringVar()
+        self.var_snaplen = tk.StringVar()
+        self.var_promisc = tk.BooleanVar()
+        form = tk.Frame(card_cap, bg=COLOR_CARD)
+        form.pack(fill=X)
+        self.cmb_profile = ttk.Combobox(form, textvariable=self.var_profile, values=list(self.profiles), width=20)
+        self.cmb_profile.bind("<<ComboboxSelected>>", lambda e: self.load_profile_fields())
+        fields = [
+            ("Profile", self.cmb_profile),
+            ("Interface", ttk.Combobox(form, textvariable=self.var_iface, values=[""] + get_if_list(), width=20)),
+            ("BPF Filter", ttk.Entry(form, textvariable=self.var_bpf, width=50)),
+            ("Snaplen (bytes)", ttk.Entry(form, textvariable=self.var_snaplen, width=10)),
+            ("Promiscuous", ttk.Checkbutton(form, variable=self.var_promisc, bootstyle="round-toggle")),
+        ]
+        for row, (label, widget) in enumerate(fields):
+            tk.Label(form, text=label, bg=COLOR_CARD, fg="#a9a9a9").grid(row=row, column=0, sticky="w", padx=20, pady=4)
+            widget.grid(row=row, column=1, sticky="w", pady=4)
+        self.btn_save_profile = ttk.Button(card_cap, text="💾 Save & Activate", bootstyle="success", command=self.save_capture_profile)
+        self.btn_save_profile.pack(anchor="w", padx=20, pady=10)
+        self.load_profile_fields()
 
     # --- HELPERS ---
     def create_stat_card(self, parent, title, value, color):
@@ -221,7 +373,13 @@ class NetGuardApp(ttk.Window):
             self.lbl_status.config(text="Status: MONITORING ACTIVE", fg=COLOR_SUCCESS)
             self.btn_start.config(state=DISABLED)
             self.btn_stop.config(state=NORMAL)
-            self.sniffer_thread = threading.Thread(target=start_sniffing_thread, daemon=True)
+            # CAPTURE_WORKERS > 1 switches to multi-process AF_PACKET fanout capture
+            workers = int(os.getenv('CAPTURE_WORKERS', '1'))
+            if workers > 1:
+                self.sniffer_thread = threading.Thread(target=start_multicore_capture, daemon=True,
+                                                       kwargs={'workers': workers})
+            else:
+                self.sniffer_thread = threading.Thread(target=start_sniffing_thread, daemon=True)
             self.sniffer_thread.start()
 
     def stop_sniffing(self):
@@ -232,187 +390,468 @@ class NetGuardApp(ttk.Window):
             self.btn_start.config(state=NORMAL)
             self.btn_stop.config(state=DISABLED)
 
+    def import_pcap(self):
+        if self.is_running:
+            messagebox.showwarning("Busy", "Stop monitoring before importing a capture file.")
+            return
+        file_path = filedialog.askopenfilename(filetypes=[("Capture Files", "*.pcap *.pcapng *.cap"), ("All Files", "*.*")])
+        if not file_path: return
+        realtime = messagebox.askyesno("Replay Mode", "Replay at the original capture rate?\n(No = ingest as fast as possible)")
+
+        self.is_running = True
+        self.lbl_status.config(text="Status: REPLAYING CAPTURE FILE", fg=COLOR_SUCCESS)
+        self.btn_start.config(state=DISABLED)
+        self.btn_stop.config(state=NORMAL)
+        self.sniffer_thread = threading.Thread(target=self.run_ingest, args=(file_path, realtime), daemon=True)
+        self.sniffer_thread.start()
+
+    def run_ingest(self, file_path, realtime):
+        # Runs on the worker thread; hand the result back to Tk via after()
+        stats = start_ingest_thread(file_path, realtime)
+        self.after(0, self.on_ingest_done, stats)
+
+    def on_ingest_done(self, stats):
+        self.stop_sniffing()
+        messagebox.showinfo("Import Complete", f"{stats['packets']} packets ingested ({stats['pps']:.0f} packets/s), "
+                                               f"{stats['filtered']} excluded by the capture filter.")
+
+    # --- DAEMON VIEWER (see src/daemon.py) ---
+    def attach_daemon(self):
+        """Read-only: the daemon owns capture, so everything that would start, stop or purge it is disabled."""
+        self.status_base = (f"Status: VIEWING DAEMON (pid {self.daemon['pid']}, {self.daemon['mode']}, "
+                            f"profile '{self.daemon['profile']}')  |  READ ONLY")
+        self.lbl_status.config(text=self.status_base, fg=COLOR_ACCENT)
+        for btn in (self.btn_start, self.btn_stop, self.btn_import, self.btn_flush, self.btn_save_profile):
+            btn.config(state=DISABLED)
+        print(f"[GUI] Attached to capture daemon pid {self.daemon['pid']} (read-only).")
+
+    def detach_daemon(self):
+        self.daemon = None
+        self.status_base = "Status: MONITORING ACTIVE"
+        self.lbl_status.config(text="Status: DAEMON STOPPED", fg=COLOR_WARNING)
+        for btn in (self.btn_start, self.btn_import, self.btn_flush, self.btn_save_profile):
+            btn.config(state=NORMAL)
+        if self.retention is None:
+            self.retention = start_retention()
+        print("[GUI] Capture daemon gone; local capture controls enabled again.")
+
     def update_app_loop(self):
-        if self.is_running and self.current_page == "dashboard":
-            self.update_dashboard_data()
+        # The dashboard has its own faster loop (dashboard_fetch_loop)
+        if (self.is_running or self.daemon) and self.current_page == "alerts":
+            self.refresh_alerts_table()
         if self.winfo_exists(): self.after(5000, self.update_app_loop)
 
-    def update_dashboard_data(self):
+    # --- DASHBOARD RENDERING ---
+    def dashboard_fetch_loop(self):
+        """
+        Worker thread: snapshots the live aggregates every DASHBOARD_REFRESH_MS
+        and hands them to the Tk thread with after(). At most one frame is
+        queued at a time, so a slow render skips ticks instead of piling up.
+        """
+        while not self.closing.wait(DASHBOARD_REFRESH_MS / 1000):
+            if self.daemon:
+                # Viewer: the daemon's aggregates replace ours on every tick
+                self.daemon = read_state()
+                if not self.daemon:
+                    self.after(0, self.detach_daemon)
+                    continue
+                live_stats.load_merged([decode_state(self.daemon['stats'])])
+            elif not self.is_running:
+                continue
+            if self.current_page != "dashboard" or self.render_pending:
+                continue
+            snap = live_stats.snapshot(window=10, tail=5)
+            snap['series'] = live_stats.rate_series(LIVE_SECONDS)
+            self.render_pending = True
+            try:
+                self.after(0, self.render_dashboard, snap)
+            except RuntimeError:
+                break   # Main loop gone (window closed)
+
+    def render_dashboard(self, snap):
+        started = time.perf_counter()
         try:
-            # 1. Update KPI Cards (Total)
-            self.gui_db.cursor.execute("SELECT COUNT(*) FROM packet_logs")
-            result = self.gui_db.cursor.fetchone()
-            total = result[0] if result else 0
-            self.card_total.config(text=str(total))
-            
-            # Count TCP/UDP with Robust TRIM/UPPER checks
-            self.gui_db.cursor.execute("SELECT COUNT(*) FROM packet_logs WHERE UPPER(TRIM(protocol)) = 'TCP'")
-            tcp_count = self.gui_db.cursor.fetchone()[0]
-            self.card_tcp.config(text=str(tcp_count))
-
-            self.gui_db.cursor.execute("SELECT COUNT(*) FROM packet_logs WHERE UPPER(TRIM(protocol)) = 'UDP'")
-            udp_count = self.gui_db.cursor.fetchone()[0]
-            self.card_udp.config(text=str(udp_count))
-            
-            # 2. Update Donut Chart
-            self.gui_db.cursor.execute("SELECT UPPER(TRIM(protocol)), COUNT(*) FROM packet_logs GROUP BY UPPER(TRIM(protocol))")
-            data = self.gui_db.cursor.fetchall()
-            df = pd.DataFrame(data, columns=['protocol', 'count'])
-            
-            self.ax_donut.clear()
-            if not df.empty:
-                self.ax_donut.pie(df['count'], labels=df['protocol'], colors=[COLOR_ACCENT, COLOR_SUCCESS, COLOR_WARNING], autopct='%1.1f%%')
-                self.ax_donut.add_artist(plt.Circle((0,0), 0.70, fc=COLOR_CARD))
-            self.cvs_donut.draw()
-
-            # 3. Update Moving Line Graph
-            query = "SELECT COUNT(*) FROM packet_logs WHERE captured_at >= NOW() - INTERVAL 10 SECOND"
-            self.gui_db.cursor.execute(query)
-            count_last = self.gui_db.cursor.fetchone()[0]
-
-            self.traffic_data.append(count_last)
-            self.ax_live.clear()
-            self.ax_live.plot(self.traffic_data, color=COLOR_ACCENT, linewidth=2, marker='o')
-            self.ax_live.fill_between(range(len(self.traffic_data)), 0, self.traffic_data, color=COLOR_ACCENT, alpha=0.1)
-            self.ax_live.set_title("Traffic Volume (Packets / 10s)", color="gray", fontsize=8)
+            self.update_dashboard_data(snap)
+        finally:
+            self.render_pending = False
+        elapsed = time.perf_counter() - started
+        self.frame_times.append(elapsed)
+        GUI_FRAME.observe(elapsed)
+        if len(self.frame_times) == FRAME_REPORT_EVERY:
+            times = sorted(self.frame_times)
+            median, worst = times[len(times) // 2] * 1000, times[-1] * 1000
+            print(f"[GUI] Dashboard frame time: median {median:.1f} ms, max {worst:.1f} ms over {len(times)} frames"
+                  f"{'' if median <= FRAME_TIME_BUDGET * 1000 else ' (over budget)'}.")
+            self.frame_times.clear()
+
+    def on_live_draw(self, event):
+        # A full draw (first show, resize, new y-limit) refreshes the cached background
+        self.live_bg = self.cvs_live.copy_from_bbox(self.ax_live.bbox)
+        self.ax_live.draw_artist(self.live_fill)
+        self.ax_live.draw_artist(self.live_line)
+
+    def update_live_graph(self, series):
+        self.live_line.set_ydata(series)
+        self.live_fill.set_verts([[(0, 0)] + list(enumerate(series)) + [(len(series) - 1, 0)]])
+        top = self.ax_live.get_ylim()[1]
+        peak = max(series)
+        # Rescale only when the data leaves the axis (or uses under a third of it)
+        if peak > top or (top > 10 and peak < top / 3):
+            self.ax_live.set_ylim(0, max(10, peak * 1.5))
+            self.cvs_live.draw()
+            return
+        if self.live_bg is None:
             self.cvs_live.draw()
+            return
+        self.cvs_live.restore_region(self.live_bg)
+        self.ax_live.draw_artist(self.live_fill)
+        self.ax_live.draw_artist(self.live_line)
+        self.cvs_live.blit(self.ax_live.bbox)
+
+    def update_dashboard_data(self, snap):
+        try:
+            # Everything comes from the in-memory aggregates kept by the capture
+            # side, so a tick never touches packet_logs.
+            protocols = snap['protocols']
+
+            # 1. Update KPI Cards (Total)
+            self.card_total.config(text=str(snap['total_packets']))
+            self.card_tcp.config(text=str(protocols.get('TCP', 0)))
+            self.card_udp.config(text=str(protocols.get('UDP', 0)))
+
+            # Load shedding: counts are scaled estimates while sampling is on
+            if snap['sample_weight'] > 1:
+                self.lbl_status.config(text=f"{self.status_base}  |  OVERLOAD: SAMPLING 1-in-{snap['sample_weight']} "
+                                            f"({snap['shed']} packets shed, counts estimated)", fg=COLOR_WARNING)
+            elif snap['shed']:
+                self.lbl_status.config(text=f"{self.status_base}  |  {snap['shed']} packets shed earlier (counts estimated)",
+                                       fg=COLOR_SUCCESS)
             
+            # 2. Update Donut Chart (a full redraw, so only when the shown percentages move)
+            total = sum(protocols.values())
+            shares = tuple((proto, round(100 * count / total)) for proto, count in protocols.items()) if total else ()
+            if shares != self.donut_shares:
+                self.donut_shares = shares
+                self.ax_donut.clear()
+                if protocols:
+                    self.ax_donut.pie(list(protocols.values()), labels=list(protocols.keys()), colors=[COLOR_ACCENT, COLOR_SUCCESS, COLOR_WARNING], autopct='%1.0f%%')
+                    self.ax_donut.add_artist(plt.Circle((0,0), 0.70, fc=COLOR_CARD))
+                self.cvs_donut.draw()
+
+            # 3. Update Moving Line Graph (blitted)
+            self.update_live_graph(snap['series'])
+
             # 4. Text Logs
-            self.gui_db.cursor.execute("SELECT src_ip, dst_ip, protocol, length, captured_at FROM packet_logs ORDER BY id DESC LIMIT 5")
-            rows = self.gui_db.cursor.fetchall()
-            self.txt_log.config(state='normal')
-            self.txt_log.delete('1.0', tk.END)
-            for row in reversed(rows):
-                 ts = row[4].strftime('%H:%M:%S') if row[4] else "00:00:00"
-                 self.txt_log.insert(tk.END, f"[{ts}] {row[0]} -> {row[1]} [{row[2]}]\n")
-            self.txt_log.config(state='disabled')
+            if snap['recent'] != self.last_recent:
+                self.last_recent = snap['recent']
+                self.txt_log.config(state='normal')
+                self.txt_log.delete('1.0', tk.END)
+                for captured_at, src, dst, proto, length in snap['recent']:
+                     ts = datetime.fromtimestamp(captured_at).strftime('%H:%M:%S')
+                     self.txt_log.insert(tk.END, f"[{ts}] {src} -> {dst} [{proto}]\n")
+                self.txt_log.config(state='disabled')
 
         except Exception as e:
             print(f"Dashboard Update Error: {e}")
 
     def refresh_stats_graph(self):
+        import pandas as pd   # Only this page uses it; keeps start-up fast
         try:
-            query = "SELECT src_ip, COUNT(*) as count FROM packet_logs GROUP BY src_ip ORDER BY count DESC LIMIT 5"
-            self.gui_db.cursor.execute(query)
-            df = pd.DataFrame(self.gui_db.cursor.fetchall(), columns=['ip', 'count'])
+            # Served by the minute/hour rollups, whatever the range
+            seconds = STATS_RANGES[self.stats_range.get()]
+            start = datetime.now().timestamp() - seconds if seconds else None
+            view = self.stats_view.get()
+            if view == "Live Estimate":
+                # In-memory sketch of this session: instant, no query, bounded error
+                self.draw_live_talkers()
+                return
+            if view == "Conversations":
+                # Straight from flow_logs: one row per conversation, not per packet
+                flows = self.gui_db.top_flows(start=start, limit=5)
+                df = pd.DataFrame([(f"{src}:{sport} > {dst}:{dport} {proto_name(proto)}", packets, size)
+                                   for src, sport, dst, dport, proto, packets, size in flows],
+                                  columns=['ip', 'count', 'bytes'])
+                value, title = 'bytes', "Top 5 Conversations (Bytes)"
+            else:
+                df = pd.DataFrame(self.gui_db.top_talkers('src', start=start, limit=5), columns=['ip', 'count', 'bytes'])
+                value, title = 'count', "Top 5 Source IPs (Volume)"
             self.ax_stats.clear()
             if not df.empty:
-                self.ax_stats.bar(df['ip'], df['count'], color=COLOR_ACCENT)
-                self.ax_stats.set_title("Top 5 Source IPs (Volume)", color="white")
+                self.ax_stats.bar(df['ip'], df[value], color=COLOR_ACCENT)
+                self.ax_stats.set_title(title, color="white")
                 self.ax_stats.tick_params(axis='x', rotation=15)
             self.cvs_stats.draw()
         except: pass
 
+    def draw_live_talkers(self):
+        rows = live_stats.top_talkers('src', 'packets', limit=5)
+        self.ax_stats.clear()
+        if rows:
+            ips = [row[0] for row in rows]
+            counts = [row[1] for row in rows]
+            # True count is in [count - error, count]
+            self.ax_stats.bar(ips, counts, color=COLOR_ACCENT,
+                              yerr=[[row[2] for row in rows], [0] * len(rows)], ecolor="white", capsize=4)
+            for ip, count, _error, dsts, ports in rows:
+                if dsts is not None:
+                    self.ax_stats.annotate(f"~{dsts} dst / ~{ports} ports", (ip, count), ha='center',
+                                           va='bottom', color="#a9a9a9", fontsize=8)
+            self.ax_stats.set_title("Top 5 Source IPs (Live Estimate, This Session)", color="white")
+            self.ax_stats.tick_params(axis='x', rotation=15)
+        self.cvs_stats.draw()
+
+    # --- SECURITY LOGS (keyset paging) ---
     def refresh_logs_table(self):
-        for item in self.tree.get_children(): self.tree.delete(item)
+        """Applies the filters and shows the newest page."""
+        proto = self.var_log_proto.get()
+        seconds = STATS_RANGES[self.var_log_range.get()]
         try:
-            self.gui_db.cursor.execute("SELECT captured_at, src_ip, dst_ip, protocol, length FROM packet_logs ORDER BY id DESC LIMIT 100")
-            for row in self.gui_db.cursor.fetchall(): self.tree.insert("", "end", values=row)
+            self.logs_filter = parse_filter(self.var_log_ip.get(), "" if proto == "Any" else proto, self.var_log_flags.get(),
+                                            start=time.time() - seconds if seconds else None)
+        except FilterError as e:
+            messagebox.showerror("Invalid Filter", str(e))
+            return
+        flows = self.logs_view.get() == "Flows"
+        cols = FLOW_COLUMNS if flows else PACKET_COLUMNS
+        self.tree.delete(*self.tree.get_children())
+        self.tree.config(columns=cols)
+        for col in cols: self.tree.heading(col, text=col, command=lambda c=col: self.sort_logs_column(c))
+        # Results of a request still in flight for the old filter are ignored;
+        # the newest page is then fetched once it has finished
+        self.logs_generation += 1
+        self.logs_pages.clear()
+        self.logs_more_older = self.logs_more_newer = False
+        self.logs_sort = None
+        self.lbl_logs_info.config(text="Loading...")
+        self.request_logs_page('older')
+
+    def request_logs_page(self, direction):
+        """Fetches the page before (older) or after (newer) the loaded window on a worker thread."""
+        if self.logs_loading: return
+        self.logs_loading = True
+        before_id = self.logs_pages[-1][1] if direction == 'older' and self.logs_pages else None
+        after_id = self.logs_pages[0][0] if direction == 'newer' else None
+        table = 'flow_logs' if self.logs_view.get() == "Flows" else 'packet_logs'
+        self.lbl_logs_info.config(text="Loading...")
+        threading.Thread(target=self.fetch_logs_page, daemon=True,
+                         args=(self.logs_generation, direction, table, self.logs_filter, before_id, after_id)).start()
+
+    def fetch_logs_page(self, generation, direction, table, log_filter, before_id, after_id):
+        # Worker thread with its own connection, so a slow search never blocks Tk
+        if self.logs_db is None:
+            self.logs_db = get_storage()
+        rows = self.logs_db.search_logs(table, log_filter, before_id, after_id, LOGS_PAGE_SIZE)
+        self.after(0, self.show_logs_page, generation, direction, table, rows)
+
+    def show_logs_page(self, generation, direction, table, rows):
+        self.logs_loading = False
+        if generation != self.logs_generation:
+            self.request_logs_page('older')     # The filter changed meanwhile
+            return
+        full = len(rows) == LOGS_PAGE_SIZE
+        if direction == 'older':
+            self.logs_more_older = full
+        else:
+            self.logs_more_newer = full
+        if rows:
+            anchor = self.tree.get_children()[-1 if direction == 'older' else 0] if self.logs_pages else None
+            values = self.flow_log_values if table == 'flow_logs' else self.packet_log_values
+            index = "end" if direction == 'older' else 0
+            items = [self.tree.insert("", index if index == "end" else i, iid=str(row[0]), values=values(row))
+                     for i, row in enumerate(rows)]
+            page = (rows[0][0], rows[-1][0], items)
+            if direction == 'older':
+                self.logs_pages.append(page)
+            else:
+                self.logs_pages.appendleft(page)
+            # Keep the window bounded: drop the page furthest from where we are going
+            if len(self.logs_pages) > LOGS_MAX_PAGES:
+                dropped = self.logs_pages.popleft() if direction == 'older' else self.logs_pages.pop()
+                self.tree.delete(*dropped[2])
+                if direction == 'older':
+                    self.logs_more_newer = True
+                else:
+                    self.logs_more_older = True
+            if anchor: self.tree.see(anchor)
+            self.logs_sort = None
+        loaded = sum(len(page[2]) for page in self.logs_pages)
+        self.lbl_logs_info.config(text=f"{loaded} rows loaded" + ("" if self.logs_more_older else " (end of results)"))
+
+    def on_logs_scroll(self, first, last):
+        self.logs_scroll.set(first, last)
+        # Near either edge of the loaded window: fetch the next page that way
+        if float(last) > 0.9 and self.logs_more_older:
+            self.request_logs_page('older')
+        elif float(first) < 0.1 and self.logs_more_newer:
+            self.request_logs_page('newer')
+
+    def sort_logs_column(self, col):
+        """Sorts the loaded rows in place; the next page fetched restores id order."""
+        reverse = self.logs_sort == (col, False)
+        self.logs_sort = (col, reverse)
+        def key(item):
+            value = self.tree.set(item, col)
+            try:
+                return (0, float(value))
+            except ValueError:
+                return (1, value)
+        for index, item in enumerate(sorted(self.tree.get_children(), key=key, reverse=reverse)):
+            self.tree.move(item, "", index)
+
+    def packet_log_values(self, row):
+        _id, ts, src, dst, proto, length, flags = row
+        return (ts, src, dst, proto_name(proto), length, tcp_flags_str(flags))
+
+    def flow_log_values(self, row):
+        _id, ts, src, sport, dst, dport, proto, packets, size, flags = row
+        return (ts, f"{src}:{sport}", f"{dst}:{dport}", proto_name(proto), packets, size, tcp_flags_str(flags))
+
+    def refresh_alerts_table(self):
+        for item in self.alerts_tree.get_children(): self.alerts_tree.delete(item)
+        try:
+            for ts, kind, severity, src, dst, detail in self.gui_db.recent_alerts(100):
+                self.alerts_tree.insert("", "end", values=(ts, kind, severity, src or "*", dst or "*", detail), tags=(severity,))
         except: pass
 
     # ==========================================
-    # --- PDF REPORT GENERATION (FIXED) ---
+    # --- EXPORTS (background, see src/export.py) ---
     # ==========================================
-    def export_pdf(self):
+    def export_range(self):
+        seconds = STATS_RANGES[self.var_export_range.get()]
+        return (time.time() - seconds if seconds else None), None
+
+    def export_report(self):
+        file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF Files", "*.pdf")])
+        if not file_path: return
+        start, end = self.export_range()
+        talkers = live_stats.top_talkers('src', 'packets', limit=10)
+        self.start_export("Security report", export_pdf, file_path, start, end, session_talkers=talkers)
+
+    def export_raw(self):
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[
+            ("CSV", "*.csv"), ("Compressed CSV", "*.csv.gz"), ("Parquet", "*.parquet")])
+        if not file_path: return
+        start, end = self.export_range()
+        table = 'flow_logs' if self.var_export_table.get() == "Flows" else 'packet_logs'
+        self.start_export("Export", export_logs, file_path, table, start, end)
+
+    def start_export(self, what, func, *args, **kwargs):
+        if self.export_cancel is not None:
+            messagebox.showwarning("Busy", "An export is already running.")
+            return
+        self.export_cancel = threading.Event()
+        self.btn_export_cancel.config(state=NORMAL)
+        self.export_progress['value'] = 0
+        self.lbl_export.config(text=f"{what}: starting...")
+        kwargs.update(progress=lambda fraction, rows: self.after(0, self.show_export_progress, what, fraction, rows),
+                      cancel=self.export_cancel)
+        threading.Thread(target=self.run_export, args=(what, func, args, kwargs), daemon=True).start()
+
+    def run_export(self, what, func, args, kwargs):
+        # Worker thread with its own connection (a long export must not hold gui_db)
+        db = get_storage()
         try:
-            file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF Files", "*.pdf")])
-            if not file_path: return
-
-            # 1. GENERATE CHART
-            self.gui_db.cursor.execute("SELECT src_ip, COUNT(*) as count FROM packet_logs GROUP BY src_ip ORDER BY count DESC LIMIT 5")
-            df = pd.DataFrame(self.gui_db.cursor.fetchall(), columns=['ip', 'count'])
-            
-            temp_chart_path = "temp_chart_report.png"
-            if not df.empty:
-                plt.figure(figsize=(10, 5), facecolor='white')
-                plt.bar(df['ip'], df['count'], color='#4a90e2')
-                plt.title("Top 5 Threat Actors (Source IPs)")
-                plt.xlabel("IP Address")
-                plt.ylabel("Packet Count")
-                plt.tight_layout()
-                plt.savefig(temp_chart_path)
-                plt.close()
-
-            # 2. CREATE PDF WITH NEW SYNTAX
-            pdf = PDFReport()
-            pdf.add_page()
-            
-            # --- SUMMARY SECTION ---
-            pdf.set_font("Helvetica", "B", 14)
-            pdf.set_text_color(0, 0, 0)
-            pdf.cell(0, 10, "Executive Summary", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            
-            self.gui_db.cursor.execute("SELECT COUNT(*), (SELECT COUNT(*) FROM packet_logs WHERE UPPER(TRIM(protocol))='TCP'), (SELECT COUNT(*) FROM packet_logs WHERE UPPER(TRIM(protocol))='UDP') FROM packet_logs")
-            stats = self.gui_db.cursor.fetchone()
-            
-            pdf.set_font("Helvetica", "", 12)
-            pdf.cell(50, 10, f"Total Packets: {stats[0]}", border=1)
-            pdf.cell(50, 10, f"TCP Packets: {stats[1]}", border=1)
-            pdf.cell(50, 10, f"UDP Packets: {stats[2]}", border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            pdf.ln(10)
-
-            # --- CHART SECTION ---
-            pdf.set_font("Helvetica", "B", 14)
-            pdf.cell(0, 10, "Traffic Analysis Chart", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            if os.path.exists(temp_chart_path):
-                pdf.image(temp_chart_path, x=10, w=190)
-                pdf.ln(5)
-                os.remove(temp_chart_path)
-            else:
-                pdf.cell(0, 10, "(No data available for chart)", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-
-            # --- TABLE SECTION ---
-            pdf.ln(10)
-            pdf.set_font("Helvetica", "B", 14)
-            pdf.cell(0, 10, "Recent Suspicious Activity (Last 50 Logs)", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            
-            # Table Header
-            pdf.set_font("Helvetica", "B", 10)
-            pdf.set_fill_color(200, 200, 200)
-            col_widths = [45, 40, 40, 25, 20] 
-            headers = ["Timestamp", "Source IP", "Dest IP", "Proto", "Len"]
-            
-            for i, h in enumerate(headers):
-                pdf.cell(col_widths[i], 10, h, border=1, align='C', fill=True)
-            pdf.ln()
-
-            # Table Rows
-            self.gui_db.cursor.execute("SELECT captured_at, src_ip, dst_ip, protocol, length FROM packet_logs ORDER BY id DESC LIMIT 50")
-            logs = self.gui_db.cursor.fetchall()
-            
-            pdf.set_font("Helvetica", "", 9)
-            fill = False
-            for row in logs:
-                pdf.set_fill_color(240, 240, 240) if fill else pdf.set_fill_color(255, 255, 255)
-                
-                # Cells 1-4: Move RIGHT
-                pdf.cell(col_widths[0], 8, str(row[0]), border=1, align='C', fill=True)
-                pdf.cell(col_widths[1], 8, str(row[1]), border=1, align='C', fill=True)
-                pdf.cell(col_widths[2], 8, str(row[2]), border=1, align='C', fill=True)
-                pdf.cell(col_widths[3], 8, str(row[3]), border=1, align='C', fill=True)
-                # Last Cell: Move NEXT LINE
-                pdf.cell(col_widths[4], 8, str(row[4]), border=1, align='C', fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-                fill = not fill
-
-            pdf.output(file_path)
-            messagebox.showinfo("Success", "Security Report Generated Successfully!")
-
+            func(db, *args, **kwargs)
+            error = None
+        except ExportCancelled:
+            error = "cancelled"
         except Exception as e:
-            messagebox.showerror("Export Error", str(e))
+            error = str(e)
+        finally:
+            db.close()
+        self.after(0, self.on_export_done, what, args[0], error)
+
+    def show_export_progress(self, what, fraction, rows):
+        self.export_progress['value'] = fraction
+        self.lbl_export.config(text=f"{what}: {fraction:.0%}" + (f" ({rows:,} rows)" if rows else ""))
+
+    def cancel_export(self):
+        if self.export_cancel is not None:
+            self.export_cancel.set()
+            self.lbl_export.config(text="Cancelling...")
+
+    def on_export_done(self, what, file_path, error):
+        self.export_cancel = None
+        self.btn_export_cancel.config(state=DISABLED)
+        self.export_progress['value'] = 0
+        self.lbl_export.config(text="")
+        if error == "cancelled":
+            messagebox.showinfo("Export", f"{what} cancelled.")
+        elif error:
+            messagebox.showerror("Export Error", error)
+        else:
+            messagebox.showinfo("Success", f"{what} saved to {os.path.basename(file_path)}.")
+
+    def load_profile_fields(self):
+        profile = self.profiles.get(self.var_profile.get())
+        if profile is None: return
+        self.var_iface.set(profile.iface or "")
+        self.var_bpf.set(profile.bpf)
+        self.var_snaplen.set(str(profile.snaplen))
+        self.var_promisc.set(profile.promisc)
+
+    def save_capture_profile(self):
+        name = self.var_profile.get().strip()
+        if not name or name == 'default':
+            messagebox.showwarning("Capture Profile", "Enter a name for the profile (the default profile can't be changed).")
+            return
+        try:
+            snaplen = int(self.var_snaplen.get())
+        except ValueError:
+            snaplen = 0
+        if not 0 < snaplen <= 65535:
+            messagebox.showerror("Capture Profile", "Snaplen must be between 1 and 65535 bytes.")
+            return
+        profile = CaptureProfile(name, self.var_iface.get().strip() or None, self.var_bpf.get().strip(),
+                                 snaplen, self.var_promisc.get())
+        # Compile now so a typo shows up here rather than when capture starts
+        try:
+            compile_program(profile)
+        except CaptureConfigError as e:
+            messagebox.showerror("Capture Profile", str(e))
+            return
+        save_profile(profile)
+        self.profiles[name] = profile
+        self.cmb_profile.config(values=list(self.profiles))
+        messagebox.showinfo("Capture Profile", f"Profile '{name}' saved and active. It applies from the next capture or import.")
 
     def flush_db(self):
         if messagebox.askyesno("Confirm", "Are you sure you want to delete ALL logs?"):
-            self.gui_db.cursor.execute("DELETE FROM packet_logs")
-            self.gui_db.connection.commit()
-            self.refresh_logs_table()
-            messagebox.showinfo("Done", "Database cleared.")
+            self.btn_flush.config(state=DISABLED, text="🗑  Clearing...")
+            threading.Thread(target=self.run_flush, name="Flush", daemon=True).start()
+
+    def run_flush(self):
+        # Worker thread with its own connection, like exports
+        db = get_storage()
+        try:
+            db.purge()
+            error = None
+        except Exception as e:
+            error = str(e)
+        finally:
+            db.close()
+        self.after(0, self.on_flush_done, error)
+
+    def on_flush_done(self, error):
+        self.btn_flush.config(state=DISABLED if self.daemon else NORMAL, text="🗑  Flush/Clear Database")
+        if error:
+            messagebox.showerror("Flush Failed", error)
+            return
+        live_stats.reset()
+        self.refresh_logs_table()
+        messagebox.showinfo("Done", "Database cleared.")
 
     def on_closing(self):
+        self.closing.set()
         if self.is_running: stop_sniffer_flag.set()
         if hasattr(self, 'gui_db'): self.gui_db.close()
+        if self.logs_db: self.logs_db.close()
+        if self.export_cancel is not None: self.export_cancel.set()
+        if self.retention: self.retention.stop()
         self.destroy()
 
 if __name__ == "__main__":
+    start_metrics()
     app = NetGuardApp()
     app.protocol("WM_DELETE_WINDOW", app.on_closing)
     app.mainloop()
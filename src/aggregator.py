@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import deque
+from src.sketches import TrafficSketch
+
+DEFAULT_WINDOW_SECONDS = 300   # per-second history kept in the ring buffer
+DEFAULT_TAIL_SIZE = 50         # recent packets kept for the live stream
+
+class TrafficAggregator:
+    """
+    Running totals maintained by the capture side in O(1) per packet.
+
+    The dashboard reads snapshots of these counters instead of querying
+    packet_logs, so a refresh costs the same no matter how large the table
+    is. Per-second buckets live in a fixed-size ring indexed by
+    (second % window); a bucket is recycled when its second comes round again.
+    Approximate top talkers and per-source fan-out come from a fixed-size
+    TrafficSketch (see src/sketches.py) covering this capture session.
+    Under load shedding (src/sampling.py) each packet arrives with a weight
+    and counts as that many packets.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW_SECONDS, tail=DEFAULT_TAIL_SIZE):
+        self._lock = threading.Lock()
+        self.window = window
+        self.tail = tail
+        self._seed = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._seed = {}
+            self._clear()
+
+    def _clear(self):
+        self.total_packets = 0
+        self.total_bytes = 0
+        self.protocols = {}                       # name -> [packets, bytes]
+        self.bucket_second = [-1] * self.window
+        self.bucket_packets = [0] * self.window
+        self.bucket_bytes = [0] * self.window
+        self.recent = deque(maxlen=self.tail)
+        self.sketch = TrafficSketch()
+        self.sample_weight = 1                    # current 1-in-N sampling (1 = every packet)
+        self.shed = 0                             # packets skipped by load shedding
+
+    def seed(self, protocol_counts):
+        """Starts the totals from already-stored rows: {protocol: (packets, bytes)}."""
+        with self._lock:
+            self._seed = dict(protocol_counts)
+            self._apply_seed()
+
+    def _apply_seed(self):
+        for proto, (packets, size) in self._seed.items():
+            counts = self.protocols.setdefault(proto, [0, 0])
+            counts[0] += packets
+            counts[1] += size
+            self.total_packets += packets
+            self.total_bytes += size
+
+    def add(self, src, dst, proto, length, captured_at=None, dport=None, weight=1):
+        now = time.time()
+        second = int(now)
+        idx = second % self.window
+        size = length * weight
+        with self._lock:
+            self.total_packets += weight
+            self.total_bytes += size
+
+            counts = self.protocols.get(proto)
+            if counts is None:
+                counts = self.protocols[proto] = [0, 0]
+            counts[0] += weight
+            counts[1] += size
+
+            if self.bucket_second[idx] != second:
+                self.bucket_second[idx] = second
+                self.bucket_packets[idx] = 0
+                self.bucket_bytes[idx] = 0
+            self.bucket_packets[idx] += weight
+            self.bucket_bytes[idx] += size
+
+            self.recent.append((captured_at or now, src, dst, proto, length))
+            self.sketch.add(src, dst, dport, length, weight)
+
+    def set_sampling(self, weight, shed):
+        """Load-shedding state from the capture thread's OverloadController."""
+        with self._lock:
+            self.sample_weight = weight
+            self.shed = shed
+
+    def export_state(self):
+        """Picklable copy of the counters, sent from capture workers to the coordinator."""
+        with self._lock:
+            return {
+                'total_packets': self.total_packets,
+                'total_bytes': self.total_bytes,
+                'protocols': {proto: list(counts) for proto, counts in self.protocols.items()},
+                'buckets': [(second, self.bucket_packets[i], self.bucket_bytes[i])
+                            for i, second in enumerate(self.bucket_second) if second >= 0],
+                'recent': list(self.recent),
+                'sketch': self.sketch.export_state(),
+                'sample_weight': self.sample_weight,
+                'shed': self.shed,
+            }
+
+    def load_merged(self, states):
+        """Replaces the counters with the sum of several export_state() dicts (plus the seed)."""
+        with self._lock:
+            self._clear()
+            self._apply_seed()
+            recent = []
+            for state in states:
+                self.total_packets += state['total_packets']
+                self.total_bytes += state['total_bytes']
+                for proto, (packets, size) in state['protocols'].items():
+                    counts = self.protocols.setdefault(proto, [0, 0])
+                    counts[0] += packets
+                    counts[1] += size
+                for second, packets, size in state['buckets']:
+                    idx = second % self.window
+                    if self.bucket_second[idx] != second:
+                        if self.bucket_second[idx] > second:
+                            continue  # Older than what this slot already holds
+                        self.bucket_second[idx] = second
+                        self.bucket_packets[idx] = 0
+                        self.bucket_bytes[idx] = 0
+                    self.bucket_packets[idx] += packets
+                    self.bucket_bytes[idx] += size
+                recent.extend(state['recent'])
+                # The most heavily sampled worker is what the dashboard should warn about
+                self.sample_weight = max(self.sample_weight, state['sample_weight'])
+                self.shed += state['shed']
+            recent.sort(key=lambda row: row[0])
+            self.recent.extend(recent[-self.tail:])
+            self.sketch = TrafficSketch.merged(state['sketch'] for state in states)
+
+    def rate_series(self, seconds):
+        """Packets per second for the last `seconds` seconds, oldest first."""
+        now = int(time.time())
+        seconds = min(seconds, self.window)
+        series = []
+        with self._lock:
+            for second in range(now - seconds + 1, now + 1):
+                idx = second % self.window
+                series.append(self.bucket_packets[idx] if self.bucket_second[idx] == second else 0)
+        return series
+
+    def top_talkers(self, dimension='src', by='packets', limit=5):
+        """
+        Approximate [(ip, count, error, distinct dsts, distinct dst ports)]
+        from the sketch; the true count lies in [count - error, count]. The
+        distinct counts are None for destinations and untracked sources.
+        """
+        with self._lock:
+            rows = []
+            for ip, count, error in self.sketch.top(dimension, by, limit):
+                fanout = self.sketch.distinct(ip) if dimension == 'src' else None
+                rows.append((ip, count, error) + (fanout or (None, None)))
+            return rows
+
+    def snapshot(self, window=10, tail=5):
+        """Consistent copy of everything the dashboard needs for one tick."""
+        series = self.rate_series(window)
+        with self._lock:
+            return {
+                'total_packets': self.total_packets,
+                'total_bytes': self.total_bytes,
+                'protocols': {proto: counts[0] for proto, counts in self.protocols.items()},
+                'window_packets': sum(series),
+                'recent': list(self.recent)[-tail:],
+                'sample_weight': self.sample_weight,
+                'shed': self.shed,
+            }
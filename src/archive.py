@@ -0,0 +1,97 @@
+"""
+Compressed columnar archive of expired packet_logs and flow_logs rows.
+
+Retention (src/retention.py) moves rows here before deleting them when
+ARCHIVE_DIR is set:
+
+    ARCHIVE_DIR/packet_logs/1714521600-1714525199-81234.parquet
+    ARCHIVE_DIR/packet_logs/index.json
+
+Each file holds up to ARCHIVE_FILE_ROWS rows in time order, in the
+export's Parquet layout (zstd). index.json is the time index: one
+{"file", "start", "end", "rows"} entry per file, in epoch seconds.
+Readers only open the files whose span overlaps the requested range, and
+only see files that are in the index. The index is rewritten through a
+temp file and a rename, so a crash mid-write leaves the old index.
+
+historical_logs() is stream_logs() over archive + database: exports read
+it, so ranges older than the retention period still export in full.
+Needs pyarrow.
+"""
+import json
+import os
+from datetime import datetime
+from src.log_query import LOG_TABLES
+
+ARCHIVE_FILE_ROWS = 100000
+
+class ArchiveError(Exception):
+    pass
+
+def archive_root():
+    return os.getenv('ARCHIVE_DIR') or None
+
+def _pyarrow():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ArchiveError("The archive needs pyarrow (pip install pyarrow).")
+    return pq
+
+def load_index(root, table):
+    try:
+        with open(os.path.join(root, table, 'index.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+def _save_index(root, table, index):
+    path = os.path.join(root, table, 'index.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+def append(root, table, rows):
+    """Writes rows (search_logs() layout, oldest first) to a new file and indexes it."""
+    _pyarrow()
+    from src.export import ParquetSink
+    os.makedirs(os.path.join(root, table), exist_ok=True)
+    start, end = rows[0][1].timestamp(), rows[-1][1].timestamp()
+    name = f"{int(start)}-{int(end)}-{rows[0][0]}.parquet"
+    path = os.path.join(root, table, name)
+    sink = ParquetSink(path + '.tmp', table, ('id',) + LOG_TABLES[table][1])
+    try:
+        sink.write(rows)
+    finally:
+        sink.close()
+    os.replace(path + '.tmp', path)
+    index = load_index(root, table)
+    index.append({'file': name, 'start': start, 'end': end, 'rows': len(rows)})
+    index.sort(key=lambda entry: entry['start'])
+    _save_index(root, table, index)
+
+def read(root, table, start=None, end=None, chunk_size=10000):
+    """Archived rows of `table` in [start, end) as lists of up to chunk_size rows, in the search_logs() layout."""
+    index = [entry for entry in load_index(root, table)
+             if (start is None or entry['end'] >= start) and (end is None or entry['start'] < end)]
+    if not index:
+        return
+    pq = _pyarrow()
+    time_col, columns = LOG_TABLES[table]
+    filters = []
+    if start is not None:
+        filters.append((time_col, '>=', datetime.fromtimestamp(start)))
+    if end is not None:
+        filters.append((time_col, '<', datetime.fromtimestamp(end)))
+    for entry in index:
+        data = pq.read_table(os.path.join(root, table, entry['file']), filters=filters or None)
+        rows = list(zip(*(data.column(col).to_pylist() for col in ('id',) + columns)))
+        for i in range(0, len(rows), chunk_size):
+            yield rows[i:i + chunk_size]
+
+def historical_logs(db, table, start=None, end=None, chunk_size=10000):
+    """db.stream_logs() preceded by the archived part of the range (if there is an archive)."""
+    root = archive_root()
+    if root:
+        yield from read(root, table, start, end, chunk_size)
+    yield from db.stream_logs(table, start, end, chunk_size)
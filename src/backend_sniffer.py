@@ -1,47 +1,304 @@
+import os
+import socket
 import threading
-from scapy.all import sniff, IP, TCP, UDP
-from src.database import DBManager
+import time
+from src.aggregator import TrafficAggregator
+from src.capture_config import active_profile, attach_program, compile_program, kernel_drops, CpuMeter, OfflineFilter
+from src.fast_decode import decode_packet, proto_name, DLT_EN10MB, PROTO_TCP, PROTO_UDP
+from src.detection import AnomalyDetector, detection_enabled
+from src.flows import FlowTable, DEFAULT_IDLE_TIMEOUT, DEFAULT_ACTIVE_TIMEOUT
+from src.metrics import REGISTRY
+from src.packet_writer import PacketWriter
+from src.pcap_reader import PcapReader
+from src.sampling import OverloadController, sampling_mode
+from src.storage import get_storage
 
 # Global flag to control the sniffer thread
 stop_sniffer_flag = threading.Event()
 
-def packet_callback(packet, db_instance):
-    """Callback function processed for every packet captured."""
-    if IP in packet:
-        src_ip = packet[IP].src
-        dst_ip = packet[IP].dst
-        length = len(packet)
-        proto = "Other"
-        flags = "None"
-
-        if TCP in packet:
-            proto = "TCP"
-            flags = packet[TCP].flags
-        elif UDP in packet:
-            proto = "UDP"
-        
-        # Log to Database
-        db_instance.log_packet(src_ip, dst_ip, proto, length, flags)
-
-def stop_check(x):
-    """Scapy runs this check after every packet to see if it should stop."""
-    return stop_sniffer_flag.is_set()
-
-def start_sniffing_thread():
+# Running aggregates shared with the dashboard (read via live_stats.snapshot())
+live_stats = TrafficAggregator()
+
+# How often (seconds) the capture loop wakes up to check stop_sniffer_flag
+STOP_POLL_INTERVAL = 0.5
+
+# Per-stage metrics (see src/metrics.py)
+PACKETS_RECEIVED = REGISTRY.counter('packets_received_total', "Frames handed to packet_callback")
+KERNEL_DROPS = REGISTRY.counter('kernel_drops_total', "Frames the kernel dropped before capture read them")
+DECODE_SECONDS = REGISTRY.histogram('decode_seconds', "Header decode time per frame (1 in DECODE_TIMING_EVERY frames)")
+DECODE_FAILURES = REGISTRY.counter('decode_failures_total', "Frames without a decodable IP header")
+KERNEL_POLL_INTERVAL = 1.0    # seconds between PACKET_STATISTICS reads
+DECODE_TIMING_EVERY = 16      # power of two; timing every frame cost ~10% of throughput
+
+# What CAPTURE_MODE stores: per-packet rows, 5-tuple flows, or both
+CAPTURE_MODES = ('packets', 'flows', 'both')
+
+def capture_mode():
+    mode = os.getenv('CAPTURE_MODE', 'packets').lower()
+    return mode if mode in CAPTURE_MODES else 'packets'
+
+class CaptureSinks:
+    """
+    Storage side of one capture pipeline, chosen by CAPTURE_MODE: a
+    PacketWriter for packet_logs rows and/or a FlowTable whose exported
+    flows go through a second PacketWriter into flow_logs. In 'flows' mode
+    the flows also feed the rollups, since no packet rows are written.
+    Unless DETECTION=off, an AnomalyDetector writes to the alerts table
+    through a third writer. A multicore worker passes on_window instead:
+    its detector hands closed windows to the coordinator, which raises
+    the alerts.
+
+    Live capture (block=False) also gets an OverloadController unless
+    SAMPLING=off; its rate changes are stored as 'sampling' alerts so the
+    periods with scaled counts can be found later.
+    """
+
+    def __init__(self, block=False, db_factory=get_storage, mode=None, on_window=None):
+        self.mode = mode or capture_mode()
+        self.writer = None
+        self.flow_writer = None
+        self.flows = None
+        if self.mode != 'flows':
+            self.writer = PacketWriter(db_factory=db_factory, block=block)
+        if self.mode != 'packets':
+            self.flow_writer = PacketWriter(db_factory=db_factory, block=block, flush_method='log_flows',
+                                            flush_options={'update_rollups': self.mode == 'flows'})
+            self.flows = FlowTable(self.flow_writer.submit,
+                                   idle_timeout=float(os.getenv('FLOW_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT)),
+                                   active_timeout=float(os.getenv('FLOW_ACTIVE_TIMEOUT', DEFAULT_ACTIVE_TIMEOUT)))
+        self.alert_writer = None
+        self.detector = None
+        if detection_enabled():
+            self.alert_writer = PacketWriter(db_factory=db_factory, block=block, flush_method='log_alerts')
+            self.detector = AnomalyDetector(self.alert_writer.submit, on_window=on_window)
+        self.sampler = None
+        if not block and sampling_mode() != 'off':
+            self.sampler = OverloadController(queue_fill=self._queue_fill, on_change=self._sampling_changed,
+                                              publish=live_stats.set_sampling)
+            REGISTRY.gauge('packets_shed', "Packets skipped by load shedding this capture", fn=lambda: self.sampler.shed)
+
+    def _writers(self):
+        return [writer for writer in (self.writer, self.flow_writer, self.alert_writer) if writer]
+
+    def _queue_fill(self):
+        return max(writer.fill() for writer in self._writers())
+
+    def _sampling_changed(self, weight, busy, queue):
+        if self.alert_writer:
+            detail = f"1-in-{weight} sampling" if weight > 1 else "sampling off"
+            self.alert_writer.submit((time.time(), 'sampling', 'low', None, None,
+                                      f"{detail} (capture {busy:.0%} busy, writer queue {queue:.0%} full)"))
+
+    def start(self):
+        for writer in self._writers():
+            writer.start()
+
+    def tick(self):
+        """Called by live capture loops when no packet arrived, so idle flows still expire."""
+        if self.flows:
+            self.flows.expire()
+        if self.detector:
+            self.detector.expire()
+        if self.sampler:
+            self.sampler.check()
+
+    def stop(self):
+        """Exports the open flows and the last detection window, then drains the writers."""
+        if self.flows:
+            self.flows.flush()
+        if self.detector:
+            self.detector.flush()
+        for writer in self._writers():
+            writer.stop()
+        if self.flows and self.flows.exported:
+            print(f"[Flows] {self.flows.packets} packets -> {self.flows.exported} flow rows "
+                  f"({self.flows.packets / self.flows.exported:.1f}x fewer writes).")
+
+    def stats(self):
+        """Flat counters (so multicore can add them up): writer stats, then flow_*, flows_*, detect_*, sample_*."""
+        stats = self.writer.stats() if self.writer else {}
+        if self.flows:
+            stats.update({f"flow_{key}": value for key, value in self.flow_writer.stats().items()})
+            stats.update({f"flows_{key}": value for key, value in self.flows.stats().items()})
+        if self.detector:
+            stats.update({f"detect_{key}": value for key, value in self.detector.stats().items()})
+        if self.sampler:
+            stats.update({f"sample_{key}": value for key, value in self.sampler.stats().items()})
+        return stats
+
+class KernelDropCounter:
+    """Adds an AF_PACKET socket's kernel drops to KERNEL_DROPS, at most once per KERNEL_POLL_INTERVAL."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._next = 0.0
+
+    def poll(self, force=False):
+        now = time.monotonic()
+        if now < self._next and not force:
+            return
+        self._next = now + KERNEL_POLL_INTERVAL
+        drops = kernel_drops(self.sock)
+        if drops:
+            KERNEL_DROPS.inc(drops)
+
+def packet_callback(frame, db_instance, linktype=DLT_EN10MB, ts=None, wire_len=None, flows=None, detector=None,
+                    sampler=None):
+    """
+    Callback function processed for every frame captured.
+    frame is the raw link-layer bytes; headers are decoded by fast_decode
+    without building scapy layers. db_instance is anything with a
+    log_packet() method; in the sniffer thread that is the PacketWriter
+    queue, not a live DB connection (None when only flows are kept).
+    flows is the FlowTable and detector the AnomalyDetector, when enabled.
+    ts is only set for offline ingest, where rows must carry the original
+    capture time. sampler is the OverloadController of live capture: shed
+    packets are not even decoded, kept ones count `weight` times.
+    """
+    PACKETS_RECEIVED.value += 1   # Hot path: plain attribute add rather than inc()
+    weight = 1
+    if sampler is not None:
+        weight = sampler.admit()
+        if not weight:
+            return
+    if PACKETS_RECEIVED.value & (DECODE_TIMING_EVERY - 1):
+        record = decode_packet(frame, linktype, wire_len)
+    else:
+        started = time.perf_counter()
+        record = decode_packet(frame, linktype, wire_len)
+        DECODE_SECONDS.observe(time.perf_counter() - started)
+    if record is None:
+        DECODE_FAILURES.inc()
+        return
+
+    # Only TCP/UDP ports count towards the per-source distinct port sketch
+    dport = record.dport if record.proto in (PROTO_TCP, PROTO_UDP) else None
+    live_stats.add(record.src, record.dst, proto_name(record.proto), record.length, ts, dport, weight)
+
+    if flows is not None:
+        flows.add(record, ts, weight)
+    if detector is not None:
+        detector.add(record, ts, weight)
+
+    # Log to Database (protocol number and flag bits, see packet_logs_ddl)
+    if db_instance is not None:
+        db_instance.log_packet(record.src, record.dst, record.proto, record.length, record.flags, ts, weight)
+
+def open_listen_socket(profile):
+    """
+    Raw listen socket for a capture profile. On Linux the profile's BPF
+    program (filter + snaplen) is attached to the AF_PACKET socket itself;
+    elsewhere the expression is handed to scapy's libpcap socket.
+    """
+    # scapy.all takes about a second to import; only live capture needs it
+    from scapy.all import conf
+    if hasattr(socket, 'AF_PACKET'):
+        program = compile_program(profile)
+        sock = conf.L2listen(iface=profile.iface, promisc=profile.promisc)
+        attach_program(sock.ins, program)
+        return sock
+    return conf.L2listen(iface=profile.iface, promisc=profile.promisc, filter=profile.bpf or None)
+
+def start_sniffing_thread(profile=None):
     """The function to run in the background thread."""
-    # Each thread needs its own DB connection for thread safety
-    db_conn = DBManager() 
-    print("[Thread] Sniffer thread started.")
-    
+    from scapy.all import conf, MTU
+    profile = profile or active_profile()
+    # The writers own their own DB connections on their flush threads
+    sinks = CaptureSinks()
+    sinks.start()
+    print(f"[Thread] Sniffer thread started (profile '{profile.name}').")
+
     stop_sniffer_flag.clear()
+    sock = None
+    drops = None
+    meter = CpuMeter(profile.iface)
 
     try:
-        # sniff runs until stop_check returns True
-        sniff(prn=lambda pkt: packet_callback(pkt, db_conn), 
-              store=0, 
-              stop_filter=stop_check)
+        # Raw listen socket: recv_raw() hands back bytes without dissecting them
+        sock = open_listen_socket(profile)
+        drops = KernelDropCounter(sock.ins)
+        while not stop_sniffer_flag.is_set():
+            drops.poll()
+            if not sock.select([sock], STOP_POLL_INTERVAL):
+                sinks.tick()
+                continue
+            layer, frame, _ts = sock.recv_raw(MTU)
+            if frame is None:
+                continue
+            linktype = conf.l2types.layer2num.get(layer, DLT_EN10MB)
+            meter.add_bytes(len(frame))
+            packet_callback(frame, sinks.writer, linktype, flows=sinks.flows, detector=sinks.detector,
+                            sampler=sinks.sampler)
     except Exception as e:
         print(f"[Thread Error] {e}")
     finally:
-        db_conn.close()
+        if drops:
+            drops.poll(force=True)
+        if sock:
+            sock.close()
+        # Drains whatever is still queued before returning
+        sinks.stop()
+        _report_cpu("[Thread]", profile, meter.report())
         print("[Thread] Sniffer thread stopped.")
+
+def _report_cpu(prefix, profile, usage):
+    if usage['cpu_ms_per_mbit'] is not None:
+        print(f"{prefix} {usage['cpu_ms_per_mbit']:.2f} ms CPU per Mbit over {usage['mbit']:.1f} Mbit "
+              f"(profile '{profile.name}').")
+
+def start_ingest_thread(path, realtime=False, speed=1.0, profile=None):
+    """
+    Replays a pcap/pcapng file through the same pipeline as live capture.
+    realtime=False ingests as fast as the writer allows; realtime=True
+    sleeps to reproduce the original inter-packet gaps (scaled by speed).
+    The capture profile's filter and snaplen apply as they would live.
+    Returns a small stats dict and prints the achieved packets/s.
+    """
+    profile = profile or active_profile()
+    offline = OfflineFilter(profile)
+    meter = CpuMeter()
+    # Blocking writer: a file can wait for the DB, a NIC can't
+    sinks = CaptureSinks(block=True)
+    sinks.start()
+    reader = PcapReader(path)
+    print(f"[Ingest] Reading {path} ({'original rate' if realtime else 'max speed'}, profile '{profile.name}').")
+
+    stop_sniffer_flag.clear()
+    started = time.perf_counter()
+    first_ts = None
+
+    try:
+        for ts, linktype, frame, wire_len in reader:
+            if stop_sniffer_flag.is_set():
+                break
+            if realtime and ts is not None:
+                if first_ts is None:
+                    first_ts = ts
+                delay = (ts - first_ts) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            meter.add_bytes(wire_len or len(frame))
+            if not offline.accepts(frame, linktype, wire_len):
+                continue
+            packet_callback(frame[:offline.snaplen], sinks.writer, linktype, ts, wire_len,
+                            sinks.flows, sinks.detector)
+    except Exception as e:
+        print(f"[Ingest Error] {e}")
+    finally:
+        sinks.stop()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    usage = meter.report()
+    stats = {
+        'packets': reader.packets_read,
+        'filtered': offline.rejected,
+        'bytes': reader.bytes_read,
+        'seconds': elapsed,
+        'pps': reader.packets_read / elapsed,
+        'cpu_ms_per_mbit': usage['cpu_ms_per_mbit'],
+        'writer': sinks.stats(),
+    }
+    print(f"[Ingest] {stats['packets']} packets in {elapsed:.2f}s ({stats['pps']:.0f} packets/s), "
+          f"{offline.rejected} dropped by the capture filter.")
+    _report_cpu("[Ingest]", profile, usage)
+    return stats
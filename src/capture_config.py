@@ -0,0 +1,236 @@
+"""
+Capture profiles: interface, BPF filter expression, snapshot length and
+promiscuous mode.
+
+Profiles live in an INI file (CAPTURE_CONFIG, default capture.ini), one
+section per profile plus a [capture] section naming the active one
+(CAPTURE_PROFILE in .env overrides it):
+
+    [capture]
+    profile = no-backups
+
+    [no-backups]
+    iface = eth0
+    bpf = not port 22 and not port 873
+    snaplen = 128
+    promisc = yes
+
+The filter is compiled to classic BPF by libpcap (the same compiler
+tcpdump uses) and attached to the capture socket, so excluded frames are
+dropped in the kernel and never reach Python. The snaplen is written into
+the program's accept instructions, so the kernel copies at most that many
+bytes of each frame. Offline pcap input goes through the same program
+with libpcap's pcap_offline_filter().
+
+A profile without a filter needs no libpcap: its program is just
+"accept snaplen bytes".
+"""
+import configparser
+import ctypes
+import os
+import socket
+import struct
+import time
+from collections import namedtuple
+from dotenv import load_dotenv
+from src.fast_decode import DLT_EN10MB
+
+load_dotenv()
+
+CaptureProfile = namedtuple('CaptureProfile', 'name iface bpf snaplen promisc')
+
+DEFAULT_SNAPLEN = 65535      # whole frame
+CONFIG_SECTION = 'capture'
+
+# Classic BPF opcodes / socket options (linux/filter.h, if_packet.h)
+BPF_RET_K = 0x06
+SO_ATTACH_FILTER = 26
+SOL_PACKET = 263
+PACKET_ADD_MEMBERSHIP = 1
+PACKET_STATISTICS = 6
+PACKET_MR_PROMISC = 1
+
+class CaptureConfigError(Exception):
+    pass
+
+class _BpfInsn(ctypes.Structure):
+    _fields_ = [('code', ctypes.c_ushort), ('jt', ctypes.c_ubyte), ('jf', ctypes.c_ubyte), ('k', ctypes.c_uint32)]
+
+class _SockFprog(ctypes.Structure):
+    _fields_ = [('len', ctypes.c_ushort), ('filter', ctypes.POINTER(_BpfInsn))]
+
+def config_path():
+    return os.getenv('CAPTURE_CONFIG', 'capture.ini')
+
+def default_profile():
+    """What capture did before profiles existed: everything, on CAPTURE_IFACE or scapy's default."""
+    return CaptureProfile('default', os.getenv('CAPTURE_IFACE') or None, '', DEFAULT_SNAPLEN, True)
+
+def load_profiles(path=None):
+    """({name: CaptureProfile}, active name) from the config file; the default profile is always there."""
+    parser = configparser.ConfigParser()
+    parser.read(path or config_path())
+    profiles = {'default': default_profile()}
+    for name in parser.sections():
+        if name == CONFIG_SECTION:
+            continue
+        section = parser[name]
+        profiles[name] = CaptureProfile(
+            name,
+            section.get('iface') or None,
+            section.get('bpf', '').strip(),
+            section.getint('snaplen', DEFAULT_SNAPLEN),
+            section.getboolean('promisc', True),
+        )
+    active = os.getenv('CAPTURE_PROFILE') or parser.get(CONFIG_SECTION, 'profile', fallback='default')
+    return profiles, active
+
+def active_profile(path=None):
+    profiles, active = load_profiles(path)
+    if active not in profiles:
+        print(f"[!] Capture profile '{active}' not found, using 'default'.")
+        active = 'default'
+    return profiles[active]
+
+def save_profile(profile, path=None, activate=True):
+    """Adds or replaces a profile section (and optionally makes it the active one)."""
+    path = path or config_path()
+    parser = configparser.ConfigParser()
+    parser.read(path)
+    if profile.name != 'default':
+        parser[profile.name] = {
+            'iface': profile.iface or '',
+            'bpf': profile.bpf or '',
+            'snaplen': str(profile.snaplen),
+            'promisc': 'yes' if profile.promisc else 'no',
+        }
+    if activate:
+        if not parser.has_section(CONFIG_SECTION):
+            parser.add_section(CONFIG_SECTION)
+        parser[CONFIG_SECTION]['profile'] = profile.name
+    with open(path, 'w') as f:
+        parser.write(f)
+
+# --- BPF PROGRAMS ---
+def compile_program(profile, linktype=DLT_EN10MB):
+    """
+    Classic BPF program for the profile as [(code, jt, jf, k)], picklable so
+    it can be handed to capture workers. Raises CaptureConfigError if the
+    expression is invalid or libpcap is missing.
+    """
+    snaplen = profile.snaplen or DEFAULT_SNAPLEN
+    if not profile.bpf:
+        return [(BPF_RET_K, 0, 0, snaplen)]
+    try:
+        from scapy.arch.common import compile_filter, free_filter
+        bpf = compile_filter(profile.bpf, linktype=linktype)
+    except ImportError as e:
+        raise CaptureConfigError(f"BPF filters need libpcap: {e}")
+    except Exception as e:
+        raise CaptureConfigError(f"Invalid BPF filter '{profile.bpf}': {e}")
+    try:
+        program = [(insn.code, insn.jt, insn.jf, insn.k & 0xFFFFFFFF)
+                   for insn in bpf.bf_insns[:bpf.bf_len]]
+    finally:
+        free_filter(bpf)
+    # "ret #n" with n > 0 accepts n bytes; cap every accept at the snaplen
+    return [(code, jt, jf, min(k, snaplen)) if code == BPF_RET_K and k else (code, jt, jf, k)
+            for code, jt, jf, k in program]
+
+def _insn_array(program):
+    insns = (_BpfInsn * len(program))()
+    for i, (code, jt, jf, k) in enumerate(program):
+        insns[i] = _BpfInsn(code, jt, jf, k)
+    return insns
+
+def attach_program(sock, program):
+    """Installs the program on a Linux AF_PACKET socket (SO_ATTACH_FILTER)."""
+    insns = _insn_array(program)
+    fprog = _SockFprog(len(program), ctypes.cast(insns, ctypes.POINTER(_BpfInsn)))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, bytes(fprog))
+
+def set_promisc(sock, iface):
+    """Promiscuous membership for an AF_PACKET socket; dropped by the kernel when it closes."""
+    mreq = struct.pack("IHH8s", socket.if_nametoindex(iface), PACKET_MR_PROMISC, 0, b"")
+    sock.setsockopt(SOL_PACKET, PACKET_ADD_MEMBERSHIP, mreq)
+
+def kernel_drops(sock):
+    """
+    Frames the kernel dropped on an AF_PACKET socket since the previous call
+    (reading PACKET_STATISTICS resets it); None where that isn't available.
+    """
+    try:
+        _packets, drops = struct.unpack("II", sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+    except (OSError, AttributeError):
+        return None
+    return drops
+
+class OfflineFilter:
+    """Applies a profile to frames read from a file (one program per linktype)."""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.snaplen = profile.snaplen or DEFAULT_SNAPLEN
+        self.rejected = 0
+        self._programs = {}
+
+    def accepts(self, frame, linktype, wire_len):
+        if not self.profile.bpf:
+            return True
+        program = self._programs.get(linktype)
+        if program is None:
+            program = self._programs[linktype] = self._load(linktype)
+        from scapy.libs.winpcapy import pcap_offline_filter, pcap_pkthdr
+        data = bytes(frame)
+        header = pcap_pkthdr(caplen=len(data), len=wire_len or len(data))
+        ok = pcap_offline_filter(ctypes.byref(program), ctypes.byref(header),
+                                 ctypes.cast(data, ctypes.POINTER(ctypes.c_ubyte)))
+        if not ok:
+            self.rejected += 1
+        return ok
+
+    def _load(self, linktype):
+        from scapy.libs.structures import bpf_insn, bpf_program
+        program = compile_program(self.profile, linktype)
+        insns = (bpf_insn * len(program))(*[bpf_insn(code, jt, jf, k if k < 2 ** 31 else k - 2 ** 32)
+                                           for code, jt, jf, k in program])
+        bpf = bpf_program(len(program), ctypes.cast(insns, ctypes.POINTER(bpf_insn)))
+        bpf._insns = insns   # keep the array alive with the struct
+        return bpf
+
+# --- MEASUREMENT ---
+class CpuMeter:
+    """
+    Process CPU time per Mbit of traffic, to compare profiles. Wire traffic
+    comes from the interface counters in /sys (Linux) so frames dropped by
+    the kernel filter still count; elsewhere, or for files, from the bytes
+    the caller reports with add_bytes().
+    """
+
+    def __init__(self, iface=None):
+        self.iface = iface
+        self.bytes = 0
+        self._cpu = time.process_time()
+        self._wire = self._iface_bytes()
+
+    def _iface_bytes(self):
+        if not self.iface:
+            return None
+        total = 0
+        for counter in ('rx_bytes', 'tx_bytes'):
+            try:
+                with open(f"/sys/class/net/{self.iface}/statistics/{counter}") as f:
+                    total += int(f.read())
+            except (OSError, ValueError):
+                return None
+        return total
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def report(self):
+        cpu = time.process_time() - self._cpu
+        wire = self._iface_bytes()
+        size = wire - self._wire if wire is not None and self._wire is not None else self.bytes
+        mbit = size * 8 / 1e6
+        return {'cpu_seconds': cpu, 'mbit': mbit, 'cpu_ms_per_mbit': cpu * 1000 / mbit if mbit else None}
@@ -0,0 +1,233 @@
+"""
+Headless entry point: capture, ingest, export and purge without the GUI.
+
+    python -m src live   [--workers N] [--profile NAME]
+    python -m src pcap   FILE [--realtime] [--speed X] [--workers N] [--profile NAME]
+    python -m src export {packets,flows,report} FILE [--since 24h | --start T --end T]
+    python -m src retention
+    python -m src purge  (--older-than 7d | --before T | --all)
+
+T is an ISO date/time ("2024-05-01", "2024-05-01 13:00") or epoch seconds;
+durations take an s/m/h/d suffix. Configuration comes from .env as for
+the GUI (DB_BACKEND, CAPTURE_MODE, CAPTURE_WORKERS, ...).
+
+Each subcommand imports only what it uses, and none of them loads
+tkinter, ttkbootstrap, pandas or matplotlib (the PDF report loads
+matplotlib and fpdf itself). scapy is only imported by single-process
+live capture, to open its socket. `live` and `pcap` publish their
+aggregates for main_gui.py to attach to as a viewer (src/daemon.py),
+serve pipeline metrics when METRICS_PORT is set (src/metrics.py), and
+`live` runs the retention job when a RETAIN_* policy is set
+(src/retention.py); `retention` runs one pass of it and exits.
+SIGINT/SIGTERM stop capture cleanly: open flows are exported and the
+writers drained.
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_duration(text):
+    """'90s', '15m', '24h', '7d' -> seconds."""
+    try:
+        return float(text[:-1]) * DURATION_UNITS[text[-1].lower()]
+    except (KeyError, ValueError, IndexError):
+        raise argparse.ArgumentTypeError(f"'{text}' is not a duration like 15m, 24h or 7d")
+
+def parse_time(text):
+    """ISO date/time or epoch seconds -> epoch seconds."""
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{text}' is not a date/time (use e.g. 2024-05-01 or 2024-05-01T13:00)")
+
+def _profile(name):
+    from src.capture_config import load_profiles, active_profile
+    if not name:
+        return active_profile()
+    profiles, _active = load_profiles()
+    if name not in profiles:
+        sys.exit(f"[!] Unknown capture profile '{name}' (have: {', '.join(profiles)}).")
+    return profiles[name]
+
+def _stop_on_signals(stop_flag):
+    def handler(signum, frame):
+        print(f"\n[Daemon] {signal.Signals(signum).name} received, stopping...")
+        stop_flag.set()
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+
+def _seed_totals(live_stats):
+    # Same start as the GUI: the cards continue from what is already stored
+    from src.fast_decode import proto_name
+    from src.storage import get_storage
+    db = get_storage()
+    live_stats.seed({proto_name(p): totals for p, totals in db.protocol_totals().items()})
+    db.close()
+
+# --- SUBCOMMANDS ---
+def cmd_live(args):
+    from src.backend_sniffer import live_stats, stop_sniffer_flag, start_sniffing_thread
+    from src.daemon import StatePublisher
+    from src.metrics import start_metrics
+    from src.retention import start_retention
+    profile = _profile(args.profile)
+    workers = args.workers or int(os.getenv('CAPTURE_WORKERS', '1'))
+    _seed_totals(live_stats)
+    _stop_on_signals(stop_sniffer_flag)
+    start_metrics()
+    retention = start_retention()
+    publisher = StatePublisher(live_stats, {'mode': 'live', 'profile': profile.name, 'workers': workers})
+    publisher.start()
+    print(f"[Daemon] Live capture (pid {os.getpid()}, profile '{profile.name}', {workers} worker(s)); Ctrl+C to stop.")
+    try:
+        if workers > 1:
+            from src.multicore import start_multicore_capture
+            start_multicore_capture(workers, profile=profile)
+        else:
+            start_sniffing_thread(profile)
+    finally:
+        publisher.stop()
+        if retention:
+            retention.stop()
+    return 0
+
+def cmd_pcap(args):
+    from src.backend_sniffer import live_stats, stop_sniffer_flag, start_ingest_thread
+    from src.daemon import StatePublisher
+    from src.metrics import start_metrics
+    if not os.path.exists(args.file):
+        sys.exit(f"[!] No such file: {args.file}")
+    profile = _profile(args.profile)
+    _stop_on_signals(stop_sniffer_flag)
+    start_metrics()
+    publisher = StatePublisher(live_stats, {'mode': 'pcap', 'profile': profile.name, 'workers': args.workers})
+    publisher.start()
+    try:
+        if args.workers > 1:
+            from src.multicore import start_multicore_capture
+            stats = start_multicore_capture(args.workers, pcap_path=args.file, realtime=args.realtime, profile=profile,
+                                            speed=args.speed)
+        else:
+            stats = start_ingest_thread(args.file, args.realtime, args.speed, profile)
+    finally:
+        publisher.stop()
+    return 0 if stats else 1
+
+def cmd_export(args):
+    from src.archive import ArchiveError
+    from src.export import export_logs, export_pdf, ExportError
+    from src.storage import get_storage
+    start, end = args.start, args.end
+    if args.since:
+        start = time.time() - args.since
+
+    shown = [None]
+    def progress(fraction, rows):
+        percent = int(fraction * 100)
+        if percent != shown[0]:
+            shown[0] = percent
+            print(f"\r[Export] {percent:3d}%" + (f" ({rows:,} rows)" if rows else ""),
+                  end="\n" if percent == 100 else "", file=sys.stderr, flush=True)
+
+    db = get_storage()
+    try:
+        if args.what == 'report':
+            export_pdf(db, args.file, start, end, progress=progress)
+        else:
+            table = 'flow_logs' if args.what == 'flows' else 'packet_logs'
+            export_logs(db, args.file, table, start, end, progress=progress)
+    except (ExportError, ArchiveError, KeyboardInterrupt) as e:
+        print(f"\n[!] Export failed: {e or 'interrupted'}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    return 0
+
+def cmd_retention(args):
+    from src.archive import archive_root, ArchiveError
+    from src.retention import load_policies, describe, partitioning_enabled, run_retention
+    from src.storage import get_storage
+    policies = load_policies()
+    if not any(policies.values()) and not partitioning_enabled():
+        print("[Retention] No RETAIN_* policy is set in .env; nothing to do.")
+        return 0
+    print(f"[Retention] {describe(policies)}.")
+    db = get_storage()
+    try:
+        summary = run_retention(db, policies, archive_root(), pause=0)
+    except ArchiveError as e:
+        print(f"[!] Retention failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    if not summary:
+        print("[Retention] Nothing has expired.")
+    return 0
+
+def cmd_purge(args):
+    from src.storage import get_storage
+    if args.older_than:
+        before = time.time() - args.older_than
+    elif args.before:
+        before = args.before
+    else:
+        before = None
+    db = get_storage()
+    try:
+        db.purge(before)
+    finally:
+        db.close()
+    print(f"[Daemon] Purged {'everything' if before is None else 'rows before ' + datetime.fromtimestamp(before).isoformat(' ', 'seconds')}.")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m src", description="NetGuard headless capture and maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    live = sub.add_parser("live", help="capture from the network until stopped")
+    live.add_argument("--workers", type=int, default=0, help="capture processes (default CAPTURE_WORKERS or 1)")
+    live.add_argument("--profile", help="capture profile name (default: the active one)")
+    live.set_defaults(func=cmd_live)
+
+    pcap = sub.add_parser("pcap", help="ingest a pcap/pcapng file")
+    pcap.add_argument("file")
+    pcap.add_argument("--realtime", action="store_true", help="replay at the original capture rate")
+    pcap.add_argument("--speed", type=float, default=1.0, help="realtime speed-up factor")
+    pcap.add_argument("--workers", type=int, default=1)
+    pcap.add_argument("--profile")
+    pcap.set_defaults(func=cmd_pcap)
+
+    export = sub.add_parser("export", help="export raw rows (.csv, .csv.gz, .parquet) or a PDF report")
+    export.add_argument("what", choices=("packets", "flows", "report"))
+    export.add_argument("file")
+    export.add_argument("--since", type=parse_duration, help="range ending now, e.g. 24h")
+    export.add_argument("--start", type=parse_time)
+    export.add_argument("--end", type=parse_time)
+    export.set_defaults(func=cmd_export)
+
+    retention = sub.add_parser("retention", help="apply the RETAIN_* policies once (e.g. from cron)")
+    retention.set_defaults(func=cmd_retention)
+
+    purge = sub.add_parser("purge", help="delete stored rows, alerts and rollups")
+    group = purge.add_mutually_exclusive_group(required=True)
+    group.add_argument("--older-than", type=parse_duration, help="e.g. 7d")
+    group.add_argument("--before", type=parse_time)
+    group.add_argument("--all", action="store_true", help="delete everything")
+    purge.set_defaults(func=cmd_purge)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sys.exit(args.func(args))
+
+if __name__ == "__main__":
+    main()
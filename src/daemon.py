@@ -0,0 +1,100 @@
+"""
+Live state of a headless capture, shared with GUI viewers.
+
+While `python -m src live` (or `pcap`) runs, a StatePublisher writes the
+running aggregates (TrafficAggregator.export_state()) to DAEMON_STATE
+(default netguard-daemon.json) once a second. Each write goes to a temp
+file that is then renamed over the old one, so readers never see half a
+file. main_gui.py checks for a fresh file at start-up. If it finds one,
+it attaches as a read-only viewer: the dashboard is fed from the file,
+and the capture, import and flush controls are disabled. Logs,
+statistics and alerts come from the database as usual.
+
+The file is JSON rather than pickle, so reading it cannot run code. A
+file not updated for STALE_AFTER seconds counts as "no daemon" (for
+example after a crash).
+"""
+import base64
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STATE_INTERVAL = 1.0     # seconds between state file writes
+STALE_AFTER = 5.0        # older than this: the daemon is gone
+
+def state_path():
+    return os.getenv('DAEMON_STATE', 'netguard-daemon.json')
+
+def encode_state(state):
+    """export_state() dict -> JSON-safe dict (tuple keys and HLL registers flattened)."""
+    sketch = state['sketch']
+    return dict(state, sketch={
+        'k': sketch['k'],
+        'precision': sketch['precision'],
+        'summaries': {f"{dimension}:{by}": summary for (dimension, by), summary in sketch['summaries'].items()},
+        'fanout': {src: [base64.b64encode(dsts).decode(), base64.b64encode(ports).decode()]
+                   for src, (dsts, ports) in sketch['fanout'].items()},
+    })
+
+def decode_state(data):
+    """Inverse of encode_state(), ready for TrafficAggregator.load_merged()."""
+    sketch = data['sketch']
+    return dict(data, sketch={
+        'k': sketch['k'],
+        'precision': sketch['precision'],
+        'summaries': {tuple(key.split(':')): summary for key, summary in sketch['summaries'].items()},
+        'fanout': {src: (base64.b64decode(dsts), base64.b64decode(ports))
+                   for src, (dsts, ports) in sketch['fanout'].items()},
+    })
+
+def read_state(path=None):
+    """
+    The running daemon's last published payload ({'pid', 'mode', 'profile',
+    'started', 'updated', 'stats'}), or None if there is no fresh one.
+    """
+    try:
+        with open(path or state_path()) as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - payload.get('updated', 0) > STALE_AFTER:
+        return None
+    return payload
+
+class StatePublisher(threading.Thread):
+    """Writes aggregator's state plus `info` to the state file until stop()."""
+
+    def __init__(self, aggregator, info, path=None, interval=STATE_INTERVAL):
+        super().__init__(name="StatePublisher", daemon=True)
+        self.aggregator = aggregator
+        self.info = dict(info, pid=os.getpid(), started=time.time())
+        self.path = path or state_path()
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.write()
+
+    def write(self):
+        payload = dict(self.info, updated=time.time(), stats=encode_state(self.aggregator.export_state()))
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(payload, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[!] State File Error: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
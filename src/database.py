@@ -1,70 +1,557 @@
 import mysql.connector
 from mysql.connector import Error
 import os
+import time
+from datetime import date, timedelta
 from dotenv import load_dotenv
+from src import log_query, retention, rollups
+from src.db_pool import is_connection_error, shared_pool
+from src.spill import HELD, JOURNAL
+from src.storage import StorageBackend, pack_ip
 
 # Load credentials
 load_dotenv()
 
-class DBManager:
-    def __init__(self):
-        self.connection = None
-        self.cursor = None
+# Bump together with packet_logs_ddl(); src/migrate.py upgrades older tables
+SCHEMA_VERSION = 4
+
+LAYOUT_CHECK = 10   # seconds between packet_logs version checks while it is older than SCHEMA_VERSION
+
+def packet_logs_ddl(table="packet_logs", partitioned=False, first_day=None):
+    """
+    Compact v2 layout: IPs as packed VARBINARY(16) (4 bytes for IPv4),
+    protocol as the IP protocol number and TCP flags as their bit mask.
+    captured_at is part of the primary key so the table can be range
+    partitioned by day (from first_day, default today, to a week ahead).
+    v3 adds idx_dst_time so log searches by address use an index on both sides.
+    v4 adds weight, the packets a row stands for under sampling, so the
+    rollups can be rebuilt exactly.
+    """
+    ddl = f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+        src_ip VARBINARY(16) NOT NULL,
+        dst_ip VARBINARY(16) NOT NULL,
+        protocol TINYINT UNSIGNED NOT NULL,
+        length MEDIUMINT UNSIGNED NOT NULL,
+        flags SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+        weight SMALLINT UNSIGNED NOT NULL DEFAULT 1,
+        captured_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, captured_at),
+        KEY idx_captured_at (captured_at),
+        KEY idx_src_time (src_ip, captured_at),
+        KEY idx_dst_time (dst_ip, captured_at),
+        KEY idx_protocol_time (protocol, captured_at)
+    ) ENGINE=InnoDB
+    """
+    if partitioned:
+        first_day = first_day or date.today()
+        days = (date.today() - first_day).days + 7
+        ddl += f"PARTITION BY RANGE (UNIX_TIMESTAMP(captured_at)) ({daily_partitions_sql(first_day, days)})"
+    return ddl
+
+def flow_logs_ddl(table="flow_logs"):
+    """
+    One row per exported flow (see src/flows.py), same packed IP encoding as
+    packet_logs. first/last seen keep milliseconds so short flows keep
+    their duration.
+    """
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        src_ip VARBINARY(16) NOT NULL,
+        dst_ip VARBINARY(16) NOT NULL,
+        src_port SMALLINT UNSIGNED NOT NULL,
+        dst_port SMALLINT UNSIGNED NOT NULL,
+        protocol TINYINT UNSIGNED NOT NULL,
+        packets INT UNSIGNED NOT NULL,
+        bytes BIGINT UNSIGNED NOT NULL,
+        flags SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+        first_seen TIMESTAMP(3) NOT NULL,
+        last_seen TIMESTAMP(3) NOT NULL,
+        KEY idx_last_seen (last_seen),
+        KEY idx_src_time (src_ip, last_seen),
+        KEY idx_dst_time (dst_ip, last_seen)
+    ) ENGINE=InnoDB
+    """
+
+def alerts_ddl(table="alerts"):
+    """Alerts raised by src.detection; src/dst are NULL when they don't apply."""
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        detected_at TIMESTAMP NOT NULL,
+        kind VARCHAR(32) NOT NULL,
+        severity VARCHAR(8) NOT NULL,
+        src_ip VARBINARY(16) NULL,
+        dst_ip VARBINARY(16) NULL,
+        detail VARCHAR(255) NOT NULL DEFAULT '',
+        KEY idx_detected_at (detected_at)
+    ) ENGINE=InnoDB
+    """
+
+def daily_partitions_sql(start, days):
+    """One partition per day from `start`, followed by the catch-all pmax."""
+    parts = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        parts.append(f"PARTITION p{day:%Y%m%d} VALUES LESS THAN (UNIX_TIMESTAMP('{day + timedelta(days=1)}'))")
+    parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ", ".join(parts)
+
+PACKET_INSERT = """
+INSERT INTO packet_logs (src_ip, dst_ip, protocol, length, flags, weight, captured_at)
+VALUES (%s, %s, %s, %s, %s, %s, COALESCE(FROM_UNIXTIME(%s), NOW()))
+"""
+PACKET_INSERT_UNWEIGHTED = """
+INSERT INTO packet_logs (src_ip, dst_ip, protocol, length, flags, captured_at)
+VALUES (%s, %s, %s, %s, %s, COALESCE(FROM_UNIXTIME(%s), NOW()))
+"""
+
+def connect_args():
+    return dict(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASS', ''),
+        database=os.getenv('DB_NAME', 'netguard_db'),
+        connection_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+        autocommit=True  # <--- CRITICAL: Ensures data is saved immediately
+    )
+
+def _on_connect(pool):
+    """
+    First connection of the process, or the first one after an outage:
+    (re)create missing tables, then send back whatever was spilled meanwhile.
+    """
+    DBManager(pool).create_table()
+    if JOURNAL.pending():
+        JOURNAL.replay_in_background(DBManager)
+
+class DBManager(StorageBackend):
+    """
+    MySQL storage backend.
+
+    Holds no connection of its own: every call checks one out of the
+    process-wide pool (src/db_pool.py) for its thread, so instances are
+    cheap and safe to share between threads. While the server is
+    unreachable, bulk writes go to the spill journal (src/spill.py) and
+    reads return empty results.
+    """
+
+    def __init__(self, pool=None):
+        self.pool = pool or shared_pool(mysql.connector.connect, connect_args(), _on_connect)
+        self._layout = None          # packet_logs schema version as last read
+        self._layout_checked = 0.0
         self.connect()
 
     def connect(self):
-        """Establishes connection to MySQL with Auto-Reconnect"""
+        """Makes sure a connection can be had (creating the tables on the first one)."""
         try:
-            self.connection = mysql.connector.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                user=os.getenv('DB_USER', 'root'),
-                password=os.getenv('DB_PASS', ''),
-                database=os.getenv('DB_NAME', 'netguard_db'),
-                autocommit=True  # <--- CRITICAL: Ensures data is saved immediately
-            )
-            if self.connection.is_connected():
-                self.cursor = self.connection.cursor()
-                self.create_table()
-        except Error as e:
-            print(f"[!] Database Connection Error: {e}")
+            with self.checkout():
+                pass
+        except Error:
+            pass  # Reported by the pool, which keeps retrying with backoff
+
+    def checkout(self):
+        """Context manager yielding a cursor on this thread's pooled connection."""
+        return self.pool.cursor()
+
+    def _spill(self, method, rows, options=None, journal=JOURNAL):
+        journal.append(method, rows, options)
+        return len(rows)
+
+    def _stored(self, count):
+        # The database takes writes again: send back anything spilled since the last replay
+        if JOURNAL.replay_due():
+            JOURNAL.replay_in_background(DBManager)
+        return count
+
+    @staticmethod
+    def _stamped(rows):
+        # Rows replayed later must keep the time they were captured, not the replay time
+        now = time.time()
+        return [tuple(row[:5]) + (now if row[5] is None else row[5], row[6]) for row in rows]
+
+    def _report(self, label, e):
+        # Connection errors were already reported by the pool (once per outage)
+        if not is_connection_error(e):
+            print(f"[!] {label}: {e}")
 
     def create_table(self):
+        partitioned = os.getenv('DB_PARTITIONING', '').lower() == 'daily'
+        try:
+            with self.checkout() as cursor:
+                cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_meta (
+                    name VARCHAR(64) PRIMARY KEY,
+                    version INT NOT NULL
+                )
+                """)
+                for dimension in rollups.DIMENSIONS:
+                    for resolution in rollups.RESOLUTIONS:
+                        cursor.execute(rollups.rollup_ddl(dimension, resolution))
+                cursor.execute(flow_logs_ddl())
+                cursor.execute(alerts_ddl())
+                version = self.schema_version()
+                if version is None:
+                    cursor.execute(packet_logs_ddl(partitioned=partitioned))
+                    cursor.execute("INSERT INTO schema_meta (name, version) VALUES ('packet_logs', %s)", (SCHEMA_VERSION,))
+                elif version < SCHEMA_VERSION:
+                    print(f"[!] packet_logs uses schema v{version}; run 'python -m src.migrate' to upgrade to v{SCHEMA_VERSION}."
+                          + (" New packets are held on disk until then." if version == 1 else ""))
+                elif partitioned:
+                    self.add_daily_partitions()
+        except Error as e:
+            self._report("Table Creation Error", e)
+
+    def schema_version(self):
+        """Version of packet_logs, 1 for the original VARCHAR table, None if missing."""
+        with self.checkout() as cursor:
+            cursor.execute("SELECT version FROM schema_meta WHERE name = 'packet_logs'")
+            row = cursor.fetchone()
+            if row:
+                return row[0]
+            cursor.execute("""
+            SELECT DATA_TYPE FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'packet_logs' AND COLUMN_NAME = 'src_ip'
+            """)
+            row = cursor.fetchone()
+            return 1 if row else None
+
+    def packet_logs_version(self):
+        """
+        schema_version() as the writers see it: cached, and only re-read every
+        LAYOUT_CHECK seconds while the table is older than SCHEMA_VERSION,
+        since src.migrate may upgrade it underneath a running capture.
+        """
+        now = time.monotonic()
+        if self._layout is None or (self._layout < SCHEMA_VERSION and now - self._layout_checked >= LAYOUT_CHECK):
+            self._layout = self.schema_version() or SCHEMA_VERSION
+            self._layout_checked = now
+            if self._layout > 1 and HELD.pending():
+                HELD.replay_in_background(DBManager)
+        return self._layout
+
+    def add_daily_partitions(self, days_ahead=7):
+        """
+        Splits pmax so there is always a partition for the next few days.
+        Called at startup and by every retention pass (src/retention.py).
+        """
+        try:
+            with self.checkout() as cursor:
+                cursor.execute("""
+                SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'packet_logs' AND PARTITION_NAME IS NOT NULL
+                """)
+                existing = {row[0] for row in cursor.fetchall()}
+            if 'pmax' not in existing:
+                return  # Table isn't partitioned
+            start = date.today()
+            while f"p{start:%Y%m%d}" in existing:
+                start += timedelta(days=1)
+            days = days_ahead - (start - date.today()).days
+            if days > 0:
+                # pmax only ever holds rows from the future, so this is a cheap reorganize
+                with self.checkout() as cursor:
+                    cursor.execute(f"ALTER TABLE packet_logs REORGANIZE PARTITION pmax INTO ({daily_partitions_sql(start, days)})")
+        except Error as e:
+            self._report("Partition Add Error", e)
+
+    def log_packet(self, src, dst, proto, length, flags=0, captured_at=None, weight=1):
+        # captured_at is epoch seconds (from the pcap on offline ingest);
+        # None stores the database's NOW().
+        # proto is the IP protocol number and flags the TCP flag bits.
+        # A one-row batch, so the rollups stay in step with packet_logs.
+        self.log_packets([(src, dst, proto, length, flags, captured_at, weight)])
+
+    def log_packets(self, rows):
+        """
+        Bulk version of log_packet used by the PacketWriter.
+        Rows are (src, dst, proto, length, flags, captured_at, weight) tuples,
+        written with a single multi-row INSERT inside one explicit transaction,
+        which also adds the batch to the minute/hour rollup tables (a sampled
+        row counts as `weight` packets there).
+        Returns the number of rows stored (0 if the batch was rolled back).
+        If the database is unreachable the rows are spilled to the journal
+        instead, with their capture time fixed to now, and count as stored.
+        So are rows for a v1 packet_logs: its VARCHAR columns can't take
+        them, and src.migrate would copy them wrongly. They are held on disk
+        until the migration is done.
+        """
+        try:
+            version = self.packet_logs_version()
+            if version == 1:
+                return self._spill('log_packets', self._stamped(rows), journal=HELD)
+            args = [(pack_ip(src), pack_ip(dst), proto, length, flags, weight, captured_at)
+                    for src, dst, proto, length, flags, captured_at, weight in rows]
+            query = PACKET_INSERT
+            if version < 4:
+                # No weight column until src.migrate has run
+                query = PACKET_INSERT_UNWEIGHTED
+                args = [arg[:5] + arg[6:] for arg in args]
+            # No ping: a dead connection fails the INSERT and the pool reconnects
+            with self.checkout() as cursor:
+                cursor.execute("START TRANSACTION")
+                cursor.executemany(query, args)
+                for (dimension, resolution), deltas in rollups.rollup_deltas(rows, pack_ip).items():
+                    cursor.executemany(rollups.upsert_sql(dimension, resolution), deltas)
+                cursor.execute("COMMIT")
+            return self._stored(len(args))
+        except Error as e:
+            if is_connection_error(e):
+                return self._spill('log_packets', self._stamped(rows))
+            print(f"[!] Batch Insert Error: {e}")
+            return 0
+
+    def log_flows(self, rows, update_rollups=False):
+        """
+        Bulk insert of exported flows, one transaction per batch like
+        log_packets(). With update_rollups=True the flows also feed the
+        rollup tables (flow-only capture, where log_packets() never runs).
+        """
         query = """
-        CREATE TABLE IF NOT EXISTS packet_logs (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            src_ip VARCHAR(45),
-            dst_ip VARCHAR(45),
-            protocol VARCHAR(10),
-            length INT,
-            flags VARCHAR(20),
-            captured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
+        INSERT INTO flow_logs (src_ip, dst_ip, src_port, dst_port, protocol, packets, bytes, flags, first_seen, last_seen)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, FROM_UNIXTIME(%s), FROM_UNIXTIME(%s))
         """
+        args = [(pack_ip(src), pack_ip(dst), sport, dport, proto, packets, size, flags, first_seen, last_seen)
+                for src, dst, sport, dport, proto, packets, size, flags, first_seen, last_seen in rows]
+
         try:
-            self.cursor.execute(query)
+            with self.checkout() as cursor:
+                cursor.execute("START TRANSACTION")
+                cursor.executemany(query, args)
+                if update_rollups:
+                    for (dimension, resolution), deltas in rollups.flow_rollup_deltas(rows, pack_ip).items():
+                        cursor.executemany(rollups.upsert_sql(dimension, resolution), deltas)
+                cursor.execute("COMMIT")
+            return self._stored(len(args))
         except Error as e:
-            print(f"[!] Table Creation Error: {e}")
+            if is_connection_error(e):
+                return self._spill('log_flows', rows, {'update_rollups': update_rollups})
+            print(f"[!] Flow Insert Error: {e}")
+            return 0
 
-    def log_packet(self, src, dst, proto, length, flags=""):
-        # FIX: We removed 'timestamp' from Python. 
-        # We use NOW() in SQL so the DB time is always perfectly synced.
+    def log_alerts(self, rows):
         query = """
-        INSERT INTO packet_logs (src_ip, dst_ip, protocol, length, flags, captured_at)
-        VALUES (%s, %s, %s, %s, %s, NOW())
+        INSERT INTO alerts (detected_at, kind, severity, src_ip, dst_ip, detail)
+        VALUES (FROM_UNIXTIME(%s), %s, %s, %s, %s, %s)
+        """
+        args = [(detected_at, kind, severity, pack_ip(src) if src else None, pack_ip(dst) if dst else None, detail)
+                for detected_at, kind, severity, src, dst, detail in rows]
+        try:
+            with self.checkout() as cursor:
+                cursor.executemany(query, args)
+            return self._stored(len(args))
+        except Error as e:
+            if is_connection_error(e):
+                return self._spill('log_alerts', rows)
+            print(f"[!] Alert Insert Error: {e}")
+            return 0
+
+    def protocol_totals(self, start=None, end=None):
+        """{protocol number: (packets, bytes)} for [start, end) epoch seconds, read from the rollups."""
+        query, params = rollups.range_query('protocol', start, end)
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, params)
+                return {proto: (int(packets), int(size)) for proto, packets, size in cursor.fetchall()}
+        except Error as e:
+            self._report("Totals Query Error", e)
+            return {}
+
+    def top_talkers(self, dimension='src', start=None, end=None, limit=5, order_by='packets'):
+        """[(ip, packets, bytes)] for the busiest src/dst addresses in [start, end), from the rollups."""
+        query, params = rollups.range_query(dimension, start, end, limit, order_by)
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, params)
+                return [(ip, int(packets), int(size)) for ip, packets, size in cursor.fetchall()]
+        except Error as e:
+            self._report("Top Talkers Query Error", e)
+            return []
+
+    def traffic_series(self, start=None, end=None, resolution='1m'):
+        query, params = rollups.series_query(start, end, resolution)
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, params)
+                return [(int(bucket), int(packets), int(size)) for bucket, packets, size in cursor.fetchall()]
+        except Error as e:
+            self._report("Series Query Error", e)
+            return []
+
+    def recent_packets(self, limit=100):
+        query = """
+        SELECT captured_at, INET6_NTOA(src_ip), INET6_NTOA(dst_ip), protocol, length
+        FROM packet_logs ORDER BY id DESC LIMIT %s
+        """
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, (limit,))
+                return cursor.fetchall()
+        except Error as e:
+            self._report("Recent Rows Query Error", e)
+            return []
+
+    def top_flows(self, start=None, end=None, limit=5, order_by='bytes'):
+        """Biggest conversations in [start, end); a flow split by the active timeout is summed back together."""
+        query = f"""
+        SELECT INET6_NTOA(src_ip), src_port, INET6_NTOA(dst_ip), dst_port, protocol,
+               SUM(packets) AS packets, SUM(bytes) AS bytes
+        FROM flow_logs WHERE last_seen >= FROM_UNIXTIME(%s) AND first_seen < FROM_UNIXTIME(%s)
+        GROUP BY src_ip, src_port, dst_ip, dst_port, protocol
+        ORDER BY {order_by} DESC LIMIT %s
+        """
+        params = (start or 0, end if end is not None else time.time() + 1, limit)
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, params)
+                return [(src, sport, dst, dport, proto, int(packets), int(size))
+                        for src, sport, dst, dport, proto, packets, size in cursor.fetchall()]
+        except Error as e:
+            self._report("Top Flows Query Error", e)
+            return []
+
+    def recent_flows(self, limit=100):
+        query = """
+        SELECT last_seen, INET6_NTOA(src_ip), src_port, INET6_NTOA(dst_ip), dst_port, protocol, packets, bytes, flags
+        FROM flow_logs ORDER BY id DESC LIMIT %s
+        """
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, (limit,))
+                return cursor.fetchall()
+        except Error as e:
+            self._report("Recent Flows Query Error", e)
+            return []
+
+    def recent_alerts(self, limit=100):
+        query = """
+        SELECT detected_at, kind, severity, INET6_NTOA(src_ip), INET6_NTOA(dst_ip), detail
+        FROM alerts ORDER BY id DESC LIMIT %s
+        """
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, (limit,))
+                return cursor.fetchall()
+        except Error as e:
+            self._report("Recent Alerts Query Error", e)
+            return []
+
+    def alerts_in_range(self, start=None, end=None, limit=50):
+        # Range scan on idx_detected_at, read backwards for the newest first
+        query = """
+        SELECT detected_at, kind, severity, INET6_NTOA(src_ip), INET6_NTOA(dst_ip), detail
+        FROM alerts WHERE detected_at >= FROM_UNIXTIME(%s) AND detected_at < FROM_UNIXTIME(%s)
+        ORDER BY detected_at DESC LIMIT %s
+        """
+        params = (start or 0, end if end is not None else time.time() + 1, limit)
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except Error as e:
+            self._report("Alerts Query Error", e)
+            return []
+
+    def search_logs(self, table, log_filter=None, before_id=None, after_id=None, limit=200):
+        query, params = log_query.page_query(table, log_filter, before_id, after_id, limit)
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+        except Error as e:
+            self._report("Log Search Error", e)
+            return []
+        if after_id is not None:
+            rows.reverse()
+        return rows
+
+    def stream_logs(self, table, start=None, end=None, chunk_size=10000):
+        """
+        Unbuffered cursor on a connection of its own, outside the pool: the
+        server sends rows as they are fetched, and no pooled connection is
+        tied up for the length of an export.
+        """
+        query, params = log_query.range_query(table, start, end)
+        connection = mysql.connector.connect(**connect_args())
+        done = False
+        try:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+            done = True
+        finally:
+            # Stopped early: drop the socket rather than reading the rest of the result
+            if done:
+                connection.close()
+            else:
+                connection.shutdown()
+
+    def purge(self, before=None):
+        """Deletes raw rows, flows, alerts and rollups older than `before` (everything if None)."""
+        tables = ["packet_logs", "flow_logs", "alerts"] + rollups.all_rollup_tables()
+        if before is None:
+            # TRUNCATE recreates the table: no undo log, no row-by-row locking
+            with self.checkout() as cursor:
+                for table in tables:
+                    cursor.execute(f"TRUNCATE TABLE {table}")
+            return
+        self.drop_partitions(before)
+        for table in tables:
+            retention.expire_table(self, table, before)
+
+    # --- RETENTION ---
+    def delete_expired(self, table, before, limit):
+        query, params = retention.expire_query(table, before, limit)
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, params)
+                return cursor.rowcount
+        except Error as e:
+            self._report("Retention Delete Error", e)
+            return 0
+
+    def oldest_logs(self, table, before, limit):
+        query, params = log_query.range_query(table, None, before, limit=limit)
+        try:
+            with self.checkout() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except Error as e:
+            self._report("Retention Query Error", e)
+            return []
+
+    def delete_logs(self, table, ids):
+        # Errors propagate and stop the pass; these rows are already archived
+        with self.checkout() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+
+    def drop_partitions(self, before):
+        """
+        Drops daily partitions whose upper bound is at or before `before`.
+        Dropping a partition is a metadata change, however many rows it holds.
         """
-        # Force Clean Protocol String (Remove spaces/newlines)
-        clean_proto = str(proto).strip().upper()
-        
-        args = (src, dst, clean_proto, length, str(flags))
-        
         try:
-            if not self.connection.is_connected():
-                self.connect()
-            self.cursor.execute(query, args)
+            with self.checkout() as cursor:
+                cursor.execute("""
+                SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'packet_logs' AND PARTITION_NAME IS NOT NULL
+                """)
+                # The bound is UNIX_TIMESTAMP() of the next day; pmax's is MAXVALUE
+                expired = [name for name, bound in cursor.fetchall()
+                           if name != 'pmax' and bound.isdigit() and int(bound) <= before]
+                if expired:
+                    cursor.execute(f"ALTER TABLE packet_logs DROP PARTITION {', '.join(expired)}")
+                return expired
         except Error as e:
-            print(f"[!] Insert Error: {e}")
+            self._report("Partition Drop Error", e)
+            return []
 
     def close(self):
-        if self.connection and self.connection.is_connected():
-            self.cursor.close()
-            self.connection.close()
+        # Connections go back to the shared pool after every call; nothing is held here
+        pass
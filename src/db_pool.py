@@ -0,0 +1,194 @@
+"""
+Shared MySQL connections for every DBManager in a process.
+
+Each DBManager call checks a connection out of the pool for the calling
+thread and returns it afterwards, so a connection is only ever used by
+one thread at a time. The GUI, the writer threads and the exports share
+a few connections instead of each holding its own. A nested checkout on
+the same thread reuses the connection it already holds, so a
+transaction stays on one connection.
+
+There is no ping before each statement. A connection is only checked
+when it comes out of the pool after more than DB_IDLE_CHECK seconds
+unused (default 30), since the server may have closed it in the
+meantime. Otherwise a dead connection shows up as a connection error on
+the statement itself. That error discards every pooled connection and
+starts the reconnect backoff: 0.5 s, doubling up to BACKOFF_MAX. Until
+the next attempt is due, checkouts raise Unavailable at once instead of
+waiting on the network. Listeners in on_connect run on the first
+connection and after every reconnect; DBManager uses this to replay the
+spill journal (src/spill.py).
+
+A forked worker (src/multicore.py) starts with an empty pool rather than
+using its parent's sockets.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from mysql.connector import Error, InterfaceError, errorcode
+from src.metrics import REGISTRY
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))          # idle connections kept open
+IDLE_CHECK = float(os.getenv('DB_IDLE_CHECK', '30'))     # seconds unused before a checkout pings
+BACKOFF_MIN = 0.5
+BACKOFF_MAX = 30.0
+
+# Errors that mean the server is gone or refusing us, not that the statement was bad
+CONNECTION_ERRNOS = {
+    errorcode.CR_CONNECTION_ERROR, errorcode.CR_CONN_HOST_ERROR, errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST, errorcode.CR_SERVER_LOST_EXTENDED, errorcode.ER_SERVER_SHUTDOWN,
+    errorcode.ER_CLIENT_INTERACTION_TIMEOUT, errorcode.ER_CON_COUNT_ERROR,
+}
+
+RECONNECTS = REGISTRY.counter('db_reconnects_total', "Times the database came back after an outage")
+DB_UP = REGISTRY.gauge('db_up', "1 while the database is reachable, 0 during reconnect backoff")
+
+class Unavailable(Error):
+    """Raised instead of connecting while the reconnect backoff is running."""
+
+def is_connection_error(e):
+    return isinstance(e, (Unavailable, InterfaceError)) or getattr(e, 'errno', None) in CONNECTION_ERRNOS
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+class _Lease:
+    __slots__ = ('connection', 'cursor', 'used', 'generation', 'fresh')
+
+    def __init__(self, connection, generation, fresh):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.used = time.monotonic()
+        self.generation = generation
+        self.fresh = fresh              # first connection after startup or an outage
+
+class ConnectionPool:
+    def __init__(self, connect, size=POOL_SIZE, idle_check=IDLE_CHECK):
+        self._connect = connect
+        self.size = size
+        self.idle_check = idle_check
+        self.on_connect = []            # callables(pool) run on the first connection and after every outage
+        self._lock = threading.Lock()
+        self._idle = []                 # leases, most recently used last
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._connected = False
+        self._generation = 0            # bumped by every outage; older leases are discarded
+        self.backoff = 0.0
+        self.retry_at = 0.0
+        self.down_since = None
+
+    @contextmanager
+    def cursor(self):
+        """A cursor on this thread's connection for the duration of the block."""
+        held = getattr(self._local, 'held', None)
+        if held is not None:
+            yield held.cursor
+            return
+        held = self._checkout()
+        self._local.held = held
+        broken = False
+        try:
+            if held.fresh:
+                held.fresh = False
+                for listener in self.on_connect:
+                    listener(self)
+            yield held.cursor
+        except Exception as e:
+            broken = is_connection_error(e)
+            if broken:
+                self._mark_down(e)
+            else:
+                # Don't hand a half-done transaction to the next caller
+                try:
+                    held.connection.rollback()
+                except Error:
+                    broken = True
+            raise
+        finally:
+            self._local.held = None
+            self._checkin(held, broken)
+
+    def _checkout(self):
+        if os.getpid() != self._pid:
+            # Forked child: the idle connections are the parent's sockets
+            self._lock = threading.Lock()
+            self._idle = []
+            self._pid = os.getpid()
+        with self._lock:
+            lease = self._idle.pop() if self._idle else None
+        if lease is not None:
+            if time.monotonic() - lease.used < self.idle_check:
+                return lease
+            try:
+                lease.connection.ping()
+                return lease
+            except Error:
+                _close_quietly(lease.connection)
+        return self._open()
+
+    def _open(self):
+        wait = self.retry_at - time.monotonic()
+        if wait > 0:
+            raise Unavailable(msg=f"database unreachable, next attempt in {wait:.1f}s")
+        try:
+            connection = self._connect()
+        except Error as e:
+            self._mark_down(e)
+            raise
+        with self._lock:
+            fresh = not self._connected or self.down_since is not None
+            if self.down_since is not None:
+                print(f"[DB] Reconnected after {time.monotonic() - self.down_since:.0f}s.")
+                RECONNECTS.inc()
+            self.backoff, self.retry_at, self.down_since = 0.0, 0.0, None
+            self._connected = True
+            generation = self._generation
+        DB_UP.set(1)
+        return _Lease(connection, generation, fresh)
+
+    def _checkin(self, lease, broken):
+        if broken or lease.generation != self._generation or os.getpid() != self._pid:
+            _close_quietly(lease.connection)
+            return
+        lease.used = time.monotonic()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(lease)
+                return
+        _close_quietly(lease.connection)
+
+    def _mark_down(self, error):
+        with self._lock:
+            now = time.monotonic()
+            if now < self.retry_at:
+                return      # Another thread already started this round of backoff
+            stale, self._idle = self._idle, []
+            self._generation += 1
+            self.backoff = min(self.backoff * 2, BACKOFF_MAX) if self.backoff else BACKOFF_MIN
+            self.retry_at = now + self.backoff
+            if self.down_since is None:
+                self.down_since = now
+        DB_UP.set(0)
+        for lease in stale:
+            _close_quietly(lease.connection)
+        print(f"[!] Database Connection Error: {error} (next attempt in {self.backoff:.1f}s)")
+
+# One pool per set of connection arguments, shared by every DBManager in the process
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def shared_pool(connect, args, on_connect=None):
+    """The pool for connect(**args), created (with the on_connect listener) on first use."""
+    key = tuple(sorted(args.items()))
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = ConnectionPool(lambda: connect(**args))
+            if on_connect:
+                pool.on_connect.append(on_connect)
+        return pool
@@ -0,0 +1,292 @@
+"""
+Inline anomaly detection: SYN floods, port scans and rate spikes.
+
+AnomalyDetector.add() is called once per decoded packet and only bumps a
+few dict counters for the current window (WINDOW_SECONDS long, aligned to
+multiples of WINDOW_SECONDS and driven by packet timestamps so pcap
+replays behave like live traffic). When a window closes, its counters are
+checked and thrown away:
+
+  * syn_flood       destination receiving many SYNs without ACK: at least
+                    SYN_FLOOD_MIN per window and SYN_FLOOD_RATIO times
+                    the ACK-bearing packets it got
+  * horizontal_scan source probing (TCP SYN, or UDP from a port >= 1024)
+                    HSCAN_HOSTS distinct hosts on one port
+  * vertical_scan   source probing VSCAN_PORTS distinct ports on one host
+  * rate_spike      source or destination sending/receiving far more than
+                    its EWMA baseline (mean + SPIKE_SIGMA standard
+                    deviations, and SPIKE_FACTOR times the mean)
+
+Memory is bounded: at most MAX_WINDOW_KEYS keys per counter per window,
+scan sets stop growing at their threshold, and at most MAX_BASELINES
+EWMA baselines are kept (least recently seen dropped first). Baselines
+are only updated in windows where the key was seen.
+
+Alerts are (detected_at, kind, severity, src, dst, detail) tuples handed
+to `export` (a PacketWriter feeding StorageBackend.log_alerts); the same
+(kind, key) is not reported again within ALERT_COOLDOWN seconds.
+
+With multi-process capture each worker only sees its shard of the
+traffic, so thresholds can't be checked per worker. Worker detectors get
+an `on_window` callback instead, which receives every closed window's
+counters. A WindowMerger in the coordinator adds up the workers'
+counters for each window and checks the totals, so the alerts are the
+same as in a single process.
+"""
+import math
+import os
+import time
+from collections import OrderedDict
+from src.fast_decode import PROTO_TCP, PROTO_UDP, TCP_SYN, TCP_ACK
+
+WINDOW_SECONDS = 5
+SYN_FLOOD_MIN = 200          # SYNs per window before the ratio is considered
+SYN_FLOOD_RATIO = 3.0        # SYNs per ACK-bearing packet
+HSCAN_HOSTS = 30             # distinct hosts on one port per window
+VSCAN_PORTS = 30             # distinct ports on one host per window
+SPIKE_MIN_PACKETS = 500      # ignore spikes below this many packets per window
+SPIKE_SIGMA = 4.0
+SPIKE_FACTOR = 3.0
+EWMA_ALPHA = 0.3
+WARMUP_WINDOWS = 3           # windows a baseline needs before it can flag spikes
+ALERT_COOLDOWN = 60
+MAX_WINDOW_KEYS = 50000
+MAX_BASELINES = 20000
+
+def _bump(counter, key, weight=1, limit=MAX_WINDOW_KEYS):
+    count = counter.get(key)
+    if count is None:
+        if len(counter) >= limit:
+            return False
+        counter[key] = weight
+    else:
+        counter[key] = count + weight
+    return True
+
+def _collect(sets, key, value, cap):
+    members = sets.get(key)
+    if members is None:
+        if len(sets) >= MAX_WINDOW_KEYS:
+            return
+        members = sets[key] = set()
+    if len(members) < cap:
+        members.add(value)
+
+def detection_enabled():
+    return os.getenv('DETECTION', 'on').lower() != 'off'
+
+# Window counters that are summed / unioned when workers' windows are merged
+_COUNTERS = ('src_packets', 'dst_packets', 'syns', 'acks')
+_SETS = (('hosts_by_port', HSCAN_HOSTS), ('ports_by_host', VSCAN_PORTS))
+
+class AnomalyDetector:
+    """Not thread-safe: owned by the capture thread, like FlowTable."""
+
+    def __init__(self, export, window=WINDOW_SECONDS, on_window=None):
+        self.export = export
+        self.window = window
+        self.on_window = on_window     # (window end, counters) instead of checking here
+        self.packets = 0
+        self.alerts = 0
+        self.overflow = 0          # keys that didn't fit in a full window counter
+        self.baselines = {'src': OrderedDict(), 'dst': OrderedDict()}   # key -> [mean, var, windows]
+        self._last_alert = {}
+        self._window_end = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self.src_packets = {}
+        self.dst_packets = {}
+        self.syns = {}             # dst -> SYN-only packets
+        self.acks = {}             # dst -> packets with ACK set
+        self.hosts_by_port = {}    # (src, dport) -> dsts probed
+        self.ports_by_host = {}    # (src, dst) -> dports probed
+
+    def add(self, record, ts=None, weight=1):
+        """weight > 1 when packets are being sampled: counters are scaled, scan sets are not."""
+        now = ts if ts is not None else time.time()
+        if self._window_end is None:
+            self._window_end = (now // self.window + 1) * self.window
+        elif now >= self._window_end:
+            self.expire(now)
+        self.packets += weight
+
+        src, dst = record.src, record.dst
+        if not _bump(self.src_packets, src, weight):
+            self.overflow += 1
+        if not _bump(self.dst_packets, dst, weight):
+            self.overflow += 1
+
+        probe = False
+        if record.proto == PROTO_TCP:
+            flags = record.flags
+            if flags & TCP_ACK:
+                _bump(self.acks, dst, weight)
+            elif flags & TCP_SYN:
+                _bump(self.syns, dst, weight)
+                probe = True
+        elif record.proto == PROTO_UDP:
+            # Replies from well-known services (DNS, NTP...) fan out over client ports
+            probe = record.sport >= 1024
+        if probe:
+            _collect(self.hosts_by_port, (src, record.dport), dst, HSCAN_HOSTS)
+            _collect(self.ports_by_host, (src, dst), record.dport, VSCAN_PORTS)
+
+    def expire(self, now=None):
+        """
+        Closes the current window if it is over; also called when capture is
+        quiet, and by multicore workers for the frames outside their shard,
+        so their clock (watermark()) keeps up with the traffic.
+        """
+        now = now if now is not None else time.time()
+        if self._window_end is None:
+            self._window_end = (now // self.window + 1) * self.window
+            return
+        if now < self._window_end:
+            return
+        self._close_window(self._window_end)
+        # Skip over empty windows instead of closing them one by one
+        missed = (now - self._window_end) // self.window + 1
+        self._window_end += missed * self.window
+
+    def flush(self):
+        """Checks the partial window at the end of a capture."""
+        if self._window_end is not None:
+            self._close_window(self._window_end)
+            self._window_end = None
+
+    def watermark(self):
+        """Start of the open window: every window ending at or before it is closed. None before the first packet."""
+        return self._window_end - self.window if self._window_end is not None else None
+
+    def _close_window(self, at):
+        if self.on_window is not None:
+            if self.src_packets or self.dst_packets:
+                self.on_window(at, self.window_counters())
+            self._reset_window()
+        else:
+            self.check_window(at)
+
+    def window_counters(self):
+        """The open window's counters, as merge_counters() takes them (picklable)."""
+        return {name: getattr(self, name) for name in _COUNTERS + tuple(name for name, _cap in _SETS)}
+
+    def merge_counters(self, counters):
+        """Adds another detector's window_counters() to the open window."""
+        for name in _COUNTERS:
+            mine = getattr(self, name)
+            for key, count in counters[name].items():
+                if not _bump(mine, key, count):
+                    self.overflow += 1
+        for name, cap in _SETS:
+            mine = getattr(self, name)
+            for key, values in counters[name].items():
+                for value in values:
+                    _collect(mine, key, value, cap)
+
+    def stats(self):
+        return {'packets': self.packets, 'alerts': self.alerts, 'overflow': self.overflow}
+
+    # --- WINDOW CHECKS ---
+    def check_window(self, at):
+        """Checks the open window as the one ending at `at`, then starts a new one."""
+        self._check_thresholds(at)
+        self._reset_window()
+
+    def _check_thresholds(self, at):
+        for dst, syns in self.syns.items():
+            acks = self.acks.get(dst, 0)
+            if syns >= SYN_FLOOD_MIN and syns >= SYN_FLOOD_RATIO * max(acks, 1):
+                self._alert(at, 'syn_flood', 'high', None, dst,
+                            f"{syns} SYN vs {acks} ACK in {self.window}s")
+
+        for (src, dport), dsts in self.hosts_by_port.items():
+            if len(dsts) >= HSCAN_HOSTS:
+                self._alert(at, 'horizontal_scan', 'medium', src, None,
+                            f"{len(dsts)}+ hosts probed on port {dport} in {self.window}s")
+
+        for (src, dst), ports in self.ports_by_host.items():
+            if len(ports) >= VSCAN_PORTS:
+                self._alert(at, 'vertical_scan', 'medium', src, dst,
+                            f"{len(ports)}+ ports probed in {self.window}s")
+
+        self._check_rates(at, 'src', self.src_packets)
+        self._check_rates(at, 'dst', self.dst_packets)
+
+        # Forget cooldowns that have run out so the dict doesn't grow forever
+        self._last_alert = {key: t for key, t in self._last_alert.items() if at - t < ALERT_COOLDOWN}
+
+    def _check_rates(self, at, dimension, counts):
+        baselines = self.baselines[dimension]
+        for key, count in counts.items():
+            baseline = baselines.get(key)
+            if baseline is None:
+                if len(baselines) >= MAX_BASELINES:
+                    baselines.popitem(last=False)
+                baselines[key] = [float(count), 0.0, 1]
+                continue
+            baselines.move_to_end(key)
+            mean, var, windows = baseline
+            if (windows >= WARMUP_WINDOWS and count >= SPIKE_MIN_PACKETS
+                    and count > mean + SPIKE_SIGMA * math.sqrt(var) and count > SPIKE_FACTOR * mean):
+                src, dst = (key, None) if dimension == 'src' else (None, key)
+                self._alert(at, 'rate_spike', 'low', src, dst,
+                            f"{count} packets in {self.window}s vs baseline {mean:.0f}")
+            diff = count - mean
+            baseline[0] = mean + EWMA_ALPHA * diff
+            baseline[1] = (1 - EWMA_ALPHA) * (var + EWMA_ALPHA * diff * diff)
+            baseline[2] = windows + 1
+
+    def _alert(self, at, kind, severity, src, dst, detail):
+        key = (kind, src, dst)
+        last = self._last_alert.get(key)
+        if last is not None and at - last < ALERT_COOLDOWN:
+            return
+        self._last_alert[key] = at
+        self.alerts += 1
+        print(f"[Alert] {kind} ({severity}) {src or '*'} -> {dst or '*'}: {detail}")
+        self.export((at, kind, severity, src, dst, detail))
+
+class WindowMerger:
+    """
+    Central detection for multi-process capture (see src/multicore.py).
+
+    Workers report each closed window (add_window) and how far their
+    clock has got (advance). Window `at` is checked once every worker's
+    watermark has reached it, on the sum of all workers' counters, by one
+    AnomalyDetector, so thresholds, baselines and cooldowns see the whole
+    traffic. A finished worker no longer holds windows back.
+    """
+
+    def __init__(self, export, workers, window=WINDOW_SECONDS):
+        self.detector = AnomalyDetector(export, window)
+        self.pending = {}                                # window end -> [counters]
+        self.watermarks = {worker: None for worker in range(workers)}
+
+    def add_window(self, worker, at, counters):
+        self.pending.setdefault(at, []).append(counters)
+
+    def advance(self, worker, watermark):
+        if watermark is not None and self.watermarks.get(worker) != math.inf:
+            self.watermarks[worker] = watermark
+        self._release()
+
+    def finish(self, worker):
+        self.watermarks[worker] = math.inf
+        self._release()
+
+    def flush(self):
+        """Checks whatever is still pending (all workers have stopped)."""
+        self._release(math.inf)
+
+    def _release(self, limit=None):
+        if limit is None:
+            if None in self.watermarks.values():
+                return      # A worker hasn't seen any traffic yet
+            limit = min(self.watermarks.values())
+        detector = self.detector
+        for at in sorted(at for at in self.pending if at <= limit):
+            for counters in self.pending.pop(at):
+                detector.merge_counters(counters)
+                detector.packets += sum(counters['src_packets'].values())
+            detector.check_window(at)
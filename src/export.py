@@ -0,0 +1,288 @@
+"""
+Report and raw-data exports for a time range, meant to run off the GUI thread.
+
+Raw exports stream packet_logs / flow_logs rows from
+StorageBackend.stream_logs() straight into the file one chunk at a time,
+so memory use is the same for an hour or a month of traffic. Rows that
+retention has moved to the archive (src/archive.py) come first:
+
+  * .csv       header row + one line per row
+  * .csv.gz    the same, gzip-compressed while writing
+  * .parquet   one row group per chunk (needs pyarrow)
+
+The PDF report is built from the rollup tables and flow aggregates only,
+never from raw rows, and its charts are rendered to PNG in memory.
+
+Every export reports progress(fraction, rows) and checks a cancel Event
+between chunks; a cancelled export removes its partial file and raises
+ExportCancelled. fpdf, matplotlib and pyarrow are imported on first use.
+"""
+import csv
+import gzip
+import io
+import os
+import time
+from datetime import datetime
+from src.fast_decode import proto_name, PROTO_TCP, PROTO_UDP
+from src.archive import historical_logs
+from src.log_query import LOG_TABLES
+
+EXPORT_CHUNK = 50000          # rows per fetch / CSV write / Parquet row group
+RAW_FORMATS = ('.csv', '.csv.gz', '.parquet')
+
+class ExportError(Exception):
+    pass
+
+class ExportCancelled(Exception):
+    pass
+
+def export_format(path):
+    for ext in RAW_FORMATS:
+        if path.lower().endswith(ext):
+            return ext
+    raise ExportError(f"Unsupported export format for '{os.path.basename(path)}' (use {', '.join(RAW_FORMATS)})")
+
+def _range_label(start, end):
+    fmt = lambda ts: datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+    if start is None and end is None:
+        return "All Time"
+    return f"{fmt(start) if start is not None else 'start'} to {fmt(end) if end is not None else 'now'}"
+
+# --- RAW ROWS ---
+def export_logs(db, path, table='packet_logs', start=None, end=None, progress=None, cancel=None):
+    """Streams every row of `table` in [start, end) to path; returns the row count."""
+    fmt = export_format(path)
+    columns = ('id',) + LOG_TABLES[table][1]
+    # Rows arrive in time order, so progress is how far through the range we are
+    first = start
+    last = end if end is not None else time.time()
+    rows_written = 0
+    chunks = historical_logs(db, table, start, end, EXPORT_CHUNK)
+    writer = ParquetSink(path, table, columns) if fmt == '.parquet' else _CsvSink(path, columns, fmt == '.csv.gz')
+    try:
+        for rows in chunks:
+            if cancel is not None and cancel.is_set():
+                raise ExportCancelled()
+            writer.write(rows)
+            rows_written += len(rows)
+            if progress:
+                if first is None:
+                    first = rows[0][1].timestamp()
+                span = last - first
+                progress(min((rows[-1][1].timestamp() - first) / span, 1.0) if span > 0 else 1.0, rows_written)
+        writer.close()
+    except BaseException:
+        chunks.close()
+        writer.close()
+        os.remove(path)
+        raise
+    if progress:
+        progress(1.0, rows_written)
+    print(f"[Export] {rows_written} {table} rows ({_range_label(start, end)}) written to {path}.")
+    return rows_written
+
+class _CsvSink:
+    def __init__(self, path, columns, compress):
+        self.file = gzip.open(path, 'wt', newline='') if compress else open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class ParquetSink:
+    def __init__(self, path, table, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow (pip install pyarrow).")
+        types = {
+            'id': pa.int64(), 'captured_at': pa.timestamp('us'), 'last_seen': pa.timestamp('ms'),
+            'src_ip': pa.string(), 'dst_ip': pa.string(), 'src_port': pa.uint16(), 'dst_port': pa.uint16(),
+            'protocol': pa.uint8(), 'length': pa.uint32(), 'flags': pa.uint16(),
+            'packets': pa.uint64(), 'bytes': pa.uint64(),
+        }
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(col, types[col]) for col in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        data = dict(zip(self.columns, zip(*rows)))
+        self.writer.write_table(self.pa.Table.from_pydict(data, schema=self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+# --- PDF REPORT ---
+def _chart_png(draw, size=(10, 4)):
+    """PNG bytes of a chart drawn by draw(ax), without pyplot (safe off the Tk thread)."""
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=size, facecolor='white')
+    ax = fig.add_subplot()
+    ax.set_facecolor('white')
+    ax.tick_params(colors='black')
+    for spine in ax.spines.values():
+        spine.set_color('black')
+    draw(ax)
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=100)
+    buf.seek(0)
+    return buf
+
+def export_pdf(db, path, start=None, end=None, session_talkers=None, progress=None, cancel=None):
+    """
+    Security report for [start, end) from aggregates: protocol totals, the
+    traffic series, top talkers and conversations, and the alerts raised.
+    session_talkers are the in-memory sketch rows for the current session.
+    """
+    from fpdf import FPDF
+    from fpdf.enums import XPos, YPos
+
+    covering = _range_label(start, end)
+
+    class PDFReport(FPDF):
+        def header(self):
+            # Professional Dark Header
+            self.set_fill_color(30, 30, 47) # Dark Navy
+            self.rect(0, 0, 210, 40, 'F')
+
+            self.set_font('Helvetica', 'B', 20)
+            self.set_text_color(255, 255, 255)
+            self.cell(0, 15, 'NetGuard Security Report', new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+
+            # Timestamp and covered range
+            self.set_font('Helvetica', 'I', 10)
+            self.set_text_color(200, 200, 200)
+            self.cell(0, 10, f'Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}  |  Range: {covering}',
+                      new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+            self.ln(10)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Helvetica', 'I', 8)
+            self.set_text_color(128, 128, 128)
+            self.cell(0, 10, f'Page {self.page_no()}', new_x=XPos.RIGHT, new_y=YPos.TOP, align='C')
+
+    def heading(text):
+        pdf.set_font("Helvetica", "B", 14)
+        pdf.set_text_color(0, 0, 0)
+        pdf.cell(0, 10, text, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def table(headers, widths, rows):
+        pdf.set_font("Helvetica", "B", 10)
+        pdf.set_fill_color(200, 200, 200)
+        for i, h in enumerate(headers):
+            pdf.cell(widths[i], 8, h, border=1, align='C', fill=True)
+        pdf.ln()
+        pdf.set_font("Helvetica", "", 9)
+        fill = False
+        for row in rows:
+            pdf.set_fill_color(240, 240, 240) if fill else pdf.set_fill_color(255, 255, 255)
+            for i, value in enumerate(row):
+                pdf.cell(widths[i], 7, "-" if value is None else str(value), border=1, align='C', fill=True)
+            pdf.ln()
+            fill = not fill
+        pdf.ln(5)
+
+    sections = 6
+    def step(done):
+        if cancel is not None and cancel.is_set():
+            raise ExportCancelled()
+        if progress:
+            progress(done / sections, 0)
+
+    pdf = PDFReport()
+    pdf.add_page()
+
+    # --- SUMMARY SECTION ---
+    step(0)
+    totals = db.protocol_totals(start, end)
+    total_packets = sum(packets for packets, _ in totals.values())
+    total_bytes = sum(size for _, size in totals.values())
+    heading("Executive Summary")
+    pdf.set_font("Helvetica", "", 12)
+    pdf.cell(50, 10, f"Total Packets: {total_packets}", border=1)
+    pdf.cell(50, 10, f"TCP Packets: {totals.get(PROTO_TCP, (0, 0))[0]}", border=1)
+    pdf.cell(50, 10, f"UDP Packets: {totals.get(PROTO_UDP, (0, 0))[0]}", border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.cell(50, 10, f"Total Traffic: {total_bytes / 1e6:.1f} MB", border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(5)
+    if totals:
+        table(["Protocol", "Packets", "Bytes", "Share"], [40, 40, 40, 30],
+              [(proto_name(proto), packets, size, f"{packets / total_packets:.1%}" if total_packets else "-")
+               for proto, (packets, size) in sorted(totals.items(), key=lambda item: -item[1][0])])
+
+    # --- CHART SECTION ---
+    step(1)
+    span = (end if end is not None else time.time()) - (start if start is not None else 0)
+    series = db.traffic_series(start, end, '1m' if span <= 2 * 86400 else '1h')
+    heading("Traffic Over Time")
+    if series:
+        def draw_series(ax):
+            times = [datetime.fromtimestamp(bucket) for bucket, _, _ in series]
+            ax.fill_between(times, [packets for _, packets, _ in series], color='#4a90e2', alpha=0.4)
+            ax.plot(times, [packets for _, packets, _ in series], color='#4a90e2')
+            ax.set_ylabel("Packets", color='black')
+            ax.figure.autofmt_xdate()
+        pdf.image(_chart_png(draw_series), x=10, w=190)
+        pdf.ln(5)
+    else:
+        pdf.cell(0, 10, "(No data available for chart)", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    step(2)
+    sources = db.top_talkers('src', start, end, limit=10)
+    if sources:
+        pdf.add_page()
+        heading("Top 5 Threat Actors (Source IPs)")
+        def draw_sources(ax):
+            ax.bar([ip for ip, _, _ in sources[:5]], [packets for _, packets, _ in sources[:5]], color='#4a90e2')
+            ax.set_xlabel("IP Address", color='black')
+            ax.set_ylabel("Packet Count", color='black')
+        pdf.image(_chart_png(draw_sources), x=10, w=190)
+        pdf.ln(5)
+
+    # --- TOP TALKERS / CONVERSATIONS ---
+    step(3)
+    for dimension, title in (('src', "Top Sources"), ('dst', "Top Destinations")):
+        talkers = sources if dimension == 'src' else db.top_talkers('dst', start, end, limit=10)
+        if talkers:
+            heading(title)
+            table(["IP Address", "Packets", "Bytes"], [70, 50, 50], talkers)
+    step(4)
+    flows = db.top_flows(start, end, limit=10)
+    if flows:
+        heading("Top Conversations")
+        table(["Source", "Destination", "Proto", "Packets", "Bytes"], [50, 50, 20, 30, 35],
+              [(f"{src}:{sport}", f"{dst}:{dport}", proto_name(proto), packets, size)
+               for src, sport, dst, dport, proto, packets, size in flows])
+
+    # --- SKETCH SECTION (this session, from memory) ---
+    if session_talkers:
+        heading("Approximate Top Talkers (Current Session)")
+        pdf.set_font("Helvetica", "I", 8)
+        pdf.cell(0, 6, "Packet counts may overstate by at most the error shown; distinct counts are within ~10%.",
+                 new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        table(["Source IP", "Packets", "Max Error", "Distinct Dst", "Distinct Ports"], [50, 35, 30, 35, 30], session_talkers)
+
+    # --- ALERTS SECTION ---
+    step(5)
+    alerts = db.alerts_in_range(start, end, 50)
+    heading("Recent Suspicious Activity (Alerts)")
+    if alerts:
+        table(["Time", "Kind", "Severity", "Source", "Destination"], [45, 35, 20, 45, 45],
+              [(ts.strftime("%Y-%m-%d %H:%M:%S"), kind, severity, src or "*", dst or "*")
+               for ts, kind, severity, src, dst, _detail in alerts])
+    else:
+        pdf.set_font("Helvetica", "", 10)
+        pdf.cell(0, 10, "(No alerts in this range)", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    step(sections)
+    pdf.output(path)
+    print(f"[Export] Report ({covering}) written to {path}.")
@@ -0,0 +1,233 @@
+import socket
+import struct
+import zlib
+from collections import namedtuple
+
+# Compact per-packet record. proto is the IP protocol number and flags the
+# raw TCP flag bits, so nothing here needs a scapy layer object.
+PacketRecord = namedtuple('PacketRecord', 'src dst proto length flags sport dport')
+
+# Link-layer types (pcap DLT numbers) we can decode without scapy
+DLT_NULL = 0
+DLT_EN10MB = 1
+DLT_RAW = 101
+DLT_LOOP = 108
+DLT_LINUX_SLL = 113
+DLT_LINUX_SLL2 = 276
+_DLT_RAW_ALIASES = (12, 14, DLT_RAW)  # BSD/OpenBSD values for raw IP
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+_VLAN_TYPES = (0x8100, 0x88A8, 0x9100)
+
+PROTO_ICMP = 1
+PROTO_TCP = 6
+PROTO_UDP = 17
+PROTO_ICMPV6 = 58
+
+PROTO_NAMES = {PROTO_ICMP: "ICMP", PROTO_TCP: "TCP", PROTO_UDP: "UDP", PROTO_ICMPV6: "ICMPV6"}
+
+# IPv6 extension headers we walk through to reach the transport header
+_IPV6_EXT_HEADERS = (0, 43, 60)   # hop-by-hop, routing, destination options
+_IPV6_FRAGMENT = 44
+_IPV6_AH = 51
+
+TCP_FLAG_LETTERS = "FSRPAUECN"   # bit order used by scapy's TCP.flags
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+_u16 = struct.Struct('!H').unpack_from
+_u16_pair = struct.Struct('!HH').unpack_from
+_u32_host = struct.Struct('=I').unpack_from
+_u32_net = struct.Struct('!I').unpack_from
+_ntoa = socket.inet_ntoa
+_ntop = socket.inet_ntop
+_AF_INET6 = socket.AF_INET6
+_crc32 = zlib.crc32
+
+
+class DecodeError(ValueError):
+    """Raised when a frame is malformed or uses a layout we don't handle."""
+
+
+def _network_offset(data, linktype):
+    """Link layer: returns (ethertype, offset of the network header)."""
+    if linktype == DLT_EN10MB:
+        if len(data) < 14:
+            raise DecodeError("short ethernet header")
+        ethertype = _u16(data, 12)[0]
+        offset = 14
+        while ethertype in _VLAN_TYPES:
+            if len(data) < offset + 4:
+                raise DecodeError("short vlan tag")
+            ethertype = _u16(data, offset + 2)[0]
+            offset += 4
+        return ethertype, offset
+    if linktype == DLT_LINUX_SLL:
+        if len(data) < 16:
+            raise DecodeError("short SLL header")
+        return _u16(data, 14)[0], 16
+    if linktype == DLT_LINUX_SLL2:
+        if len(data) < 20:
+            raise DecodeError("short SLL2 header")
+        return _u16(data, 0)[0], 20
+    if linktype in _DLT_RAW_ALIASES:
+        if not data:
+            raise DecodeError("empty frame")
+        version = data[0] >> 4
+        return (ETH_P_IP if version == 4 else ETH_P_IPV6 if version == 6 else 0), 0
+    if linktype == DLT_NULL or linktype == DLT_LOOP:
+        if len(data) < 4:
+            raise DecodeError("short loopback header")
+        family = (_u32_host if linktype == DLT_NULL else _u32_net)(data, 0)[0]
+        return (ETH_P_IP if family == 2 else ETH_P_IPV6 if family in (10, 24, 28, 30) else 0), 4
+    raise DecodeError(f"unsupported linktype {linktype}")
+
+
+def flow_hash(data, linktype=DLT_EN10MB):
+    """
+    Direction-independent hash of the address pair, read from the raw
+    header bytes. Deterministic across processes (crc32, not hash()), so
+    every capture worker agrees on which shard a conversation belongs to.
+    Fragments and both directions of a flow land on the same shard.
+    """
+    try:
+        ethertype, offset = _network_offset(data, linktype)
+    except DecodeError:
+        return 0
+    if ethertype == ETH_P_IP and len(data) >= offset + 20:
+        a, b = bytes(data[offset + 12:offset + 16]), bytes(data[offset + 16:offset + 20])
+    elif ethertype == ETH_P_IPV6 and len(data) >= offset + 40:
+        a, b = bytes(data[offset + 8:offset + 24]), bytes(data[offset + 24:offset + 40])
+    else:
+        return 0
+    return _crc32(a + b if a <= b else b + a)
+
+
+def decode_frame(data, linktype=DLT_EN10MB, wire_len=None):
+    """
+    Decodes a raw frame (bytes, bytearray or memoryview) straight from the
+    header bytes. Returns a PacketRecord, None for non-IP frames (ARP, LLDP...),
+    or raises DecodeError when the frame can't be parsed here.
+    """
+    length = wire_len if wire_len is not None else len(data)
+    ethertype, offset = _network_offset(data, linktype)
+
+    # --- Network layer ---
+    # Live frames cut short by a capture snaplen come without a wire length,
+    # so it is taken from the IP header when that says more than we got.
+    if ethertype == ETH_P_IP:
+        if len(data) < offset + 20:
+            raise DecodeError("short IPv4 header")
+        ver_ihl = data[offset]
+        ihl = (ver_ihl & 0x0F) * 4
+        if ver_ihl >> 4 != 4 or ihl < 20:
+            raise DecodeError("bad IPv4 header")
+        if wire_len is None:
+            length = max(length, offset + _u16(data, offset + 2)[0])
+        proto = data[offset + 9]
+        src = _ntoa(data[offset + 12:offset + 16])
+        dst = _ntoa(data[offset + 16:offset + 20])
+        # Non-first fragments carry no transport header
+        if _u16(data, offset + 6)[0] & 0x1FFF:
+            return PacketRecord(src, dst, proto, length, 0, 0, 0)
+        l4 = offset + ihl
+    elif ethertype == ETH_P_IPV6:
+        if len(data) < offset + 40:
+            raise DecodeError("short IPv6 header")
+        if data[offset] >> 4 != 6:
+            raise DecodeError("bad IPv6 header")
+        if wire_len is None:
+            length = max(length, offset + 40 + _u16(data, offset + 4)[0])
+        proto = data[offset + 6]
+        src = _ntop(_AF_INET6, data[offset + 8:offset + 24])
+        dst = _ntop(_AF_INET6, data[offset + 24:offset + 40])
+        l4 = offset + 40
+        while proto in _IPV6_EXT_HEADERS or proto == _IPV6_FRAGMENT or proto == _IPV6_AH:
+            if len(data) < l4 + 8:
+                raise DecodeError("short IPv6 extension header")
+            next_proto = data[l4]
+            if proto == _IPV6_FRAGMENT:
+                if _u16(data, l4 + 2)[0] & 0xFFF8:
+                    return PacketRecord(src, dst, next_proto, length, 0, 0, 0)
+                l4 += 8
+            elif proto == _IPV6_AH:
+                l4 += (data[l4 + 1] + 2) * 4
+            else:
+                l4 += (data[l4 + 1] + 1) * 8
+            proto = next_proto
+    else:
+        return None
+
+    # --- Transport layer (a truncated header just leaves ports at 0) ---
+    sport = dport = flags = 0
+    if proto == PROTO_TCP:
+        if len(data) >= l4 + 14:
+            sport, dport = _u16_pair(data, l4)
+            flags = data[l4 + 13] | ((data[l4 + 12] & 0x01) << 8)
+    elif proto == PROTO_UDP:
+        if len(data) >= l4 + 4:
+            sport, dport = _u16_pair(data, l4)
+    elif proto == PROTO_ICMP or proto == PROTO_ICMPV6:
+        # NetFlow convention: type/code packed into the destination port
+        if len(data) >= l4 + 2:
+            dport = (data[l4] << 8) | data[l4 + 1]
+
+    return PacketRecord(src, dst, proto, length, flags, sport, dport)
+
+
+def decode_with_scapy(data, linktype=DLT_EN10MB, wire_len=None):
+    """Slow path: full scapy dissection for frames decode_frame() rejects."""
+    from scapy.all import conf, Raw, IP, IPv6, TCP, UDP, ICMP
+    from scapy.layers.inet6 import _ICMPv6
+
+    length = wire_len if wire_len is not None else len(data)
+    layer = conf.l2types.num2layer.get(linktype, Raw)
+    packet = layer(bytes(data))
+
+    if IP in packet:
+        ip = packet[IP]
+        src, dst, proto = ip.src, ip.dst, ip.proto
+    elif IPv6 in packet:
+        ip = packet[IPv6]
+        src, dst, proto = ip.src, ip.dst, ip.nh
+    else:
+        return None
+
+    sport = dport = flags = 0
+    if TCP in packet:
+        proto = PROTO_TCP
+        sport, dport, flags = packet[TCP].sport, packet[TCP].dport, int(packet[TCP].flags)
+    elif UDP in packet:
+        proto = PROTO_UDP
+        sport, dport = packet[UDP].sport, packet[UDP].dport
+    else:
+        icmp = packet.getlayer(ICMP)
+        if icmp is not None:
+            proto = PROTO_ICMP
+        else:
+            icmp = packet.getlayer(_ICMPv6, _subclass=True)
+            proto = PROTO_ICMPV6 if icmp is not None else proto
+        if icmp is not None:
+            dport = (icmp.type << 8) | icmp.code
+    return PacketRecord(src, dst, proto, length, flags, sport, dport)
+
+
+def decode_packet(data, linktype=DLT_EN10MB, wire_len=None):
+    """Fast path first, scapy only for frames the fast path can't handle."""
+    try:
+        return decode_frame(data, linktype, wire_len)
+    except (DecodeError, IndexError, struct.error):
+        try:
+            return decode_with_scapy(data, linktype, wire_len)
+        except Exception:
+            return None
+
+
+def proto_name(proto):
+    return PROTO_NAMES.get(proto, "Other")
+
+
+def tcp_flags_str(flags):
+    """Same letters scapy prints for TCP.flags, e.g. 0x12 -> 'SA'."""
+    return "".join(letter for bit, letter in enumerate(TCP_FLAG_LETTERS) if flags & (1 << bit))
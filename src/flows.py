@@ -0,0 +1,115 @@
+"""
+Flow accounting: one row per conversation instead of one per packet.
+
+Packets are folded into a table keyed on the 5-tuple (src, dst, sport,
+dport, proto) that keeps packet and byte counts, first/last seen and the
+OR of all TCP flags. A flow is exported (handed to the `export` callable,
+normally a PacketWriter feeding StorageBackend.log_flows) when it
+
+  * has been idle for idle_timeout seconds,
+  * has been open for active_timeout seconds (long transfers are reported
+    in slices, like NetFlow's active timeout), or
+  * is the least recently seen flow when the table is full.
+
+Flows are unidirectional, so a TCP connection shows up as two rows. For
+ICMP, dport carries (type << 8) | code as produced by fast_decode.
+"""
+import time
+from collections import OrderedDict
+
+DEFAULT_IDLE_TIMEOUT = 15       # seconds without packets before a flow is exported
+DEFAULT_ACTIVE_TIMEOUT = 300    # longest a flow stays open before being reported
+DEFAULT_MAX_FLOWS = 200000      # memory bound; the oldest flow is evicted beyond this
+SWEEP_INTERVAL = 1.0            # how often idle flows are looked for
+
+class FlowRecord:
+    """Counters of one flow; __slots__ keeps it to a few dozen bytes."""
+    __slots__ = ('packets', 'bytes', 'flags', 'first_seen', 'last_seen')
+
+    def __init__(self, now):
+        self.packets = 0
+        self.bytes = 0
+        self.flags = 0
+        self.first_seen = now
+        self.last_seen = now
+
+class FlowTable:
+    """
+    Not thread-safe: owned by the capture thread that calls add().
+
+    The table is an OrderedDict kept in last-activity order (every packet
+    moves its flow to the end), so the idle sweep only looks at the front
+    and stops at the first flow that is still active; expiry costs O(1)
+    per exported flow rather than a scan of the whole table.
+    """
+
+    def __init__(self, export, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 active_timeout=DEFAULT_ACTIVE_TIMEOUT, max_flows=DEFAULT_MAX_FLOWS):
+        self.export = export
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max_flows
+        self.flows = OrderedDict()
+        self.packets = 0
+        self.exported = 0
+        self.evicted = 0
+        self._next_sweep = 0.0
+
+    def add(self, record, ts=None, weight=1):
+        """
+        Accounts one decoded PacketRecord; ts is the capture time (None = now)
+        and weight the number of packets it stands for when sampling.
+        """
+        now = ts if ts is not None else time.time()
+        key = (record.src, record.dst, record.sport, record.dport, record.proto)
+        flow = self.flows.get(key)
+        if flow is None:
+            if len(self.flows) >= self.max_flows:
+                self._export(*self.flows.popitem(last=False))
+                self.evicted += 1
+            flow = self.flows[key] = FlowRecord(now)
+        elif now - flow.first_seen >= self.active_timeout:
+            self._export(key, self.flows.pop(key))
+            flow = self.flows[key] = FlowRecord(now)
+        else:
+            self.flows.move_to_end(key)
+
+        flow.packets += weight
+        flow.bytes += record.length * weight
+        flow.flags |= record.flags
+        flow.last_seen = now
+        self.packets += weight
+
+        if now >= self._next_sweep:
+            self.expire(now)
+
+    def expire(self, now=None):
+        """Exports flows idle for idle_timeout; also called when capture is quiet."""
+        now = now if now is not None else time.time()
+        self._next_sweep = now + SWEEP_INTERVAL
+        cutoff = now - self.idle_timeout
+        flows = self.flows
+        while flows:
+            key = next(iter(flows))
+            if flows[key].last_seen > cutoff:
+                break
+            self._export(key, flows.pop(key))
+
+    def flush(self):
+        """Exports every open flow (end of capture)."""
+        while self.flows:
+            self._export(*self.flows.popitem(last=False))
+
+    def stats(self):
+        return {
+            'packets': self.packets,
+            'active_flows': len(self.flows),
+            'exported': self.exported,
+            'evicted': self.evicted,
+        }
+
+    def _export(self, key, flow):
+        src, dst, sport, dport, proto = key
+        self.export((src, dst, sport, dport, proto, flow.packets, flow.bytes, flow.flags,
+                     flow.first_seen, flow.last_seen))
+        self.exported += 1
@@ -0,0 +1,171 @@
+"""
+Server-side search and keyset paging for the Security Logs view.
+
+Pages are ordered by (time column, id) and addressed by the id of the
+row at their edge, never by OFFSET: the next (older) page holds the rows
+before the last row shown in that order, the previous (newer) one the
+rows after the first. The edge row's time is looked up by primary key
+inside the query, so the cursor stays a plain id and SQLite's REAL
+timestamps never round-trip through Python. Every time index ends with
+id (InnoDB appends the primary key, SQLite the rowid), so it serves the
+ORDER BY as well: a page costs the same whether it is the first or the
+millionth, and no COUNT(*) is ever needed.
+
+Filters map onto indexed columns:
+
+  * ip     one address or a CIDR block, matched against source OR
+           destination as two index scans (idx_src_time /
+           idx_dst_time) merged with UNION. A single address is an
+           equality, so the index also gives the time order; a block
+           sorts the rows it matches
+  * proto  IP protocol number (idx_protocol_time on packet_logs)
+  * flags  TCP flag letters that must all be set, e.g. "S" or "SA"
+  * start/end  epoch seconds on captured_at / last_seen (indexed, and
+           used for partition pruning on a partitioned packet_logs)
+
+range_query() is the export counterpart: every row in a time range in
+time order, read through one streaming cursor instead of pages.
+
+Like src/rollups.py the builders take a dialect ("mysql" or "sqlite").
+"""
+import ipaddress
+from collections import namedtuple
+from src.fast_decode import PROTO_NAMES, TCP_FLAG_LETTERS
+
+PAGE_SIZE = 200
+
+LogFilter = namedtuple('LogFilter', 'ip proto flags start end', defaults=(None, None, None, None, None))
+
+# table -> (time column, columns after id in row order)
+LOG_TABLES = {
+    'packet_logs': ('captured_at', ('captured_at', 'src_ip', 'dst_ip', 'protocol', 'length', 'flags')),
+    'flow_logs': ('last_seen', ('last_seen', 'src_ip', 'src_port', 'dst_ip', 'dst_port', 'protocol',
+                                'packets', 'bytes', 'flags')),
+}
+
+_DIALECTS = {
+    'mysql': {'param': '%s', 'ts': 'FROM_UNIXTIME(%s)', 'ntoa': 'INET6_NTOA({})'},
+    'sqlite': {'param': '?', 'ts': '?', 'ntoa': '{}'},
+}
+
+class FilterError(ValueError):
+    pass
+
+def parse_filter(ip='', proto='', flags='', start=None, end=None):
+    """
+    LogFilter from what the user typed. ip becomes a (first, last, size)
+    range of packed addresses; raises FilterError on anything invalid.
+    """
+    ip_range = None
+    if ip and ip.strip():
+        try:
+            network = ipaddress.ip_network(ip.strip(), strict=False)
+        except ValueError:
+            raise FilterError(f"'{ip}' is not an IP address or CIDR block")
+        ip_range = (network.network_address.packed, network.broadcast_address.packed,
+                    len(network.network_address.packed))
+
+    proto_num = None
+    if proto and str(proto).strip():
+        text = str(proto).strip().upper()
+        by_name = {name: num for num, name in PROTO_NAMES.items()}
+        if text in by_name:
+            proto_num = by_name[text]
+        elif text.isdigit() and int(text) < 256:
+            proto_num = int(text)
+        else:
+            raise FilterError(f"Unknown protocol '{proto}'")
+
+    mask = None
+    if flags and flags.strip():
+        mask = 0
+        for letter in flags.strip().upper():
+            if letter not in TCP_FLAG_LETTERS:
+                raise FilterError(f"Unknown TCP flag '{letter}' (use {TCP_FLAG_LETTERS})")
+            mask |= 1 << TCP_FLAG_LETTERS.index(letter)
+
+    return LogFilter(ip_range, proto_num, mask, start, end)
+
+def page_query(table, log_filter=None, before_id=None, after_id=None, limit=PAGE_SIZE, dialect='mysql'):
+    """
+    SQL + params for one page of `table`, newest first. before_id pages
+    towards older rows, after_id towards newer ones (that page comes back
+    in ascending order; StorageBackend.search_logs() flips it). A cursor
+    row that has been deleted meanwhile gives an empty page.
+    """
+    time_col, columns = LOG_TABLES[table]
+    sql = _DIALECTS[dialect]
+    p = sql['param']
+    log_filter = log_filter or LogFilter()
+
+    where, params = [], []
+    for cursor_id, op in ((before_id, '<'), (after_id, '>')):
+        if cursor_id is not None:
+            # (time, id) op (cursor time, cursor id), in the form range optimizers take
+            edge = f"(SELECT {time_col} FROM {table} WHERE id = {p})"
+            where.append(f"{time_col} {op}= {edge} AND ({time_col} {op} {edge} OR id {op} {p})")
+            params += [cursor_id, cursor_id, cursor_id]
+    if log_filter.proto is not None:
+        where.append(f"protocol = {p}")
+        params.append(log_filter.proto)
+    if log_filter.flags:
+        where.append(f"(flags & {p}) = {p}")
+        params += [log_filter.flags, log_filter.flags]
+    if log_filter.start is not None:
+        where.append(f"{time_col} >= {sql['ts']}")
+        params.append(log_filter.start)
+    if log_filter.end is not None:
+        where.append(f"{time_col} < {sql['ts']}")
+        params.append(log_filter.end)
+
+    order = 'ASC' if after_id is not None else 'DESC'
+    order_by = f"ORDER BY {time_col} {order}, id {order} LIMIT {int(limit)}"
+    shown = ", ".join(sql['ntoa'].format(col) if col.endswith('_ip') else col for col in ('id',) + columns)
+
+    def select(columns_sql, extra, extra_params):
+        clauses = where + extra
+        body = f"SELECT {columns_sql} FROM {table}"
+        if clauses:
+            body += " WHERE " + " AND ".join(clauses)
+        return f"{body} {order_by}", params + extra_params
+
+    if not log_filter.ip:
+        return select(shown, [], [])
+
+    first, last, size = log_filter.ip
+    match = "= {p}" if first == last else "BETWEEN {p} AND {p}"
+    bounds = [first] if first == last else [first, last]
+    raw = ", ".join(('id',) + columns)
+    parts, union_params = [], []
+    # One index scan per side; UNION also drops rows matching on both
+    for column in ('src_ip', 'dst_ip'):
+        part, part_params = select(raw, [f"{column} {match.format(p=p)}", f"LENGTH({column}) = {size}"], bounds)
+        parts.append(f"SELECT * FROM ({part}) AS {column[:3]}")
+        union_params += part_params
+    query = f"SELECT {shown} FROM ({' UNION '.join(parts)}) AS u {order_by}"
+    return query, union_params
+
+def range_query(table, start=None, end=None, dialect='mysql', limit=None):
+    """
+    SQL + params for every row of `table` in [start, end) (or the first
+    `limit` of them), oldest first, in the same row layout as page_query().
+    Ordered by the time column so the time index (and partition pruning)
+    serves both the range and the order.
+    """
+    time_col, columns = LOG_TABLES[table]
+    sql = _DIALECTS[dialect]
+    where, params = [], []
+    if start is not None:
+        where.append(f"{time_col} >= {sql['ts']}")
+        params.append(start)
+    if end is not None:
+        where.append(f"{time_col} < {sql['ts']}")
+        params.append(end)
+    shown = ", ".join(sql['ntoa'].format(col) if col.endswith('_ip') else col for col in ('id',) + columns)
+    query = f"SELECT {shown} FROM {table}"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" ORDER BY {time_col}"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return query, params
@@ -0,0 +1,362 @@
+"""
+Pipeline instrumentation: per-stage counters, gauges and latency
+histograms, served over a local HTTP endpoint, summarised in a periodic
+log line, plus an opt-in sampling profiler.
+
+Metrics (all prefixed netguard_):
+
+  capture  packets_received_total    frames handed to packet_callback()
+           kernel_drops_total        dropped by the kernel before we read them
+                                     (AF_PACKET PACKET_STATISTICS, Linux)
+           packets_shed              skipped by load shedding (src/sampling.py)
+  decode   decode_seconds            histogram, 1 frame in 16
+           decode_failures_total     frames that were not IP
+  writers  writer_queue_depth        rows waiting, per writer (packets/flows/alerts)
+           writer_rows_total         rows stored
+           writer_dropped_total      rows lost because the queue was full
+           writer_failed_total       rows lost by a failed insert
+           insert_batch_seconds      histogram, per executemany() batch
+  gui      gui_frame_seconds         histogram, per dashboard frame
+
+Almost every metric has a single updating thread, so updates take no
+lock. A writer's losses are therefore two counters: the capture thread
+counts queue-full drops, the flush thread failed inserts. The spill
+counters are the exception (every writer thread can spill) and are only
+updated under a lock in src/spill.py. Capture workers (src/multicore.py)
+send export_state() with their counters. The coordinator adds them to its
+own values with set_remote().
+
+Configured in .env:
+
+  METRICS_PORT=9108        serve http://127.0.0.1:9108/metrics (Prometheus
+                           text) and /metrics.json; unset = no server
+  METRICS_LOG_INTERVAL=60  seconds between "[Metrics] ..." lines; 0 = off
+  PROFILER=on              enables /profile?seconds=N, which samples every
+                           thread's stack for N seconds and returns the
+                           hottest functions. Off by default: it costs CPU
+                           while it runs.
+"""
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter as Tally
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PREFIX = 'netguard_'
+# 1 us .. 10 s, roughly 2.5x apart: covers a frame decode up to a stalled INSERT
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+PROFILE_INTERVAL = 0.005    # seconds between stack samples
+PROFILE_MAX_SECONDS = 60
+
+class Counter:
+    kind = 'counter'
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def reset(self):
+        self.value = 0
+
+    def state(self):
+        return self.value
+
+class Gauge:
+    """A value that is set, or read from fn() at collection time."""
+    kind = 'gauge'
+    __slots__ = ('value', 'fn')
+
+    def __init__(self):
+        self.value = 0
+        self.fn = None
+
+    def set(self, value):
+        self.value = value
+
+    def reset(self):
+        self.value = 0
+        self.fn = None
+
+    def state(self):
+        if self.fn is not None:
+            try:
+                return self.fn()
+            except Exception:
+                return 0
+        return self.value
+
+class Histogram:
+    kind = 'histogram'
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot: above the largest bucket
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def state(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts), 'sum': self.sum}
+
+def quantile(state, q):
+    """Upper bound of the bucket holding the q-quantile of a histogram state (None if empty)."""
+    total = sum(state['counts'])
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for bound, count in zip(state['buckets'] + [float('inf')], state['counts']):
+        seen += count
+        if seen >= rank:
+            return bound
+    return float('inf')
+
+def _series(name, labels):
+    if not labels:
+        return PREFIX + name
+    inner = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return f"{PREFIX}{name}{{{inner}}}"
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()       # registration and remote states only
+        self._metrics = {}                  # series -> (name, kind, help, metric)
+        self._remote = {}                   # source -> export_state() of a worker
+
+    def _get(self, cls, name, help, labels):
+        series = _series(name, labels)
+        entry = self._metrics.get(series)
+        if entry is None:
+            with self._lock:
+                entry = self._metrics.setdefault(series, (name, cls.kind, help, cls()))
+        return entry[3]
+
+    def counter(self, name, help, **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, fn=None, **labels):
+        gauge = self._get(Gauge, name, help, labels)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help, **labels):
+        return self._get(Histogram, name, help, labels)
+
+    def reset(self):
+        """Zeroes everything in place (modules keep references to their metrics), e.g. in a forked worker."""
+        with self._lock:
+            for _name, _kind, _help, metric in self._metrics.values():
+                metric.reset()
+            self._remote.clear()
+
+    def export_state(self):
+        """{series: (name, kind, help, value)}, picklable and JSON-safe."""
+        with self._lock:
+            entries = list(self._metrics.items())
+        return {series: (name, kind, help, metric.state()) for series, (name, kind, help, metric) in entries}
+
+    def set_remote(self, source, state):
+        with self._lock:
+            self._remote[source] = state
+
+    def collect(self):
+        """This process's metrics plus every remote state, added up per series."""
+        merged = self.export_state()
+        with self._lock:
+            remotes = list(self._remote.values())
+        for state in remotes:
+            for series, (name, kind, help, value) in state.items():
+                mine = merged.get(series)
+                if mine is None:
+                    merged[series] = (name, kind, help, value)
+                elif kind == 'histogram':
+                    merged[series] = (name, kind, help, {
+                        'buckets': value['buckets'],
+                        'counts': [a + b for a, b in zip(mine[3]['counts'], value['counts'])],
+                        'sum': mine[3]['sum'] + value['sum'],
+                    })
+                else:
+                    merged[series] = (name, kind, help, mine[3] + value)
+        return merged
+
+    def render_prometheus(self):
+        lines = []
+        typed = set()
+        for series, (name, kind, help, value) in sorted(self.collect().items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {PREFIX}{name} {help}")
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            if kind != 'histogram':
+                lines.append(f"{series} {value}")
+                continue
+            # series is name{labels}: bucket lines add le="..." to the labels
+            base, _, labels = series.partition('{')
+            labels = labels.rstrip('}')
+            cumulative = 0
+            for bound, count in zip(value['buckets'] + ['+Inf'], value['counts']):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{base}_bucket{{{labels + ',' if labels else ''}{le}}} {cumulative}")
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{base}_sum{suffix} {value['sum']}")
+            lines.append(f"{base}_count{suffix} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self):
+        """{series: value}, histograms as count / sum / p50 / p95 / p99 (bucket upper bounds)."""
+        out = {}
+        for series, (name, kind, help, value) in sorted(self.collect().items()):
+            if kind == 'histogram':
+                value = {'count': sum(value['counts']), 'sum': value['sum'],
+                         'p50': quantile(value, 0.5), 'p95': quantile(value, 0.95), 'p99': quantile(value, 0.99)}
+            out[series] = value
+        return out
+
+REGISTRY = Registry()
+
+# --- PROFILER ---
+def profiling_enabled():
+    return os.getenv('PROFILER', 'off').lower() == 'on'
+
+def sample_profile(seconds, interval=PROFILE_INTERVAL, limit=25):
+    """
+    Statistical profile of every other thread: samples their stacks every
+    `interval` seconds and reports the functions seen most often on top
+    of the stack (self) and anywhere on it (total), as text.
+    """
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    own, total, threads = Tally(), Tally(), Tally()
+    samples = 0
+    deadline = time.monotonic() + min(seconds, PROFILE_MAX_SECONDS)
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            samples += 1
+            threads[names.get(ident, ident)] += 1
+            code = frame.f_code
+            own[f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"] += 1
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                key = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                if key not in seen:
+                    seen.add(key)
+                    total[key] += 1
+                frame = frame.f_back
+        time.sleep(interval)
+
+    lines = [f"{samples} stack samples over {seconds:g}s (every {interval * 1000:g} ms)", "",
+             "samples by thread:"]
+    lines += [f"  {count:7d}  {name}" for name, count in threads.most_common()]
+    for title, tally in (("self (top of stack)", own), ("total (anywhere on the stack)", total)):
+        lines += ["", f"{title}:"]
+        lines += [f"  {count / max(samples, 1):6.1%}  {key}" for key, count in tally.most_common(limit)]
+    return "\n".join(lines) + "\n"
+
+# --- EXPORT ---
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/metrics':
+            self._reply(200, REGISTRY.render_prometheus(), 'text/plain; version=0.0.4')
+        elif url.path == '/metrics.json':
+            self._reply(200, json.dumps(REGISTRY.as_dict(), indent=1), 'application/json')
+        elif url.path == '/profile':
+            if not profiling_enabled():
+                self._reply(403, "Profiler disabled (set PROFILER=on).\n", 'text/plain')
+                return
+            try:
+                seconds = float(parse_qs(url.query).get('seconds', ['10'])[0])
+            except ValueError:
+                seconds = 10.0
+            self._reply(200, sample_profile(seconds), 'text/plain')
+        else:
+            self._reply(404, "Try /metrics, /metrics.json or /profile?seconds=10\n", 'text/plain')
+
+    def _reply(self, status, body, content_type):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass   # Scrapes every few seconds would flood the console
+
+def start_http_server(port, host='127.0.0.1'):
+    """Serves the endpoints on a daemon thread; returns the server (or None if the port is taken)."""
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"[!] Metrics Endpoint Error: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="MetricsHTTP", daemon=True).start()
+    print(f"[Metrics] Serving http://{host}:{port}/metrics"
+          f"{' and /profile' if profiling_enabled() else ''}.")
+    return server
+
+class MetricsLogger(threading.Thread):
+    """Prints one summary line per interval: rates since the last line, latency percentiles, queues."""
+
+    def __init__(self, interval):
+        super().__init__(name="MetricsLogger", daemon=True)
+        self.interval = interval
+        self._last = {}
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            print(self.line())
+
+    def _delta(self, values, name):
+        total = sum(value for series, value in values.items() if series.startswith(PREFIX + name))
+        delta = total - self._last.get(name, 0)
+        self._last[name] = total
+        return delta
+
+    def line(self):
+        values = REGISTRY.as_dict()
+        def ms(series, q='p95'):
+            value = values.get(PREFIX + series)
+            return "-" if not value or value[q] is None else f"{value[q] * 1000:.2g}ms"
+        queued = sum(value for series, value in values.items() if series.startswith(PREFIX + 'writer_queue_depth'))
+        insert = 'insert_batch_seconds{writer="packets"}'
+        received = self._delta(values, 'packets_received_total')
+        return (f"[Metrics] {received / self.interval:.0f} packets/s, "
+                f"{self._delta(values, 'kernel_drops_total')} kernel drops, "
+                f"{self._delta(values, 'writer_dropped_total') + self._delta(values, 'writer_failed_total')} rows dropped | "
+                f"decode p50 {ms('decode_seconds', 'p50')} p99 {ms('decode_seconds', 'p99')} | "
+                f"insert p95 {ms(insert)} | {queued} rows queued | gui frame p95 {ms('gui_frame_seconds')}")
+
+def start_metrics():
+    """Starts the endpoint and log line as configured in .env (both optional)."""
+    port = os.getenv('METRICS_PORT')
+    if port:
+        start_http_server(int(port))
+    interval = float(os.getenv('METRICS_LOG_INTERVAL', '60'))
+    if interval > 0:
+        MetricsLogger(interval).start()
@@ -0,0 +1,223 @@
+"""
+Upgrades packet_logs from the original VARCHAR layout (v1) to the compact,
+indexed layout without holding long locks.
+
+    python -m src.migrate [--chunk-size 50000] [--pause 0.05] [--partition]
+
+Rows are copied into packet_logs_v2 in small primary-key ranges, each one
+its own short autocommit statement. Then the tables are swapped with a
+single atomic RENAME. The old table is kept as packet_logs_v1 until you
+drop it. An interrupted run resumes from the last copied id.
+
+While packet_logs is still v1, capture holds new packets on disk (see
+src/spill.py) rather than writing them into the old columns; they are
+written to the new table once the migration is done.
+
+A v2 table only lacks the destination-address indexes used by the log
+search (v3) and the sampling weight column (v4). Both are added in place
+with online DDL (LOCK=NONE), so capture can keep writing meanwhile.
+
+    python -m src.migrate --rebuild-rollups [--source packets|flows]
+
+Recomputes the minute/hour rollup tables from packet_logs (weighted by
+each row's sampling weight), or from flow_logs for flow-only capture. The
+source defaults to flow_logs when packet_logs is empty. Only buckets that
+start at or after the oldest source row are rebuilt: older ones (raw rows
+already expired by src/retention.py) are left as they are. Run it while
+capture is stopped.
+"""
+import argparse
+import time
+from mysql.connector import Error
+from src import rollups
+from src.database import DBManager, SCHEMA_VERSION, packet_logs_ddl
+from src.fast_decode import TCP_FLAG_LETTERS, PROTO_NAMES
+
+def _protocol_case():
+    whens = " ".join(f"WHEN '{name}' THEN {num}" for num, name in PROTO_NAMES.items())
+    return f"CASE UPPER(TRIM(protocol)) {whens} ELSE 0 END"
+
+def _flags_expr():
+    # 'SA' -> 0x12 etc.; v1 stored the literal string 'None' for non-TCP rows
+    bits = " | ".join(f"((INSTR(flags, '{letter}') > 0) << {bit})" for bit, letter in enumerate(TCP_FLAG_LETTERS))
+    return f"CASE WHEN flags IS NULL OR flags IN ('', 'None') THEN 0 ELSE {bits} END"
+
+def copy_sql(source, target):
+    return f"""
+    INSERT INTO {target} (id, src_ip, dst_ip, protocol, length, flags, captured_at)
+    SELECT id,
+           COALESCE(INET6_ATON(TRIM(src_ip)), ''),
+           COALESCE(INET6_ATON(TRIM(dst_ip)), ''),
+           {_protocol_case()},
+           COALESCE(length, 0),
+           {_flags_expr()},
+           COALESCE(captured_at, NOW())
+    FROM {source}
+    WHERE id > %s AND id <= %s
+    """
+
+def copy_range(cursor, source, target, start, end, chunk_size, pause):
+    """Copies ids in (start, end] chunk by chunk; returns the last id copied."""
+    query = copy_sql(source, target)
+    while start < end:
+        stop = min(start + chunk_size, end)
+        cursor.execute(query, (start, stop))
+        start = stop
+        print(f"[Migrate] Copied up to id {start} / {end}")
+        if pause:
+            time.sleep(pause)  # Let the live writer and GUI get a turn
+    return start
+
+# v3: (table, index, columns) the log search needs
+SEARCH_INDEXES = [
+    ('packet_logs', 'idx_dst_time', 'dst_ip, captured_at'),
+    ('flow_logs', 'idx_dst_time', 'dst_ip, last_seen'),
+]
+
+def add_search_indexes(cursor):
+    for table, index, columns in SEARCH_INDEXES:
+        cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """, (table, index))
+        if cursor.fetchone()[0]:
+            continue
+        print(f"[Migrate] Adding {index} to {table} (online, this can take a while on large tables)...")
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns}), ALGORITHM=INPLACE, LOCK=NONE")
+
+def add_weight_column(cursor):
+    """v4: the sampling weight of each row (1 for everything stored before)."""
+    cursor.execute("""
+    SELECT COUNT(*) FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'packet_logs' AND COLUMN_NAME = 'weight'
+    """)
+    if cursor.fetchone()[0]:
+        return
+    ddl = "ALTER TABLE packet_logs ADD COLUMN weight SMALLINT UNSIGNED NOT NULL DEFAULT 1 AFTER flags"
+    try:
+        cursor.execute(f"{ddl}, ALGORITHM=INSTANT")
+    except Error:
+        # Older servers rebuild the table, still without blocking writers
+        print("[Migrate] Adding weight to packet_logs (online, this can take a while on large tables)...")
+        cursor.execute(f"{ddl}, ALGORITHM=INPLACE, LOCK=NONE")
+
+def clear_table(cursor, table, chunk_size, pause, where="1", params=()):
+    """Deletes the rows matching `where` in short DELETEs instead of one long transaction."""
+    while True:
+        cursor.execute(f"DELETE FROM {table} WHERE {where} LIMIT {int(chunk_size)}", params)
+        if cursor.rowcount < chunk_size:
+            return
+        if pause:
+            time.sleep(pause)
+
+def rebuild_rollups(chunk_size=50000, pause=0.05, source=None):
+    db = DBManager()
+    try:
+        with db.checkout() as cursor:
+            if source is None:
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM packet_logs)")
+                source = 'packets' if cursor.fetchone()[0] else 'flows'
+            if source == 'packets' and (db.schema_version() or SCHEMA_VERSION) < 4:
+                print("[!] packet_logs has no weight column yet; run 'python -m src.migrate' first.")
+                return False
+            table, time_col = rollups.BACKFILL_SOURCES[source][:2]
+            cursor.execute(f"SELECT MIN(id), MAX(id), UNIX_TIMESTAMP(MIN({time_col})) FROM {table}")
+            min_id, max_id, oldest = cursor.fetchone()
+            if oldest is None:
+                print(f"[Migrate] {table} is empty; rollups left as they are.")
+                return True
+            # Buckets from the first one the raw rows cover completely; older
+            # buckets hold history the raw table no longer has
+            since = {resolution: -(-int(oldest) // seconds) * seconds
+                     for resolution, seconds in rollups.RESOLUTIONS.items()}
+            print(f"[Migrate] Rebuilding rollups from {table} (rows since "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(oldest))}; older buckets are kept).")
+            for dimension in rollups.DIMENSIONS:
+                for resolution in rollups.RESOLUTIONS:
+                    clear_table(cursor, rollups.rollup_table(dimension, resolution), chunk_size, pause,
+                                "bucket >= FROM_UNIXTIME(%s)", (since[resolution],))
+            start = (min_id or 1) - 1
+            while start < (max_id or 0):
+                stop = min(start + chunk_size, max_id)
+                for dimension in rollups.DIMENSIONS:
+                    for resolution in rollups.RESOLUTIONS:
+                        cursor.execute(rollups.backfill_sql(dimension, resolution, source),
+                                       (start, stop, since[resolution]))
+                start = stop
+                print(f"[Migrate] Rolled up to id {start} / {max_id}")
+                if pause:
+                    time.sleep(pause)
+            print("[Migrate] Rollups rebuilt.")
+            return True
+    except Error as e:
+        print(f"[!] Rollup Rebuild Error: {e}")
+        return False
+    finally:
+        db.close()
+
+def _set_version(cursor):
+    cursor.execute("""
+    INSERT INTO schema_meta (name, version) VALUES ('packet_logs', %s)
+    ON DUPLICATE KEY UPDATE version = VALUES(version)
+    """, (SCHEMA_VERSION,))
+
+def migrate(chunk_size=50000, pause=0.05, partition=False):
+    db = DBManager()
+    try:
+        with db.checkout() as cursor:
+            version = db.schema_version()
+            if version is None or version >= SCHEMA_VERSION:
+                print(f"[Migrate] Nothing to do (packet_logs schema is v{version or SCHEMA_VERSION}).")
+                return True
+            if version in (2, 3):
+                add_search_indexes(cursor)
+                add_weight_column(cursor)
+                _set_version(cursor)
+                print(f"[Migrate] Done. packet_logs is now v{SCHEMA_VERSION}.")
+                return True
+
+            cursor.execute("SELECT MIN(id), MAX(id), MIN(captured_at) FROM packet_logs")
+            min_id, max_id, first_seen = cursor.fetchone()
+            first_day = first_seen.date() if first_seen else None
+            cursor.execute(packet_logs_ddl("packet_logs_v2", partitioned=partition, first_day=first_day))
+
+            # Resume support: skip whatever an earlier run already copied
+            cursor.execute("SELECT MAX(id) FROM packet_logs_v2")
+            done = cursor.fetchone()[0]
+            start = done if done is not None else (min_id or 1) - 1
+
+            last = copy_range(cursor, "packet_logs", "packet_logs_v2", start, max_id or 0, chunk_size, pause)
+
+            # Catch up with rows written while we were copying, then swap atomically
+            cursor.execute("SELECT MAX(id) FROM packet_logs")
+            last = copy_range(cursor, "packet_logs", "packet_logs_v2", last, cursor.fetchone()[0] or 0, chunk_size, 0)
+            cursor.execute("RENAME TABLE packet_logs TO packet_logs_v1, packet_logs_v2 TO packet_logs")
+
+            # Rows that slipped into the old table between the catch-up and the rename
+            cursor.execute("SELECT MAX(id) FROM packet_logs_v1")
+            copy_range(cursor, "packet_logs_v1", "packet_logs", last, cursor.fetchone()[0] or 0, chunk_size, 0)
+
+            add_search_indexes(cursor)   # flow_logs may predate v3 as well
+            _set_version(cursor)
+            print(f"[Migrate] Done. packet_logs is now v{SCHEMA_VERSION}; the old table was kept as packet_logs_v1.")
+            return True
+    except Error as e:
+        print(f"[!] Migration Error: {e} (re-run to resume)")
+        return False
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upgrade packet_logs to the compact indexed schema.")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="rows copied per statement")
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between chunks")
+    parser.add_argument("--partition", action="store_true", help="create the new table with daily partitions")
+    parser.add_argument("--rebuild-rollups", action="store_true", help="recompute rollup tables from packet_logs")
+    parser.add_argument("--source", choices=sorted(rollups.BACKFILL_SOURCES),
+                        help="rows to rebuild the rollups from (default: packets, or flows if packet_logs is empty)")
+    args = parser.parse_args()
+    if args.rebuild_rollups:
+        ok = rebuild_rollups(args.chunk_size, args.pause, args.source)
+    else:
+        ok = migrate(args.chunk_size, args.pause, args.partition)
+    raise SystemExit(0 if ok else 1)
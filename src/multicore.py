@@ -0,0 +1,253 @@
+"""
+Multi-process capture: N workers, each with its own decoder, aggregator,
+flow table and PacketWriter (and therefore its own DB connection), so the pipeline is no
+longer limited to the one core the GIL gives a single process.
+
+Packets are sharded by flow so each conversation is handled by one worker:
+  * live capture: Linux AF_PACKET sockets joined into one PACKET_FANOUT group
+    in hash mode; the kernel spreads flows across the workers' sockets.
+  * pcap replay: every worker maps the same file and keeps only the frames
+    whose flow_hash() falls in its shard.
+
+The capture profile (src/capture_config.py) applies to both: its BPF
+program is attached to every fanout socket, and replay workers run the
+same filter over the file.
+
+Workers push their counters to the coordinator once a second; the
+coordinator merges them into backend_sniffer.live_stats for the dashboard
+and hands their pipeline metrics to src/metrics.py.
+
+Detection is split the same way. Each worker counts its shard's packets
+per window and sends the closed windows along, together with its
+watermark (how far its clock has got). The coordinator's WindowMerger
+adds up the workers' counters and checks each window once. It then
+stores the alerts through its own alert writer, so a SYN flood spread
+over the workers still raises one alert, against the single-process
+thresholds. Replay workers advance their clock on every frame of the
+file, including frames outside their shard.
+"""
+import multiprocessing
+import os
+import queue
+import socket
+import time
+from src import backend_sniffer
+from src.backend_sniffer import CaptureSinks, KernelDropCounter, packet_callback, live_stats, stop_sniffer_flag
+from src.capture_config import (active_profile, attach_program, compile_program, set_promisc,
+                                CaptureConfigError, OfflineFilter)
+from src.detection import WindowMerger, detection_enabled
+from src.fast_decode import flow_hash, DLT_EN10MB
+from src.metrics import REGISTRY
+from src.packet_writer import PacketWriter
+from src.pcap_reader import PcapReader
+from src.storage import get_storage
+
+# Linux <linux/if_packet.h> constants (not exposed by the socket module)
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_FANOUT = 18
+PACKET_FANOUT_HASH = 0
+PACKET_FANOUT_FLAG_DEFRAG = 0x8000
+
+STATE_INTERVAL = 1.0      # seconds between worker -> coordinator updates
+RECV_BUFFER = 65536
+
+def _open_fanout_socket(iface, group_id, program=None, promisc=False):
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+    # The filter goes on before bind so no unfiltered frame is ever queued
+    if program:
+        attach_program(sock, program)
+    if iface:
+        sock.bind((iface, 0))
+        if promisc:
+            set_promisc(sock, iface)
+    # Flow-hash fanout; DEFRAG keeps IP fragments on the same worker
+    mode = PACKET_FANOUT_HASH | PACKET_FANOUT_FLAG_DEFRAG
+    sock.setsockopt(SOL_PACKET, PACKET_FANOUT, group_id | (mode << 16))
+    sock.settimeout(backend_sniffer.STOP_POLL_INTERVAL)
+    return sock
+
+def _capture_live(iface, options, sinks, stop_event, publish):
+    sock = _open_fanout_socket(iface, options['group_id'], options['program'], options['profile'].promisc)
+    buf = bytearray(RECV_BUFFER)
+    view = memoryview(buf)
+    drops = KernelDropCounter(sock)
+    try:
+        while not stop_event.is_set():
+            drops.poll()
+            try:
+                n = sock.recv_into(buf)
+            except socket.timeout:
+                sinks.tick()
+                publish()
+                continue
+            packet_callback(view[:n], sinks.writer, DLT_EN10MB, flows=sinks.flows, detector=sinks.detector,
+                            sampler=sinks.sampler)
+            publish()
+    finally:
+        drops.poll(force=True)
+        sock.close()
+
+def _capture_pcap(path, worker_id, workers, options, sinks, stop_event, publish):
+    realtime, speed = options['realtime'], options['speed']
+    offline = OfflineFilter(options['profile'])
+    detector = sinks.detector
+    started = time.perf_counter()
+    first_ts = None
+    for ts, linktype, frame, wire_len in PcapReader(path):
+        if stop_event.is_set():
+            break
+        if flow_hash(frame, linktype) % workers != worker_id:
+            # Other workers' frames still move our detection clock on
+            if detector is not None and ts is not None:
+                detector.expire(ts)
+            continue
+        if not offline.accepts(frame, linktype, wire_len):
+            continue
+        frame = frame[:offline.snaplen]
+        if realtime and ts is not None:
+            if first_ts is None:
+                first_ts = ts
+            delay = (ts - first_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        packet_callback(frame, sinks.writer, linktype, ts, wire_len, sinks.flows, sinks.detector)
+        publish()
+
+def _worker_main(worker_id, workers, source, stop_event, state_queue, db_factory):
+    """Entry point of one capture process."""
+    kind, target, options = source
+    live_stats.reset()   # Fresh per-process counters (inherited copy under fork)
+    REGISTRY.reset()
+    windows = []         # closed detection windows not sent yet
+    sinks = CaptureSinks(block=(kind == 'pcap'), db_factory=db_factory,
+                         on_window=lambda at, counters: windows.append((at, counters)))
+    sinks.start()
+    last_sent = [0.0]
+
+    def publish(force=False):
+        now = time.monotonic()
+        if force or now - last_sent[0] >= STATE_INTERVAL:
+            last_sent[0] = now
+            detection = None
+            if sinks.detector is not None:
+                detection = (windows[:], sinks.detector.watermark())
+                windows.clear()
+            state_queue.put((worker_id, live_stats.export_state(), sinks.stats(), REGISTRY.export_state(), detection))
+
+    try:
+        if kind == 'live':
+            _capture_live(target, options, sinks, stop_event, publish)
+        else:
+            _capture_pcap(target, worker_id, workers, options, sinks, stop_event, publish)
+    except Exception as e:
+        print(f"[Worker {worker_id} Error] {e}")
+    finally:
+        sinks.stop()
+        publish(force=True)
+        state_queue.put((worker_id, None, None, None, None))   # Done marker
+
+class MultiCoreCapture:
+    """
+    Coordinator: starts the workers, merges their counters into live_stats,
+    adds up their writer statistics and runs the merged detection.
+    """
+
+    def __init__(self, workers=None, iface=None, pcap_path=None, realtime=False, db_factory=get_storage, profile=None,
+                 speed=1.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.profile = profile or active_profile()
+        if pcap_path:
+            self.source = ('pcap', pcap_path, {'realtime': realtime, 'speed': speed, 'profile': self.profile})
+        else:
+            # Compiled here so a bad filter fails once, not in every worker
+            self.source = ('live', iface or self.profile.iface,
+                           {'group_id': os.getpid() & 0xFFFF, 'profile': self.profile,
+                            'program': compile_program(self.profile)})
+        self.db_factory = db_factory
+        self.states = {}
+        self.writer_stats = {}
+        self.alert_writer = None
+        self.merger = None
+
+    def run(self):
+        """Blocks until stop_sniffer_flag is set (live) or the file is done (pcap)."""
+        ctx = multiprocessing.get_context()
+        stop_event = ctx.Event()
+        state_queue = ctx.Queue()
+        procs = [ctx.Process(target=_worker_main, name=f"CaptureWorker-{i}", daemon=True,
+                             args=(i, self.workers, self.source, stop_event, state_queue, self.db_factory))
+                 for i in range(self.workers)]
+
+        stop_sniffer_flag.clear()
+        started = time.perf_counter()
+        for proc in procs:
+            proc.start()
+        if detection_enabled():
+            # Started after the fork so no worker inherits the writer thread's locks
+            self.alert_writer = PacketWriter(db_factory=self.db_factory, block=True, flush_method='log_alerts')
+            self.alert_writer.start()
+            self.merger = WindowMerger(self.alert_writer.submit, self.workers)
+        print(f"[MultiCore] {self.workers} capture workers started ({self.source[0]}).")
+
+        running = self.workers
+        try:
+            while running:
+                if stop_sniffer_flag.is_set():
+                    stop_event.set()
+                try:
+                    worker_id, state, stats, metrics, detection = state_queue.get(timeout=backend_sniffer.STOP_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if state is None:
+                    running -= 1
+                    if self.merger:
+                        self.merger.finish(worker_id)
+                    continue
+                self.states[worker_id] = state
+                self.writer_stats[worker_id] = stats
+                REGISTRY.set_remote(worker_id, metrics)
+                live_stats.load_merged(self.states.values())
+                if self.merger and detection:
+                    closed, watermark = detection
+                    for at, counters in closed:
+                        self.merger.add_window(worker_id, at, counters)
+                    self.merger.advance(worker_id, watermark)
+        finally:
+            stop_event.set()
+            for proc in procs:
+                proc.join(timeout=10)
+            if self.merger:
+                self.merger.flush()
+                self.alert_writer.stop()
+
+        return self.summary(time.perf_counter() - started)
+
+    def summary(self, elapsed):
+        packets = sum(state['total_packets'] for state in self.states.values())
+        totals = {}
+        for stats in self.writer_stats.values():
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        if self.merger:
+            # Workers only count; the merged detector raises the alerts
+            totals.update({f"detect_{key}": value for key, value in self.merger.detector.stats().items()})
+        result = {
+            'workers': self.workers,
+            'packets': packets,
+            'seconds': elapsed,
+            'pps': packets / max(elapsed, 1e-9),
+            'per_worker': {wid: state['total_packets'] for wid, state in sorted(self.states.items())},
+            'writer': totals,
+        }
+        print(f"[MultiCore] {packets} packets in {elapsed:.2f}s ({result['pps']:.0f} packets/s), per worker {result['per_worker']}.")
+        return result
+
+def start_multicore_capture(workers=None, iface=None, pcap_path=None, realtime=False, profile=None, speed=1.0):
+    """Thread target for the GUI, mirroring start_sniffing_thread()."""
+    try:
+        capture = MultiCoreCapture(workers, iface, pcap_path, realtime, profile=profile, speed=speed)
+    except CaptureConfigError as e:
+        print(f"[MultiCore Error] {e}")
+        return None
+    return capture.run()
@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+from src.metrics import REGISTRY
+from src.storage import get_storage
+
+# Flush tuning: whichever limit is hit first triggers an INSERT batch
+DEFAULT_BATCH_SIZE = 500       # rows per executemany()
+DEFAULT_MAX_LATENCY = 0.5      # seconds a row may wait in the queue
+DEFAULT_QUEUE_SIZE = 50000     # rows buffered before we start dropping
+
+class PacketWriter:
+    """
+    Decouples packet capture from database latency.
+
+    The capture thread only appends rows to a bounded queue; a dedicated
+    flush thread owns the DB connection and writes the rows in multi-row
+    batches. When the queue is full, new rows are dropped (and counted)
+    instead of blocking the sniffer. Offline ingest passes block=True so the
+    file reader is throttled to database speed rather than losing rows.
+
+    flush_method names the StorageBackend bulk method the batches go to
+    ('log_packets' by default, 'log_flows' for exported flows) and
+    flush_options are extra keyword arguments for it.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, max_latency=DEFAULT_MAX_LATENCY,
+                 max_queue=DEFAULT_QUEUE_SIZE, db_factory=get_storage, block=False,
+                 flush_method='log_packets', flush_options=None):
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.block = block
+        self.db_factory = db_factory
+        self.flush_method = flush_method
+        self.flush_options = flush_options or {}
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        # Counters: queued/dropped are only updated by the capture thread,
+        # flushed/failed/batches only by the flush thread, so no lock is needed
+        self.queued = 0
+        self.dropped = 0           # queue full
+        self.flushed = 0
+        self.failed = 0            # rows the bulk insert did not store
+        self.batches = 0
+
+        # Same counters for the metrics endpoint, per kind of writer (packets/flows/alerts)
+        label = flush_method.replace('log_', '')
+        self._rows_metric = REGISTRY.counter('writer_rows_total', "Rows stored", writer=label)
+        self._dropped_metric = REGISTRY.counter('writer_dropped_total', "Rows lost because the queue was full", writer=label)
+        self._failed_metric = REGISTRY.counter('writer_failed_total', "Rows lost by a failed insert", writer=label)
+        self._latency_metric = REGISTRY.histogram('insert_batch_seconds', "Time per bulk insert batch", writer=label)
+        REGISTRY.gauge('writer_queue_depth', "Rows waiting to be written", fn=self.queue.qsize, writer=label)
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="PacketWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Signals the flush thread and waits until the queue is drained."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def log_packet(self, src, dst, proto, length, flags=0, captured_at=None, weight=1):
+        """Same signature as StorageBackend.log_packet, but never touches the DB."""
+        self.submit((src, dst, proto, length, flags, captured_at, weight))
+
+    def submit(self, row):
+        """Queues one row in the format expected by flush_method."""
+        try:
+            self.queue.put(row, block=self.block)
+            self.queued += 1
+        except queue.Full:
+            self.dropped += 1
+            self._dropped_metric.inc()
+
+    def fill(self):
+        """How full the queue is, 0.0 - 1.0."""
+        return self.queue.qsize() / self.queue.maxsize
+
+    def stats(self):
+        return {
+            'queued': self.queued,
+            'flushed': self.flushed,
+            'dropped': self.dropped + self.failed,
+            'failed': self.failed,
+            'batches': self.batches,
+            'queue_depth': self.queue.qsize(),
+        }
+
+    # --- FLUSH THREAD ---
+    def _run(self):
+        # The connection is created here so it is only ever used by this thread
+        db = self.db_factory()
+        write = getattr(db, self.flush_method)
+        batch = []
+        deadline = None
+        try:
+            while True:
+                timeout = self.max_latency if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                    if deadline is None:
+                        deadline = time.monotonic() + self.max_latency
+                except queue.Empty:
+                    pass
+
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    self._flush(write, batch)
+                    batch = []
+                    deadline = None
+
+                if self._stop_event.is_set() and self.queue.empty():
+                    break
+
+            # Final drain: anything still pending after the stop signal
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self._flush(write, batch)
+        finally:
+            db.close()
+            print(f"[Writer] Stopped. {self.stats()}")
+
+    def _flush(self, write, batch):
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start:start + self.batch_size]
+            started = time.perf_counter()
+            written = write(chunk, **self.flush_options)
+            self._latency_metric.observe(time.perf_counter() - started)
+            self.batches += 1
+            self.flushed += written
+            self.failed += len(chunk) - written
+            self._rows_metric.inc(written)
+            self._failed_metric.inc(len(chunk) - written)
@@ -0,0 +1,152 @@
+import mmap
+import os
+import struct
+
+# Classic pcap magic numbers (as read little-endian)
+PCAP_MAGIC_USEC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+
+# pcapng block types
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002     # obsolete Packet Block
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_OPT_TSRESOL = 9
+
+
+class PcapFormatError(ValueError):
+    """Raised when a capture file is neither a valid pcap nor pcapng file."""
+
+
+class PcapReader:
+    """
+    Streams packets out of a pcap or pcapng file in constant memory.
+
+    The file is memory-mapped and every record is yielded as
+    (timestamp, linktype, frame, wire_len), where frame is a memoryview
+    into the mapping (no copy). Frames are only valid until the next
+    iteration step, so consumers must decode them straight away.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.packets_read = 0
+        self.bytes_read = 0
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mm)
+            try:
+                magic = struct.unpack_from('<I', view, 0)[0]
+                if magic == PCAPNG_SHB:
+                    yield from self._read_pcapng(view)
+                else:
+                    yield from self._read_pcap(view)
+            finally:
+                try:
+                    view.release()
+                    mm.close()
+                except BufferError:
+                    # A consumer still holds a frame; the mapping is freed with it
+                    pass
+
+    # --- CLASSIC PCAP ---
+    def _read_pcap(self, view):
+        if len(view) < 24:
+            raise PcapFormatError("truncated pcap global header")
+
+        for endian in ('<', '>'):
+            magic = struct.unpack_from(endian + 'I', view, 0)[0]
+            if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+                break
+        else:
+            raise PcapFormatError(f"{self.path} is not a pcap/pcapng file")
+
+        ts_scale = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+        linktype = struct.unpack_from(endian + 'I', view, 20)[0] & 0x0FFFFFFF
+        record = struct.Struct(endian + 'IIII')
+
+        offset = 24
+        end = len(view)
+        while offset + 16 <= end:
+            ts_sec, ts_frac, incl_len, orig_len = record.unpack_from(view, offset)
+            offset += 16
+            if offset + incl_len > end:
+                break  # Truncated last record (capture still being written)
+            frame = view[offset:offset + incl_len]
+            offset += incl_len
+
+            self.packets_read += 1
+            self.bytes_read += orig_len
+            yield ts_sec + ts_frac * ts_scale, linktype, frame, orig_len
+            frame.release()
+
+    # --- PCAPNG ---
+    def _read_pcapng(self, view):
+        offset = 0
+        end = len(view)
+        endian = '<'
+        interfaces = []   # (linktype, ts_scale, snaplen) per interface id
+
+        while offset + 12 <= end:
+            block_type = struct.unpack_from(endian + 'I', view, offset)[0]
+
+            if block_type == PCAPNG_SHB:
+                # The byte-order magic tells us the endianness of this section
+                bom = struct.unpack_from('<I', view, offset + 8)[0]
+                endian = '<' if bom == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                interfaces = []
+
+            block_len = struct.unpack_from(endian + 'I', view, offset + 4)[0]
+            if block_len < 12 or offset + block_len > end:
+                break
+            body = offset + 8
+
+            if block_type == PCAPNG_IDB:
+                linktype, _reserved, snaplen = struct.unpack_from(endian + 'HHI', view, body)
+                ts_scale = self._idb_ts_scale(view, body + 8, offset + block_len - 4, endian)
+                interfaces.append((linktype, ts_scale, snaplen))
+
+            elif block_type in (PCAPNG_EPB, PCAPNG_PB):
+                if block_type == PCAPNG_EPB:
+                    if_id, ts_high, ts_low, cap_len, orig_len = struct.unpack_from(endian + 'IIIII', view, body)
+                else:
+                    if_id, _drops, ts_high, ts_low, cap_len, orig_len = struct.unpack_from(endian + 'HHIIII', view, body)
+                if if_id < len(interfaces):
+                    linktype, ts_scale, _snaplen = interfaces[if_id]
+                    frame = view[body + 20:body + 20 + cap_len]
+                    self.packets_read += 1
+                    self.bytes_read += orig_len
+                    yield ((ts_high << 32) | ts_low) * ts_scale, linktype, frame, orig_len
+                    frame.release()
+
+            elif block_type == PCAPNG_SPB and interfaces:
+                # Simple Packet Blocks have no timestamp and always use interface 0
+                linktype, _ts_scale, snaplen = interfaces[0]
+                orig_len = struct.unpack_from(endian + 'I', view, body)[0]
+                cap_len = min(orig_len, block_len - 16, snaplen or orig_len)
+                frame = view[body + 4:body + 4 + cap_len]
+                self.packets_read += 1
+                self.bytes_read += orig_len
+                yield None, linktype, frame, orig_len
+                frame.release()
+
+            offset += block_len
+
+    @staticmethod
+    def _idb_ts_scale(view, offset, end, endian):
+        """Reads the if_tsresol option; pcapng defaults to microseconds."""
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', view, offset)
+            if code == 0:
+                break
+            if code == PCAPNG_OPT_TSRESOL and length >= 1:
+                resol = view[offset + 4]
+                return 2.0 ** -(resol & 0x7F) if resol & 0x80 else 10.0 ** -resol
+            offset += 4 + ((length + 3) & ~3)
+        return 1e-6
@@ -0,0 +1,214 @@
+"""
+Time-based retention, enforced by a background job.
+
+Each policy keeps its tables for a maximum age set in .env; unset or 0
+keeps them forever (the default):
+
+    RETAIN_PACKETS=7d        packet_logs
+    RETAIN_FLOWS=30d         flow_logs
+    RETAIN_ALERTS=90d        alerts
+    RETAIN_ROLLUPS_1M=30d    minute rollups
+    RETAIN_ROLLUPS_1H=1y     hourly rollups (statistics and reports)
+
+Ages take an m/h/d/y suffix. RetentionJob runs one pass every
+RETENTION_INTERVAL (default 1h) on a connection of its own. Rows never go
+in one big DELETE. Each pass also adds the coming days' partitions to a
+daily-partitioned MySQL packet_logs (DB_PARTITIONING=daily), so the job
+runs for that alone even without a policy. A daily-partitioned MySQL packet_logs first drops the
+partitions that lie entirely before the cutoff, which is instant. The
+remaining rows are then deleted oldest first, RETENTION_CHUNK rows per
+short transaction, with a pause between chunks so capture writes keep
+flowing. Once the minute rollups have expired, statistics for those
+ranges are only accurate to the hour.
+
+With ARCHIVE_DIR set, expired packet_logs and flow_logs rows are copied
+to compressed Parquet files (src/archive.py) before they are deleted.
+Exports read archived ranges as well.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from src import rollups
+from src.metrics import REGISTRY
+
+load_dotenv()
+
+RETENTION_CHUNK = 5000       # rows per DELETE transaction
+CHUNK_PAUSE = 0.05           # seconds between chunks, for the writers' transactions
+
+AGE_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'y': 365 * 86400}
+
+# policy -> (env var, tables)
+POLICIES = {
+    'packets': ('RETAIN_PACKETS', ['packet_logs']),
+    'flows': ('RETAIN_FLOWS', ['flow_logs']),
+    'alerts': ('RETAIN_ALERTS', ['alerts']),
+    'rollups_1m': ('RETAIN_ROLLUPS_1M', [rollups.rollup_table(d, '1m') for d in rollups.DIMENSIONS]),
+    'rollups_1h': ('RETAIN_ROLLUPS_1H', [rollups.rollup_table(d, '1h') for d in rollups.DIMENSIONS]),
+}
+ARCHIVED_TABLES = ('packet_logs', 'flow_logs')
+
+TIME_COLUMNS = {'packet_logs': 'captured_at', 'flow_logs': 'last_seen', 'alerts': 'detected_at'}
+
+ROWS_DELETED = REGISTRY.counter('retention_rows_deleted_total', "Expired rows deleted by retention")
+ROWS_ARCHIVED = REGISTRY.counter('retention_rows_archived_total', "Expired rows copied to the archive before deletion")
+
+def parse_age(text):
+    """'7d', '12h', '1y' -> seconds; '', '0' or 'off' -> None (keep forever)."""
+    text = (text or '').strip().lower()
+    if text in ('', '0', 'off'):
+        return None
+    try:
+        return float(text[:-1]) * AGE_UNITS[text[-1]]
+    except (KeyError, ValueError):
+        raise ValueError(f"'{text}' is not an age like 12h, 7d or 1y")
+
+def load_policies():
+    """{policy: max age in seconds or None} from .env; invalid values are reported and ignored."""
+    policies = {}
+    for policy, (var, _tables) in POLICIES.items():
+        try:
+            policies[policy] = parse_age(os.getenv(var))
+        except ValueError as e:
+            print(f"[!] {var}: {e}")
+            policies[policy] = None
+    return policies
+
+def describe(policies):
+    ages = [f"{policy} {_age_label(age)}" for policy, age in policies.items() if age]
+    return ", ".join(ages) if ages else "keep everything"
+
+def _age_label(seconds):
+    for unit in ('y', 'd', 'h', 'm'):
+        if seconds >= AGE_UNITS[unit] and seconds % AGE_UNITS[unit] == 0:
+            return f"{int(seconds // AGE_UNITS[unit])}{unit}"
+    return f"{seconds:.0f}s"
+
+def partitioning_enabled():
+    return os.getenv('DB_PARTITIONING', '').lower() == 'daily'
+
+def time_column(table):
+    return TIME_COLUMNS.get(table, 'bucket')
+
+def expire_query(table, before, limit, dialect='mysql'):
+    """
+    SQL + params deleting up to `limit` of the oldest rows of `table` older
+    than `before`. Both walk the time index: MySQL with DELETE ... LIMIT,
+    SQLite (no DELETE LIMIT) by deleting up to the time of the limit-th
+    oldest row, which works for the rowid-less rollup tables too.
+    """
+    col = time_column(table)
+    if dialect == 'sqlite':
+        query = f"""
+        DELETE FROM {table} WHERE {col} < ? AND {col} <= COALESCE(
+            (SELECT {col} FROM {table} WHERE {col} < ? ORDER BY {col} LIMIT 1 OFFSET ?), ?)
+        """
+        return query, [before, before, int(limit) - 1, before]
+    return f"DELETE FROM {table} WHERE {col} < FROM_UNIXTIME(%s) ORDER BY {col} LIMIT {int(limit)}", [before]
+
+# --- PASSES ---
+def expire_table(db, table, before, chunk_size=RETENTION_CHUNK, stop=None, pause=0):
+    """Deletes every row of `table` older than `before`, chunk by chunk; returns the count."""
+    deleted = 0
+    while stop is None or not stop.is_set():
+        count = db.delete_expired(table, before, chunk_size)
+        deleted += count
+        ROWS_DELETED.inc(count)
+        if count < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+def archive_table(db, table, before, root, stop=None, pause=0):
+    """
+    Moves rows of `table` older than `before` to the archive, one archive
+    file at a time. Each file is indexed before its rows are deleted, so a
+    crash can at worst archive a file's rows twice, never lose them.
+    """
+    from src.archive import ARCHIVE_FILE_ROWS, append
+    moved = 0
+    while stop is None or not stop.is_set():
+        rows = db.oldest_logs(table, before, ARCHIVE_FILE_ROWS)
+        if not rows:
+            break
+        append(root, table, rows)
+        ROWS_ARCHIVED.inc(len(rows))
+        ids = [row[0] for row in rows]
+        for i in range(0, len(ids), RETENTION_CHUNK):
+            db.delete_logs(table, ids[i:i + RETENTION_CHUNK])
+            if pause:
+                time.sleep(pause)
+        moved += len(rows)
+        if len(rows) < ARCHIVE_FILE_ROWS:
+            break
+    return moved
+
+def run_retention(db, policies=None, archive_root=None, now=None, stop=None, pause=CHUNK_PAUSE):
+    """One pass over every policy; returns {table: (archived, deleted)} for tables that lost rows."""
+    policies = load_policies() if policies is None else policies
+    now = time.time() if now is None else now
+    summary = {}
+    # Before anything is dropped: new rows must never land in pmax
+    db.add_daily_partitions()
+    for policy, age in policies.items():
+        if not age:
+            continue
+        before = now - age
+        for table in POLICIES[policy][1]:
+            if stop is not None and stop.is_set():
+                return summary
+            archived = 0
+            if archive_root and table in ARCHIVED_TABLES:
+                archived = archive_table(db, table, before, archive_root, stop, pause)
+            dropped = db.drop_partitions(before) if table == 'packet_logs' else []
+            deleted = expire_table(db, table, before, RETENTION_CHUNK, stop, pause)
+            if archived or deleted or dropped:
+                summary[table] = (archived, deleted)
+                print(f"[Retention] {table}: rows before {datetime.fromtimestamp(before):%Y-%m-%d %H:%M} expired "
+                      f"({archived} archived, {deleted} deleted"
+                      + (f", {len(dropped)} partition(s) dropped" if dropped else "") + ").")
+    return summary
+
+class RetentionJob(threading.Thread):
+    """Runs run_retention() now and then every `interval` seconds until stop()."""
+
+    def __init__(self, policies=None, interval=None, archive_root=None):
+        super().__init__(name="RetentionJob", daemon=True)
+        from src.archive import archive_root as configured_root
+        self.policies = load_policies() if policies is None else policies
+        self.interval = interval or parse_age(os.getenv('RETENTION_INTERVAL', '1h')) or 3600
+        self.archive_root = archive_root or configured_root()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        from src.storage import get_storage
+        db = get_storage()
+        try:
+            while not self._stop_event.is_set():
+                started = time.monotonic()
+                try:
+                    run_retention(db, self.policies, self.archive_root, stop=self._stop_event)
+                except Exception as e:
+                    print(f"[!] Retention Error: {e}")
+                self._stop_event.wait(max(self.interval - (time.monotonic() - started), 0))
+        finally:
+            db.close()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+def start_retention():
+    """Starts the job if any policy is set or packet_logs is partitioned (a no-op otherwise); returns it or None."""
+    policies = load_policies()
+    if not any(policies.values()) and not partitioning_enabled():
+        return None
+    job = RetentionJob(policies)
+    print(f"[Retention] {describe(policies)}, every {_age_label(job.interval)}"
+          + (f", archiving to {job.archive_root}" if job.archive_root else "") + ".")
+    job.start()
+    return job
@@ -0,0 +1,193 @@
+"""
+Pre-aggregated time-bucket tables for statistics and reports.
+
+Every batch written to packet_logs (or to flow_logs when flows are the
+only thing captured) is also folded into per-minute and per-hour rollups
+(packets and bytes by protocol, by source IP and by destination IP)
+inside the same transaction. Range queries combine whole
+hours from the hourly tables with the minute buckets at the edges, so a
+30-day "top talkers" query reads ~720 hourly buckets per IP instead of
+every raw row.
+
+The SQL builders take a dialect ("mysql" or "sqlite") so both storage
+backends share the same rollup logic. MySQL buckets are TIMESTAMPs,
+SQLite buckets are plain epoch integers.
+"""
+import time
+
+RESOLUTIONS = {'1m': 60, '1h': 3600}
+
+# dimension -> (key column, MySQL type, SQLite type, raw packet_logs column)
+DIMENSIONS = {
+    'protocol': ('protocol', 'TINYINT UNSIGNED', 'INTEGER', 'protocol'),
+    'src': ('ip', 'VARBINARY(16)', 'BLOB', 'src_ip'),
+    'dst': ('ip', 'VARBINARY(16)', 'BLOB', 'dst_ip'),
+}
+
+# Per-dialect SQL fragments: epoch parameter, bucket -> epoch, packed ip -> text
+_DIALECTS = {
+    'mysql': {'ts': 'FROM_UNIXTIME(%s)', 'epoch': 'UNIX_TIMESTAMP({})', 'ntoa': 'INET6_NTOA({})'},
+    'sqlite': {'ts': '?', 'epoch': '{}', 'ntoa': '{}'},
+}
+
+def rollup_table(dimension, resolution):
+    return f"rollup_{dimension}_{resolution}"
+
+def all_rollup_tables():
+    return [rollup_table(d, r) for d in DIMENSIONS for r in RESOLUTIONS]
+
+def rollup_ddl(dimension, resolution, dialect='mysql'):
+    key, mysql_type, sqlite_type, _raw = DIMENSIONS[dimension]
+    if dialect == 'sqlite':
+        return f"""
+        CREATE TABLE IF NOT EXISTS {rollup_table(dimension, resolution)} (
+            bucket INTEGER NOT NULL,
+            {key} {sqlite_type} NOT NULL,
+            packets INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            PRIMARY KEY (bucket, {key})
+        ) WITHOUT ROWID
+        """
+    return f"""
+    CREATE TABLE IF NOT EXISTS {rollup_table(dimension, resolution)} (
+        bucket TIMESTAMP NOT NULL,
+        {key} {mysql_type} NOT NULL,
+        packets BIGINT UNSIGNED NOT NULL,
+        bytes BIGINT UNSIGNED NOT NULL,
+        PRIMARY KEY (bucket, {key})
+    ) ENGINE=InnoDB
+    """
+
+def upsert_sql(dimension, resolution, dialect='mysql'):
+    """Adds a delta to a bucket; on MySQL a NULL bucket means 'the current server time'."""
+    key = DIMENSIONS[dimension][0]
+    seconds = RESOLUTIONS[resolution]
+    if dialect == 'sqlite':
+        return f"""
+        INSERT INTO {rollup_table(dimension, resolution)} (bucket, {key}, packets, bytes)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (bucket, {key}) DO UPDATE SET packets = packets + excluded.packets, bytes = bytes + excluded.bytes
+        """
+    return f"""
+    INSERT INTO {rollup_table(dimension, resolution)} (bucket, {key}, packets, bytes)
+    VALUES (COALESCE(FROM_UNIXTIME(%s), FROM_UNIXTIME(UNIX_TIMESTAMP() DIV {seconds} * {seconds})), %s, %s, %s)
+    ON DUPLICATE KEY UPDATE packets = packets + VALUES(packets), bytes = bytes + VALUES(bytes)
+    """
+
+# Rollup source -> (table, bucket time column, packets, bytes), for backfill_sql()
+BACKFILL_SOURCES = {
+    'packets': ('packet_logs', 'captured_at', 'SUM(weight)', 'SUM(length * weight)'),
+    'flows': ('flow_logs', 'first_seen', 'SUM(packets)', 'SUM(bytes)'),
+}
+
+def backfill_sql(dimension, resolution, source='packets'):
+    """
+    Rebuilds a rollup from the rows in an id range that are not older than
+    a given epoch (used by src.migrate): packet_logs weighted like
+    rollup_deltas(), or flow_logs like flow_rollup_deltas() for flow-only
+    capture.
+    """
+    key, _mysql_type, _sqlite_type, raw = DIMENSIONS[dimension]
+    table, time_col, packets, size = BACKFILL_SOURCES[source]
+    seconds = RESOLUTIONS[resolution]
+    return f"""
+    INSERT INTO {rollup_table(dimension, resolution)} (bucket, {key}, packets, bytes)
+    SELECT FROM_UNIXTIME(UNIX_TIMESTAMP({time_col}) DIV {seconds} * {seconds}) AS b, {raw}, {packets}, {size}
+    FROM {table} WHERE id > %s AND id <= %s AND {time_col} >= FROM_UNIXTIME(%s)
+    GROUP BY b, {raw}
+    ON DUPLICATE KEY UPDATE packets = packets + VALUES(packets), bytes = bytes + VALUES(bytes)
+    """
+
+def rollup_deltas(rows, pack_ip):
+    """
+    Collapses writer rows (src, dst, proto, length, flags, captured_at, weight)
+    into one delta per (table, bucket, key). A row stands for `weight`
+    packets (more than one when capture is sampling, see src/sampling.py).
+    Returns {(dimension, resolution): [args]}.
+    """
+    return _fold(((src, dst, proto, weight, length * weight, captured_at)
+                  for src, dst, proto, length, _flags, captured_at, weight in rows), pack_ip)
+
+def flow_rollup_deltas(rows, pack_ip):
+    """
+    Same as rollup_deltas() for exported flows (src, dst, sport, dport,
+    proto, packets, bytes, flags, first_seen, last_seen). A flow is counted
+    in the bucket it started in; flows last at most the active timeout.
+    """
+    return _fold(((src, dst, proto, packets, size, first_seen)
+                  for src, dst, _sport, _dport, proto, packets, size, _flags, first_seen, _last in rows), pack_ip)
+
+def _fold(entries, pack_ip):
+    deltas = {(d, r): {} for d in DIMENSIONS for r in RESOLUTIONS}
+    for src, dst, proto, packets, length, captured_at in entries:
+        for resolution, seconds in RESOLUTIONS.items():
+            bucket = int(captured_at) // seconds * seconds if captured_at is not None else None
+            for dimension, key in (('protocol', proto), ('src', src), ('dst', dst)):
+                acc = deltas[(dimension, resolution)]
+                counts = acc.get((bucket, key))
+                if counts is None:
+                    counts = acc[(bucket, key)] = [0, 0]
+                counts[0] += packets
+                counts[1] += length
+
+    out = {}
+    for (dimension, resolution), acc in deltas.items():
+        is_ip = dimension != 'protocol'
+        out[(dimension, resolution)] = [
+            (bucket, pack_ip(key) if is_ip else key, packets, size)
+            for (bucket, key), (packets, size) in acc.items()
+        ]
+    return out
+
+def _minute_range(start, end):
+    """Rounds [start, end) outwards to whole minutes; None means unbounded."""
+    start = int(start or 0) // 60 * 60
+    end = -(-int(end if end is not None else time.time() + 60) // 60) * 60
+    return start, end
+
+def range_query(dimension, start=None, end=None, limit=None, order_by='packets', dialect='mysql'):
+    """
+    SQL + params summing a rollup over [start, end) (epoch seconds, None = open).
+    Whole hours come from the hourly table and the partial hours at either
+    end from the minute table.
+    """
+    sql = _DIALECTS[dialect]
+    ts = sql['ts']
+    key = DIMENSIONS[dimension][0]
+    start, end = _minute_range(start, end)
+    hour_start = -(-start // 3600) * 3600
+    hour_end = end // 3600 * 3600
+    select_key = sql['ntoa'].format(key) if key == 'ip' else key
+
+    if hour_start < hour_end:
+        source = f"""
+        SELECT {key}, packets, bytes FROM {rollup_table(dimension, '1h')}
+        WHERE bucket >= {ts} AND bucket < {ts}
+        UNION ALL
+        SELECT {key}, packets, bytes FROM {rollup_table(dimension, '1m')}
+        WHERE (bucket >= {ts} AND bucket < {ts})
+           OR (bucket >= {ts} AND bucket < {ts})
+        """
+        params = [hour_start, hour_end, start, hour_start, hour_end, end]
+    else:
+        source = f"""
+        SELECT {key}, packets, bytes FROM {rollup_table(dimension, '1m')}
+        WHERE bucket >= {ts} AND bucket < {ts}
+        """
+        params = [start, end]
+
+    query = f"SELECT {select_key}, SUM(packets) AS packets, SUM(bytes) AS bytes FROM ({source}) t GROUP BY {key} ORDER BY {order_by} DESC"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return query, params
+
+def series_query(start=None, end=None, resolution='1m', dialect='mysql'):
+    """SQL + params for per-bucket traffic totals (from the protocol rollup)."""
+    sql = _DIALECTS[dialect]
+    start, end = _minute_range(start, end)
+    query = f"""
+    SELECT {sql['epoch'].format('bucket')}, SUM(packets), SUM(bytes) FROM {rollup_table('protocol', resolution)}
+    WHERE bucket >= {sql['ts']} AND bucket < {sql['ts']}
+    GROUP BY bucket ORDER BY bucket
+    """
+    return query, [start, end]
@@ -0,0 +1,134 @@
+"""
+Load shedding for live capture: sample packets instead of losing them.
+
+When the capture thread can't keep up, the kernel silently drops frames
+and every counter downstream is too low by an unknown amount. The
+OverloadController sits in front of packet_callback() and, once the
+pipeline is overloaded, keeps only a sample of the packets. Every kept
+packet carries a weight (1 / sampling probability) that the aggregator,
+flow table, detector and rollups multiply their counters by, so totals
+stay unbiased estimates instead of undercounts.
+
+Overload is judged once per CONTROL_INTERVAL from two signals:
+
+  * busy: the share of wall time the capture thread spent on the CPU,
+    i.e. callback latency times packet rate. Near 1.0 the thread has no
+    slack left and the socket buffer starts to overflow.
+  * queue: how full the storage writers' queues are (a DB that can't
+    keep up backs up there before rows are dropped).
+
+Modes (SAMPLING in .env):
+
+  * adaptive  probabilistic sampling; the weight doubles while overloaded
+              (up to MAX_WEIGHT) and halves again once there is headroom
+  * fixed     1-in-SAMPLING_N while overloaded, every packet otherwise
+  * off       no sampling
+
+Weights are whole numbers (powers of two in adaptive mode) so the integer
+rollup columns stay exact sums of weights. Only the sampled packets are
+written to packet_logs; the rollups and the dashboard are scaled.
+"""
+import os
+import random
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SAMPLING_MODES = ('adaptive', 'fixed', 'off')
+CONTROL_INTERVAL = 1.0       # seconds between overload checks
+CHECK_EVERY = 256            # packets between clock reads
+BUSY_HIGH = 0.9              # capture thread CPU share that counts as overload
+BUSY_LOW = 0.4               # ... and that leaves room to sample less
+QUEUE_HIGH = 0.5             # writer queue fill that counts as overload
+QUEUE_LOW = 0.1
+MAX_WEIGHT = 1024            # adaptive: keep at least 1 packet in 1024
+DEFAULT_FIXED_N = 10
+
+def sampling_mode():
+    mode = os.getenv('SAMPLING', 'adaptive').lower()
+    return mode if mode in SAMPLING_MODES else 'adaptive'
+
+class OverloadController:
+    """
+    Owned by one capture thread. admit() is called for every packet and
+    returns its weight, or 0 when the packet is shed.
+
+    queue_fill is a callable returning the fullest writer queue as a
+    fraction; on_change(weight, busy, queue) is told about every rate
+    change (CaptureSinks records them) and publish(weight, shed) gets the
+    current state after every check (for the dashboard).
+    """
+
+    def __init__(self, mode=None, fixed_n=None, queue_fill=None, on_change=None, publish=None):
+        self.mode = mode or sampling_mode()
+        self.fixed_n = fixed_n or int(os.getenv('SAMPLING_N', DEFAULT_FIXED_N))
+        self.queue_fill = queue_fill or (lambda: 0.0)
+        self.on_change = on_change
+        self.publish = publish
+        self.weight = 1
+        self.kept = 0
+        self.shed = 0
+        self.changes = 0
+        self.busy = 0.0
+        self.queue = 0.0
+        self._seen = 0            # packets since the last fixed-rate sample
+        self._countdown = CHECK_EVERY
+        self._wall = time.monotonic()
+        self._cpu = time.thread_time()
+
+    def admit(self):
+        self._countdown -= 1
+        if not self._countdown:
+            self._countdown = CHECK_EVERY
+            self.check()
+        weight = self.weight
+        if weight == 1:
+            self.kept += 1
+            return 1
+        if self.mode == 'fixed':
+            self._seen += 1
+            keep = self._seen >= weight
+            if keep:
+                self._seen = 0
+        else:
+            keep = random.random() * weight < 1.0
+        if keep:
+            self.kept += 1
+            return weight
+        self.shed += 1
+        return 0
+
+    def check(self, now=None):
+        """Re-evaluates the load; also called from quiet capture loops so sampling winds down."""
+        if self.mode == 'off':
+            return
+        now = now if now is not None else time.monotonic()
+        elapsed = now - self._wall
+        if elapsed < CONTROL_INTERVAL:
+            return
+        cpu = time.thread_time()
+        self.busy = (cpu - self._cpu) / elapsed
+        self.queue = self.queue_fill()
+        self._wall, self._cpu = now, cpu
+
+        weight = self.weight
+        if self.busy > BUSY_HIGH or self.queue > QUEUE_HIGH:
+            weight = self.fixed_n if self.mode == 'fixed' else min(weight * 2, MAX_WEIGHT)
+        elif self.busy < BUSY_LOW and self.queue < QUEUE_LOW:
+            weight = 1 if self.mode == 'fixed' else max(weight // 2, 1)
+        if weight != self.weight:
+            self.weight = weight
+            self._seen = 0
+            self.changes += 1
+            print(f"[Sampling] {'1-in-' + str(weight) if weight > 1 else 'every packet'} "
+                  f"(capture thread {self.busy:.0%} busy, writer queue {self.queue:.0%} full).")
+            if self.on_change:
+                self.on_change(weight, self.busy, self.queue)
+        if self.publish:
+            self.publish(self.weight, self.shed)
+
+    def stats(self):
+        # Additive counters only (multicore sums worker stats); the current
+        # weight is published to the aggregator instead
+        return {'kept': self.kept, 'shed': self.shed, 'changes': self.changes}
@@ -0,0 +1,258 @@
+"""
+Fixed-memory streaming summaries for heavy hitters and distinct counts.
+
+SpaceSaving (Metwally, Agrawal, El Abbadi 2005) keeps at most k keys. For
+a stream of total weight N (packets or bytes), every reported count c
+with error e satisfies
+
+    c - e <= true weight <= c,    e <= N / k
+
+so any key heavier than N/k is guaranteed to be in the summary, and the
+top of the list is exact whenever its counts are well above N/k.
+Merging the summaries of several workers adds their bounds: the error of
+a merged count is at most sum(N_i / k) = N / k.
+
+HyperLogLog (Flajolet et al. 2007) estimates the number of distinct
+values with 2**p one-byte registers. The relative standard error is
+1.04 / sqrt(2**p): 3.3% at the default p=10 (1 KiB per counter), and
+results within 3 standard errors (~10%) are expected 99% of the time.
+Merging is a register-wise max and loses nothing.
+
+TrafficSketch ties them together for the capture side: top sources and
+destinations by packets and by bytes, plus, for every source currently
+in the top-k by packets, HLL counts of the distinct destinations and
+destination ports it has talked to. A source that drops out of the top-k
+loses its HLLs and starts again from zero if it comes back, so fan-out
+figures are lower bounds for sources near the bottom of the list.
+"""
+import heapq
+import math
+from hashlib import blake2b
+
+DEFAULT_K = 256            # keys kept per SpaceSaving summary
+DEFAULT_PRECISION = 10     # HyperLogLog registers = 2**p
+FOLD_BATCH = 8192          # packets buffered before they are folded into the summaries
+
+def _hash64(value):
+    """Deterministic 64-bit hash (Python's hash() is salted per process)."""
+    return int.from_bytes(blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+
+class SpaceSaving:
+    """Top-k by weight with per-key overestimation bounds."""
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.total = 0
+        self.counts = {}      # key -> [count, error]
+        self._heap = []       # (count, key), one entry per key, possibly stale
+
+    def update(self, key, weight=1):
+        self.total += weight
+        entry = self.counts.get(key)
+        if entry is not None:
+            entry[0] += weight
+            return
+        if len(self.counts) < self.k:
+            self.counts[key] = [weight, 0]
+            heapq.heappush(self._heap, (weight, key))
+            return
+        # Replace the smallest counter; the newcomer inherits its count as error
+        floor, victim = self._pop_min()
+        del self.counts[victim]
+        self.counts[key] = [floor + weight, floor]
+        heapq.heappush(self._heap, (floor + weight, key))
+
+    def _pop_min(self):
+        # Counts only grow, so a heap entry is stale when it is below the live
+        # count; refresh it and keep looking.
+        heap = self._heap
+        while True:
+            count, key = heapq.heappop(heap)
+            current = self.counts[key][0]
+            if current == count:
+                return count, key
+            heapq.heappush(heap, (current, key))
+
+    def top(self, limit=5):
+        """[(key, count, error)] heaviest first."""
+        items = heapq.nlargest(limit, self.counts.items(), key=lambda item: item[1][0])
+        return [(key, count, error) for key, (count, error) in items]
+
+    def export_state(self):
+        return {'k': self.k, 'total': self.total,
+                'counts': {key: list(entry) for key, entry in self.counts.items()}}
+
+    @classmethod
+    def merged(cls, states):
+        """Summary equivalent to the union of several export_state() streams."""
+        k = max(state['k'] for state in states)
+        floors = []
+        for state in states:
+            full = len(state['counts']) >= state['k']
+            floors.append(min(c for c, _e in state['counts'].values()) if full else 0)
+
+        combined = {}
+        for key in set().union(*(state['counts'] for state in states)):
+            count = error = 0
+            for state, floor in zip(states, floors):
+                entry = state['counts'].get(key)
+                if entry is None:
+                    # Absent from a full summary: it may still have had up to `floor`
+                    count += floor
+                    error += floor
+                else:
+                    count += entry[0]
+                    error += entry[1]
+            combined[key] = [count, error]
+
+        summary = cls(k)
+        summary.total = sum(state['total'] for state in states)
+        summary.counts = dict(heapq.nlargest(k, combined.items(), key=lambda item: item[1][0]))
+        summary._heap = [(entry[0], key) for key, entry in summary.counts.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+class HyperLogLog:
+    """Distinct-count estimator with a deterministic hash (mergeable across processes)."""
+    __slots__ = ('p', 'registers')
+
+    def __init__(self, p=DEFAULT_PRECISION, registers=None):
+        self.p = p
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << p)
+
+    def add(self, value):
+        self.add_hash(_hash64(value))
+
+    def add_hash(self, h):
+        bits = 64 - self.p
+        idx = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)   # Linear counting for small sets
+        return int(round(estimate))
+
+class TrafficSketch:
+    """
+    Heavy hitters and per-source fan-out, fed once per packet.
+
+    add() only bumps exact per-key counters for the current batch; every
+    FOLD_BATCH packets (and before any read) the batch is folded into the
+    SpaceSaving summaries as weighted updates, which keeps the per-packet
+    cost to a couple of dict operations. Not thread-safe on its own:
+    TrafficAggregator calls it under its lock.
+    """
+
+    def __init__(self, k=DEFAULT_K, precision=DEFAULT_PRECISION):
+        self.k = k
+        self.precision = precision
+        self.summaries = {(dimension, by): SpaceSaving(k)
+                          for dimension in ('src', 'dst') for by in ('packets', 'bytes')}
+        self.fanout = {}        # src -> (HLL of destinations, HLL of destination ports)
+        self._pending = {'src': {}, 'dst': {}}
+        self._pairs = set()
+        self._pending_packets = 0
+
+    def add(self, src, dst, dport, length, weight=1):
+        for dimension, key in (('src', src), ('dst', dst)):
+            counts = self._pending[dimension].get(key)
+            if counts is None:
+                counts = self._pending[dimension][key] = [0, 0]
+            counts[0] += weight
+            counts[1] += length * weight
+        self._pairs.add((src, dst, dport))
+        self._pending_packets += 1
+        if self._pending_packets >= FOLD_BATCH:
+            self.fold()
+
+    def fold(self):
+        """Moves the buffered batch into the summaries and HLLs."""
+        if not self._pending_packets:
+            return
+        for dimension, pending in self._pending.items():
+            packets = self.summaries[(dimension, 'packets')]
+            size = self.summaries[(dimension, 'bytes')]
+            for key, (count, length) in pending.items():
+                packets.update(key, count)
+                size.update(key, length)
+            pending.clear()
+
+        # Each distinct destination/port is hashed once per batch
+        tracked = self.summaries[('src', 'packets')].counts
+        hashes = {}
+        for src, dst, dport in self._pairs:
+            if src not in tracked:
+                continue
+            hlls = self.fanout.get(src)
+            if hlls is None:
+                hlls = self.fanout[src] = (HyperLogLog(self.precision), HyperLogLog(self.precision))
+            h = hashes.get(dst)
+            if h is None:
+                h = hashes[dst] = _hash64(dst)
+            hlls[0].add_hash(h)
+            if dport is not None:
+                h = hashes.get(dport)
+                if h is None:
+                    h = hashes[dport] = _hash64(dport)
+                hlls[1].add_hash(h)
+        self._pairs.clear()
+        for src in [src for src in self.fanout if src not in tracked]:
+            del self.fanout[src]
+        self._pending_packets = 0
+
+    def top(self, dimension='src', by='packets', limit=5):
+        """[(ip, count, error)] heaviest first; see the module docstring for the bounds."""
+        self.fold()
+        return self.summaries[(dimension, by)].top(limit)
+
+    def error_bound(self, dimension='src', by='packets'):
+        """Worst-case overestimate of any reported count (N / k)."""
+        return self.summaries[(dimension, by)].total / self.k
+
+    def distinct(self, src):
+        """(distinct destinations, distinct destination ports) for a tracked source, else None."""
+        self.fold()
+        hlls = self.fanout.get(src)
+        return (hlls[0].count(), hlls[1].count()) if hlls else None
+
+    def export_state(self):
+        self.fold()
+        return {
+            'k': self.k,
+            'precision': self.precision,
+            'summaries': {key: summary.export_state() for key, summary in self.summaries.items()},
+            'fanout': {src: (bytes(dsts.registers), bytes(ports.registers))
+                       for src, (dsts, ports) in self.fanout.items()},
+        }
+
+    @classmethod
+    def merged(cls, states):
+        """Sketch equivalent to the union of several workers' export_state()."""
+        states = list(states)
+        if not states:
+            return cls()
+        sketch = cls(max(state['k'] for state in states), states[0]['precision'])
+        for key in sketch.summaries:
+            sketch.summaries[key] = SpaceSaving.merged([state['summaries'][key] for state in states])
+        tracked = sketch.summaries[('src', 'packets')].counts
+        for state in states:
+            for src, (dsts, ports) in state['fanout'].items():
+                if src not in tracked:
+                    continue
+                hlls = sketch.fanout.get(src)
+                if hlls is None:
+                    sketch.fanout[src] = (HyperLogLog(sketch.precision, dsts), HyperLogLog(sketch.precision, ports))
+                else:
+                    hlls[0].merge(HyperLogLog(sketch.precision, dsts))
+                    hlls[1].merge(HyperLogLog(sketch.precision, ports))
+        return sketch
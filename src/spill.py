@@ -0,0 +1,174 @@
+"""
+Local spill journal for rows the database could not take.
+
+While MySQL is unreachable, DBManager's bulk writes append each batch as
+one JSON line, [options, rows], to SPILL_DIR/<method>.<pid>.jsonl and
+report the rows as stored, so the writers keep draining their queues at
+full speed. Lines are only ever appended and each one is flushed as it
+is written. A crash of our process loses nothing that was spilled; a
+power cut can lose the last few lines (the journal is not fsynced).
+
+When the connection comes back, replay() renames the process's journals
+to *.replay (new spills start a fresh file) and sends the rows back
+through the same bulk method in REPLAY_BATCH-row batches, then deletes
+the file. Journals left by a process that died are picked up once they
+have been idle for ORPHAN_AGE seconds. Besides each reconnect, a replay
+is started after any successful write while replay_due(): rows were
+spilled since the last claim (e.g. by a thread whose write failed just
+as the connection came back), or, checked every ORPHAN_AGE seconds,
+journals are lying on disk. If the database drops again
+mid-replay, the remaining batches spill into a new journal, so a row is
+written at least once. A batch whose commit was lost in transit can be
+written twice. A batch the database rejects for any other reason (the
+bulk method returns fewer rows than it was given) is moved to
+<root>/failed/<method>.<pid>.jsonl, in the same format, instead of being
+deleted with the journal.
+
+HELD is a second journal, in SPILL_DIR/held, for packets that arrive
+while packet_logs still has the v1 layout. It is only replayed once
+src.migrate has upgraded the table.
+
+SPILL_DIR defaults to ~/.netguard/spill and is made absolute at import,
+so a restart from another working directory still finds the journals.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from src.metrics import REGISTRY
+
+SPILL_DIR = os.path.abspath(os.path.expanduser(os.getenv('SPILL_DIR', os.path.join('~', '.netguard', 'spill'))))
+REPLAY_BATCH = 5000       # rows per bulk call on replay
+ORPHAN_AGE = 60           # seconds before another process's journal counts as abandoned
+
+ROWS_SPILLED = REGISTRY.counter('spill_rows_total', "Rows written to the spill journal while the database was down")
+ROWS_REPLAYED = REGISTRY.counter('spill_replayed_rows_total', "Spilled rows sent back to the database")
+_METRICS_LOCK = threading.Lock()    # every writer thread spills, and both journals can replay at once
+
+def _count(metric, rows):
+    with _METRICS_LOCK:
+        metric.inc(rows)
+
+class SpillJournal:
+    def __init__(self, root=SPILL_DIR, reason="Database unreachable"):
+        self.root = root
+        self.reason = reason
+        self._lock = threading.Lock()
+        self._replaying = threading.Lock()
+        self._warned = False
+        self._unclaimed = False     # rows appended since the last claim()
+        self._scanned = 0.0         # last time replay_due() looked on disk
+
+    def _path(self, method):
+        return os.path.join(self.root, f"{method}.{os.getpid()}.jsonl")
+
+    def append(self, method, rows, options=None):
+        """Adds a batch meant for db.<method>(rows, **options)."""
+        line = json.dumps([options or {}, rows], separators=(',', ':'))
+        with self._lock:
+            if not self._warned:
+                print(f"[DB] {self.reason}: holding rows in {self.root}.")
+                self._warned = True
+            os.makedirs(self.root, exist_ok=True)
+            with open(self._path(method), 'a') as f:
+                f.write(line + '\n')
+            self._unclaimed = True
+        _count(ROWS_SPILLED, len(rows))
+
+    def pending(self):
+        return bool(glob.glob(os.path.join(self.root, '*.jsonl*')))
+
+    def replay_due(self):
+        """Cheap check for the write path: anything spilled since the last claim, or journals left on disk."""
+        if self._unclaimed:
+            return True
+        now = time.monotonic()
+        if now - self._scanned < ORPHAN_AGE:
+            return False
+        self._scanned = now
+        return self.pending()
+
+    def claim(self):
+        """Renames our journals and abandoned ones to *.replay-<pid>; returns [(method, path)]."""
+        claimed = []
+        mine = f".{os.getpid()}.jsonl"
+        now = time.time()
+        with self._lock:    # No append may be half-way into a file we rename
+            self._unclaimed = False
+            for path in glob.glob(os.path.join(self.root, '*.jsonl*')):
+                name = os.path.basename(path)
+                try:
+                    if not name.endswith(mine) and now - os.path.getmtime(path) < ORPHAN_AGE:
+                        continue    # Another live process owns it
+                    target = os.path.join(self.root, f"{name.split('.jsonl')[0]}.jsonl.replay-{os.getpid()}")
+                    if path != target:
+                        os.rename(path, target)
+                except FileNotFoundError:
+                    continue        # Someone else claimed it first
+                claimed.append((name.split('.')[0], target))
+        return claimed
+
+    def replay(self, db):
+        """Writes every claimed journal back through db; returns the number of rows stored."""
+        with self._lock:
+            self._warned = False
+        sent = failed = 0
+        for method, path in self.claim():
+            write = getattr(db, method)
+            batch, options = [], None
+            with open(path) as f:
+                for line in f:
+                    try:
+                        line_options, rows = json.loads(line)
+                    except ValueError:
+                        continue    # Torn last line from a crash
+                    if batch and (line_options != options or len(batch) >= REPLAY_BATCH):
+                        stored = self._replay_batch(write, method, batch, options)
+                        sent += stored
+                        failed += len(batch) - stored
+                        batch = []
+                        os.utime(path)  # Still ours: keep it from looking abandoned
+                    options = line_options
+                    batch.extend(rows)
+            if batch:
+                stored = self._replay_batch(write, method, batch, options)
+                sent += stored
+                failed += len(batch) - stored
+            # Every row is now either stored, spilled again or in failed/
+            os.remove(path)
+        if sent:
+            print(f"[DB] Replayed {sent} spilled rows.")
+        if failed:
+            print(f"[!] {failed} spilled rows were rejected by the database; kept in {os.path.join(self.root, 'failed')}.")
+        return sent
+
+    def _replay_batch(self, write, method, batch, options):
+        stored = write(batch, **options)
+        _count(ROWS_REPLAYED, stored)
+        if stored < len(batch):
+            # Bulk writes are one transaction: a short count means none of the batch was stored
+            line = json.dumps([options, batch], separators=(',', ':'))
+            failed_dir = os.path.join(self.root, 'failed')
+            os.makedirs(failed_dir, exist_ok=True)
+            with open(os.path.join(failed_dir, f"{method}.{os.getpid()}.jsonl"), 'a') as f:
+                f.write(line + '\n')
+        return stored
+
+    def replay_in_background(self, db_factory):
+        """Starts replay() on a thread of its own unless one is already running."""
+        if not self._replaying.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.replay(db_factory())
+            except Exception as e:
+                print(f"[!] Spill Replay Error: {e}")
+            finally:
+                self._replaying.release()
+
+        threading.Thread(target=run, name="SpillReplay", daemon=True).start()
+
+JOURNAL = SpillJournal()
+HELD = SpillJournal(os.path.join(SPILL_DIR, 'held'), "packet_logs is still v1 (run 'python -m src.migrate')")
@@ -0,0 +1,319 @@
+import sqlite3
+import time
+from datetime import datetime
+from src import log_query, retention, rollups
+from src.storage import StorageBackend, pack_ip, unpack_ip
+
+class SQLiteStore(StorageBackend):
+    """
+    Embedded single-file backend for single-sensor installs, tests and
+    benchmarks. Runs in WAL mode so the GUI can read while the writer
+    thread commits. Timestamps are stored as epoch seconds (REAL) and
+    rollup buckets as epoch integers.
+    """
+
+    def __init__(self, path="netguard.db"):
+        self.path = path
+        self.connection = None
+        self.connect()
+
+    def connect(self):
+        try:
+            # isolation_level=None: we issue BEGIN/COMMIT ourselves
+            self.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.create_table()
+        except sqlite3.Error as e:
+            print(f"[!] SQLite Open Error: {e}")
+
+    def create_table(self):
+        self.connection.executescript("""
+        CREATE TABLE IF NOT EXISTS packet_logs (
+            id INTEGER PRIMARY KEY,
+            src_ip BLOB NOT NULL,
+            dst_ip BLOB NOT NULL,
+            protocol INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            flags INTEGER NOT NULL DEFAULT 0,
+            weight INTEGER NOT NULL DEFAULT 1,
+            captured_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_captured_at ON packet_logs (captured_at);
+        CREATE INDEX IF NOT EXISTS idx_src_time ON packet_logs (src_ip, captured_at);
+        CREATE INDEX IF NOT EXISTS idx_dst_time ON packet_logs (dst_ip, captured_at);
+        CREATE INDEX IF NOT EXISTS idx_protocol_time ON packet_logs (protocol, captured_at);
+        CREATE TABLE IF NOT EXISTS flow_logs (
+            id INTEGER PRIMARY KEY,
+            src_ip BLOB NOT NULL,
+            dst_ip BLOB NOT NULL,
+            src_port INTEGER NOT NULL,
+            dst_port INTEGER NOT NULL,
+            protocol INTEGER NOT NULL,
+            packets INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            flags INTEGER NOT NULL DEFAULT 0,
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_flow_last_seen ON flow_logs (last_seen);
+        CREATE INDEX IF NOT EXISTS idx_flow_src_time ON flow_logs (src_ip, last_seen);
+        CREATE INDEX IF NOT EXISTS idx_flow_dst_time ON flow_logs (dst_ip, last_seen);
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY,
+            detected_at REAL NOT NULL,
+            kind TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            src_ip BLOB,
+            dst_ip BLOB,
+            detail TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_alert_time ON alerts (detected_at);
+        """)
+        # Files created before sampling stored no weight; every row there is one packet
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(packet_logs)")}
+        if 'weight' not in columns:
+            self.connection.execute("ALTER TABLE packet_logs ADD COLUMN weight INTEGER NOT NULL DEFAULT 1")
+        for dimension in rollups.DIMENSIONS:
+            for resolution in rollups.RESOLUTIONS:
+                self.connection.execute(rollups.rollup_ddl(dimension, resolution, 'sqlite'))
+
+    # --- WRITES ---
+    def log_packets(self, rows):
+        # No separate server clock here, so "now" is simply stamped in Python
+        now = time.time()
+        rows = [(src, dst, proto, length, flags, captured_at if captured_at is not None else now, weight)
+                for src, dst, proto, length, flags, captured_at, weight in rows]
+        args = [(pack_ip(src), pack_ip(dst), proto, length, flags, weight, captured_at)
+                for src, dst, proto, length, flags, captured_at, weight in rows]
+        try:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT INTO packet_logs (src_ip, dst_ip, protocol, length, flags, weight, captured_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                args)
+            for (dimension, resolution), deltas in rollups.rollup_deltas(rows, pack_ip).items():
+                self.connection.executemany(rollups.upsert_sql(dimension, resolution, 'sqlite'), deltas)
+            self.connection.execute("COMMIT")
+            return len(args)
+        except sqlite3.Error as e:
+            print(f"[!] Batch Insert Error: {e}")
+            if self.connection.in_transaction:
+                self.connection.execute("ROLLBACK")
+            return 0
+
+    def log_flows(self, rows, update_rollups=False):
+        args = [(pack_ip(src), pack_ip(dst), sport, dport, proto, packets, size, flags, first_seen, last_seen)
+                for src, dst, sport, dport, proto, packets, size, flags, first_seen, last_seen in rows]
+        try:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT INTO flow_logs (src_ip, dst_ip, src_port, dst_port, protocol, packets, bytes, flags, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                args)
+            if update_rollups:
+                for (dimension, resolution), deltas in rollups.flow_rollup_deltas(rows, pack_ip).items():
+                    self.connection.executemany(rollups.upsert_sql(dimension, resolution, 'sqlite'), deltas)
+            self.connection.execute("COMMIT")
+            return len(args)
+        except sqlite3.Error as e:
+            print(f"[!] Flow Insert Error: {e}")
+            if self.connection.in_transaction:
+                self.connection.execute("ROLLBACK")
+            return 0
+
+    def log_alerts(self, rows):
+        args = [(detected_at, kind, severity, pack_ip(src) if src else None, pack_ip(dst) if dst else None, detail)
+                for detected_at, kind, severity, src, dst, detail in rows]
+        try:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT INTO alerts (detected_at, kind, severity, src_ip, dst_ip, detail) VALUES (?, ?, ?, ?, ?, ?)",
+                args)
+            self.connection.execute("COMMIT")
+            return len(args)
+        except sqlite3.Error as e:
+            print(f"[!] Alert Insert Error: {e}")
+            if self.connection.in_transaction:
+                self.connection.execute("ROLLBACK")
+            return 0
+
+    def purge(self, before=None):
+        tables = ["packet_logs", "flow_logs", "alerts"] + rollups.all_rollup_tables()
+        if before is not None:
+            for table in tables:
+                retention.expire_table(self, table, before)
+            return
+        # An unqualified DELETE is SQLite's truncate: no per-row work
+        self.connection.execute("BEGIN")
+        for table in tables:
+            self.connection.execute(f"DELETE FROM {table}")
+        self.connection.execute("COMMIT")
+
+    # --- RETENTION ---
+    def delete_expired(self, table, before, limit):
+        query, params = retention.expire_query(table, before, limit, 'sqlite')
+        try:
+            self.connection.execute("BEGIN")
+            count = self.connection.execute(query, params).rowcount
+            self.connection.execute("COMMIT")
+            return count
+        except sqlite3.Error as e:
+            print(f"[!] Retention Delete Error: {e}")
+            if self.connection.in_transaction:
+                self.connection.execute("ROLLBACK")
+            return 0
+
+    def oldest_logs(self, table, before, limit):
+        query, params = log_query.range_query(table, None, before, 'sqlite', limit)
+        try:
+            return self._decode_log_rows(table, self.connection.execute(query, params).fetchall())
+        except sqlite3.Error as e:
+            print(f"[!] Retention Query Error: {e}")
+            return []
+
+    def delete_logs(self, table, ids):
+        # Errors propagate and stop the pass; these rows are already archived
+        try:
+            self.connection.execute("BEGIN")
+            self.connection.execute(f"DELETE FROM {table} WHERE id IN ({', '.join('?' * len(ids))})", ids)
+            self.connection.execute("COMMIT")
+        except sqlite3.Error:
+            if self.connection.in_transaction:
+                self.connection.execute("ROLLBACK")
+            raise
+
+    # --- READS ---
+    def protocol_totals(self, start=None, end=None):
+        query, params = rollups.range_query('protocol', start, end, dialect='sqlite')
+        try:
+            return {proto: (packets, size) for proto, packets, size in self.connection.execute(query, params)}
+        except sqlite3.Error as e:
+            print(f"[!] Totals Query Error: {e}")
+            return {}
+
+    def top_talkers(self, dimension='src', start=None, end=None, limit=5, order_by='packets'):
+        query, params = rollups.range_query(dimension, start, end, limit, order_by, dialect='sqlite')
+        try:
+            return [(unpack_ip(ip), packets, size) for ip, packets, size in self.connection.execute(query, params)]
+        except sqlite3.Error as e:
+            print(f"[!] Top Talkers Query Error: {e}")
+            return []
+
+    def traffic_series(self, start=None, end=None, resolution='1m'):
+        query, params = rollups.series_query(start, end, resolution, dialect='sqlite')
+        try:
+            return list(self.connection.execute(query, params))
+        except sqlite3.Error as e:
+            print(f"[!] Series Query Error: {e}")
+            return []
+
+    def recent_packets(self, limit=100):
+        query = """
+        SELECT captured_at, src_ip, dst_ip, protocol, length
+        FROM packet_logs ORDER BY id DESC LIMIT ?
+        """
+        try:
+            return [(datetime.fromtimestamp(ts), unpack_ip(src), unpack_ip(dst), proto, length)
+                    for ts, src, dst, proto, length in self.connection.execute(query, (limit,))]
+        except sqlite3.Error as e:
+            print(f"[!] Recent Rows Query Error: {e}")
+            return []
+
+    def top_flows(self, start=None, end=None, limit=5, order_by='bytes'):
+        query = f"""
+        SELECT src_ip, src_port, dst_ip, dst_port, protocol, SUM(packets) AS packets, SUM(bytes) AS bytes
+        FROM flow_logs WHERE last_seen >= ? AND first_seen < ?
+        GROUP BY src_ip, src_port, dst_ip, dst_port, protocol
+        ORDER BY {order_by} DESC LIMIT ?
+        """
+        params = (start or 0, end if end is not None else time.time() + 1, limit)
+        try:
+            return [(unpack_ip(src), sport, unpack_ip(dst), dport, proto, packets, size)
+                    for src, sport, dst, dport, proto, packets, size in self.connection.execute(query, params)]
+        except sqlite3.Error as e:
+            print(f"[!] Top Flows Query Error: {e}")
+            return []
+
+    def recent_flows(self, limit=100):
+        query = """
+        SELECT last_seen, src_ip, src_port, dst_ip, dst_port, protocol, packets, bytes, flags
+        FROM flow_logs ORDER BY id DESC LIMIT ?
+        """
+        try:
+            return [(datetime.fromtimestamp(ts), unpack_ip(src), sport, unpack_ip(dst), dport, proto, packets, size, flags)
+                    for ts, src, sport, dst, dport, proto, packets, size, flags in self.connection.execute(query, (limit,))]
+        except sqlite3.Error as e:
+            print(f"[!] Recent Flows Query Error: {e}")
+            return []
+
+    def recent_alerts(self, limit=100):
+        query = """
+        SELECT detected_at, kind, severity, src_ip, dst_ip, detail
+        FROM alerts ORDER BY id DESC LIMIT ?
+        """
+        try:
+            return [(datetime.fromtimestamp(ts), kind, severity, unpack_ip(src) if src else None,
+                     unpack_ip(dst) if dst else None, detail)
+                    for ts, kind, severity, src, dst, detail in self.connection.execute(query, (limit,))]
+        except sqlite3.Error as e:
+            print(f"[!] Recent Alerts Query Error: {e}")
+            return []
+
+    def alerts_in_range(self, start=None, end=None, limit=50):
+        query = """
+        SELECT detected_at, kind, severity, src_ip, dst_ip, detail
+        FROM alerts WHERE detected_at >= ? AND detected_at < ?
+        ORDER BY detected_at DESC LIMIT ?
+        """
+        params = (start or 0, end if end is not None else time.time() + 1, limit)
+        try:
+            return [(datetime.fromtimestamp(ts), kind, severity, unpack_ip(src) if src else None,
+                     unpack_ip(dst) if dst else None, detail)
+                    for ts, kind, severity, src, dst, detail in self.connection.execute(query, params)]
+        except sqlite3.Error as e:
+            print(f"[!] Alerts Query Error: {e}")
+            return []
+
+    def search_logs(self, table, log_filter=None, before_id=None, after_id=None, limit=200):
+        query, params = log_query.page_query(table, log_filter, before_id, after_id, limit, 'sqlite')
+        try:
+            rows = self.connection.execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"[!] Log Search Error: {e}")
+            return []
+        if after_id is not None:
+            rows.reverse()
+        return self._decode_log_rows(table, rows)
+
+    def stream_logs(self, table, start=None, end=None, chunk_size=10000):
+        query, params = log_query.range_query(table, start, end, 'sqlite')
+        # Own cursor: other reads on this connection can run between chunks
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield self._decode_log_rows(table, rows)
+        finally:
+            cursor.close()
+
+    def _decode_log_rows(self, table, rows):
+        # Columns ending in _ip come back packed; the time column is epoch seconds
+        _time_col, columns = log_query.LOG_TABLES[table]
+        ips = [i + 1 for i, col in enumerate(columns) if col.endswith('_ip')]
+        out = []
+        for row in rows:
+            row = list(row)
+            row[1] = datetime.fromtimestamp(row[1])
+            for i in ips:
+                row[i] = unpack_ip(row[i])
+            out.append(tuple(row))
+        return out
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
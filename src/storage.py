@@ -0,0 +1,148 @@
+"""
+Storage backend interface.
+
+Everything outside the backends (sniffer, writer, GUI) talks to storage
+through these methods only, so the same pipeline runs on MySQL or on the
+embedded single-file SQLite database. Pick the backend with DB_BACKEND in
+.env ("mysql", the default, or "sqlite" with DB_PATH).
+"""
+import os
+import socket
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def pack_ip(ip):
+    """Text address -> packed bytes, same format as MySQL's INET6_ATON()."""
+    return socket.inet_pton(socket.AF_INET6 if ':' in ip else socket.AF_INET, ip)
+
+def unpack_ip(packed):
+    """Packed bytes -> text address, same as MySQL's INET6_NTOA()."""
+    return socket.inet_ntop(socket.AF_INET6 if len(packed) == 16 else socket.AF_INET, bytes(packed))
+
+class StorageBackend:
+    """
+    Rows handed to log_packets() are (src, dst, proto, length, flags,
+    captured_at, weight) tuples: text addresses, IP protocol number, TCP
+    flag bits, epoch seconds (None = "now") and the number of packets the
+    row stands for (see src/sampling.py). Rows handed to log_flows() are
+    (src, dst, sport, dport, proto, packets, bytes, flags, first_seen,
+    last_seen) tuples as exported by flows.FlowTable. Time ranges are
+    [start, end) in epoch seconds, None meaning unbounded.
+    """
+
+    # --- WRITES ---
+    def log_packets(self, rows):
+        """
+        Stores a batch of (src, dst, proto, length, flags, captured_at, weight)
+        rows in one transaction; returns the number of rows written.
+        """
+        raise NotImplementedError
+
+    def log_packet(self, src, dst, proto, length, flags=0, captured_at=None, weight=1):
+        self.log_packets([(src, dst, proto, length, flags, captured_at, weight)])
+
+    def log_flows(self, rows, update_rollups=False):
+        """
+        Stores a batch of exported flows in flow_logs. update_rollups=True also adds
+        them to the rollup tables, for when packet rows are not being logged.
+        """
+        raise NotImplementedError
+
+    def log_alerts(self, rows):
+        """Stores (detected_at, kind, severity, src, dst, detail) alerts from src.detection."""
+        raise NotImplementedError
+
+    def purge(self, before=None):
+        """
+        Deletes raw rows, flows, alerts and rollups older than `before`
+        (everything if None). A cutoff is applied in short chunks (see
+        src/retention.py), never as one long DELETE.
+        """
+        raise NotImplementedError
+
+    # --- RETENTION ---
+    def delete_expired(self, table, before, limit):
+        """
+        Deletes up to `limit` of the oldest rows of `table` (a log, alerts or
+        rollup table) older than `before`, in one transaction; returns the number deleted.
+        """
+        raise NotImplementedError
+
+    def oldest_logs(self, table, before, limit):
+        """The `limit` oldest packet_logs or flow_logs rows older than `before`, oldest first, in the search_logs() layout."""
+        raise NotImplementedError
+
+    def delete_logs(self, table, ids):
+        """Deletes packet_logs or flow_logs rows by id in one transaction."""
+        raise NotImplementedError
+
+    def add_daily_partitions(self, days_ahead=7):
+        """Keeps a daily-partitioned packet_logs a few days ahead of the clock (MySQL only)."""
+
+    def drop_partitions(self, before):
+        """Drops packet_logs partitions holding only rows older than `before`; returns their names."""
+        return []
+
+    # --- READS ---
+    def protocol_totals(self, start=None, end=None):
+        """{protocol number: (packets, bytes)} for the range."""
+        raise NotImplementedError
+
+    def top_talkers(self, dimension='src', start=None, end=None, limit=5, order_by='packets'):
+        """[(ip, packets, bytes)] for the busiest 'src' or 'dst' addresses."""
+        raise NotImplementedError
+
+    def traffic_series(self, start=None, end=None, resolution='1m'):
+        """[(bucket epoch, packets, bytes)] per minute ('1m') or hour ('1h'), oldest first."""
+        raise NotImplementedError
+
+    def recent_packets(self, limit=100):
+        """[(captured_at datetime, src, dst, proto, length)] newest first."""
+        raise NotImplementedError
+
+    def top_flows(self, start=None, end=None, limit=5, order_by='bytes'):
+        """[(src, sport, dst, dport, proto, packets, bytes)] for the biggest conversations active in the range."""
+        raise NotImplementedError
+
+    def recent_flows(self, limit=100):
+        """[(last_seen datetime, src, sport, dst, dport, proto, packets, bytes, flags)] newest first."""
+        raise NotImplementedError
+
+    def recent_alerts(self, limit=100):
+        """[(detected_at datetime, kind, severity, src, dst, detail)] newest first; src/dst may be None."""
+        raise NotImplementedError
+
+    def alerts_in_range(self, start=None, end=None, limit=50):
+        """Same rows as recent_alerts(), for alerts detected in [start, end), newest first."""
+        raise NotImplementedError
+
+    def search_logs(self, table, log_filter=None, before_id=None, after_id=None, limit=200):
+        """
+        One keyset page of packet_logs or flow_logs (see src/log_query.py),
+        newest first: (id, captured_at datetime, src, dst, proto, length,
+        flags) for packets, (id, last_seen datetime, src, sport, dst, dport,
+        proto, packets, bytes, flags) for flows.
+        """
+        raise NotImplementedError
+
+    def stream_logs(self, table, start=None, end=None, chunk_size=10000):
+        """
+        Every row of packet_logs or flow_logs in [start, end), oldest first,
+        as lists of up to chunk_size rows in the search_logs() layout. Rows
+        come from one streaming cursor, so memory stays flat however large
+        the range; close the generator to stop early.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+def get_storage():
+    """Opens the backend selected in .env; each thread should open its own."""
+    backend = os.getenv('DB_BACKEND', 'mysql').lower()
+    if backend == 'sqlite':
+        from src.sqlite_store import SQLiteStore
+        return SQLiteStore(os.getenv('DB_PATH', 'netguard.db'))
+    from src.database import DBManager
+    return DBManager()
@@ -0,0 +1,120 @@
+"""
+Anomaly detection on synthetic attack pcaps: the single-process scenarios
+of benchmarks/bench_detection.py, the WindowMerger on hand-split counters,
+and MultiCoreCapture with several workers writing to a SQLite store, where
+an attack spread over the shards must still raise exactly one alert.
+"""
+import random
+import pytest
+from benchmarks.bench_detection import ATTACK_AT, SCENARIOS, run_detector
+from benchmarks.traffic import ATTACKS, BASE_TS, background, ip4, ipv4_frame, merged, write_pcap
+from src.detection import AnomalyDetector, WindowMerger, HSCAN_HOSTS, SYN_FLOOD_MIN
+from src.fast_decode import PROTO_TCP, TCP_SYN, decode_packet, flow_hash
+from src.multicore import MultiCoreCapture
+from src.sqlite_store import SQLiteStore
+
+def small_scan(rng, start, hosts=40):
+    """A horizontal scan that stays under HSCAN_HOSTS on each of a few shards."""
+    scanner = ip4("10.9.9.7")
+    return [(start + i / 100, ipv4_frame(scanner, ip4(f"172.16.2.{i}"), PROTO_TCP, 61002, 22, TCP_SYN))
+            for i in range(1, hosts + 1)]
+
+def scenario_pcap(tmp_path, name, attack, seconds=60):
+    rng = random.Random(7)
+    path = str(tmp_path / f"{name}.pcap")
+    write_pcap(path, merged(background(rng, seconds), attack(rng, ATTACK_AT) if attack else []))
+    return path
+
+def run_multicore(tmp_path, monkeypatch, path, workers):
+    db_path = str(tmp_path / "alerts.db")
+    monkeypatch.setenv('DB_BACKEND', 'sqlite')
+    monkeypatch.setenv('DB_PATH', db_path)
+    monkeypatch.setenv('SAMPLING', 'off')
+    monkeypatch.setenv('DETECTION', 'on')
+    MultiCoreCapture(workers=workers, pcap_path=path).run()
+    store = SQLiteStore(db_path)
+    return [alert for alert in store.recent_alerts(1000) if alert[1] != 'sampling']
+
+@pytest.mark.parametrize("name, attack, expected", SCENARIOS)
+def test_scenarios(tmp_path, name, attack, expected):
+    alerts = run_detector(scenario_pcap(tmp_path, name, attack))
+    assert {alert[1] for alert in alerts} == expected
+
+def test_windows_are_aligned():
+    detector = AnomalyDetector(lambda alert: None, window=5)
+    assert detector.watermark() is None
+    detector.expire(BASE_TS + 7.5)
+    assert detector.watermark() == BASE_TS + 5
+    detector.expire(BASE_TS + 23)
+    assert detector.watermark() == BASE_TS + 20
+
+def split_counters(packets, workers, window=5):
+    """Runs one on_window detector per shard, as the workers do; returns their closed windows."""
+    windows = {worker: [] for worker in range(workers)}
+    detectors = {worker: AnomalyDetector(None, window,
+                                         on_window=lambda at, counters, w=worker: windows[w].append((at, counters)))
+                 for worker in range(workers)}
+    for ts, frame in packets:
+        shard = flow_hash(frame) % workers
+        for worker, detector in detectors.items():
+            if worker == shard:
+                detector.add(decode_packet(frame), ts)
+            else:
+                detector.expire(ts)
+    for detector in detectors.values():
+        detector.flush()
+    return windows
+
+def test_merger_sums_shards():
+    packets = ATTACKS['syn_flood'](random.Random(7), ATTACK_AT)
+    windows = split_counters(packets, 3)
+    # Every shard alone is over the threshold, so per-worker checks alerted three times
+    assert all(sum(c['syns'].get('172.16.0.1', 0) for _at, c in shard) >= SYN_FLOOD_MIN
+               for shard in windows.values())
+
+    alerts = []
+    merger = WindowMerger(alerts.append, 3)
+    for worker, shard in windows.items():
+        for at, counters in shard:
+            merger.add_window(worker, at, counters)
+        merger.finish(worker)
+    floods = [alert for alert in alerts if alert[1] == 'syn_flood']
+    assert len(floods) == 1
+    assert floods[0][5].startswith("6000 SYN")
+
+def test_merger_waits_for_every_watermark():
+    alerts = []
+    merger = WindowMerger(alerts.append, 2)
+    syns = {'src_packets': {}, 'dst_packets': {'172.16.0.1': 150}, 'syns': {'172.16.0.1': 150},
+            'acks': {}, 'hosts_by_port': {}, 'ports_by_host': {}}
+    merger.add_window(0, BASE_TS + 5, syns)
+    merger.advance(0, BASE_TS + 5)
+    merger.advance(1, BASE_TS)          # worker 1 hasn't closed that window yet
+    assert alerts == [] and BASE_TS + 5 in merger.pending
+    merger.add_window(1, BASE_TS + 5, syns)
+    merger.advance(1, BASE_TS + 5)
+    assert [alert[1] for alert in alerts] == ['syn_flood']
+    assert merger.pending == {}
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_multicore_syn_flood_alerts_once(tmp_path, monkeypatch, workers):
+    path = scenario_pcap(tmp_path, "syn_flood", ATTACKS['syn_flood'])
+    alerts = run_multicore(tmp_path, monkeypatch, path, workers)
+    floods = [alert for alert in alerts if alert[1] == 'syn_flood']
+    assert len(floods) == 1
+    assert floods[0][4] == '172.16.0.1'
+    assert floods[0][5].startswith("6000 SYN")
+    assert {alert[1] for alert in alerts} == {'syn_flood', 'rate_spike'}
+
+def test_multicore_catches_scan_split_over_workers(tmp_path, monkeypatch):
+    packets = small_scan(None, ATTACK_AT)
+    shards = {flow_hash(frame) % 4 for _ts, frame in packets}
+    per_shard = max(sum(1 for _ts, frame in packets if flow_hash(frame) % 4 == shard) for shard in shards)
+    assert len(shards) > 1 and per_shard < HSCAN_HOSTS    # no single worker sees enough
+
+    path = scenario_pcap(tmp_path, "small_scan", small_scan)
+    alerts = run_multicore(tmp_path, monkeypatch, path, 4)
+    scans = [alert for alert in alerts if alert[1] == 'horizontal_scan']
+    assert len(scans) == 1
+    assert scans[0][3] == '10.9.9.7'
+    assert {alert[1] for alert in alerts} == {'horizontal_scan'}
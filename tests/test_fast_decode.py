@@ -0,0 +1,75 @@
+"""
+decode_frame() against scapy's dissection (decode_with_scapy) on a seeded
+corpus of generated frames: every record field must match.
+"""
+import random
+import pytest
+from scapy.all import (Ether, Dot1Q, IP, IPv6, TCP, UDP, ICMP, Raw, CookedLinux,
+                       IPv6ExtHdrHopByHop, IPv6ExtHdrDestOpt, IPv6ExtHdrFragment, ICMPv6EchoRequest)
+from src.fast_decode import (DLT_EN10MB, DLT_LINUX_SLL, DLT_RAW, decode_frame, decode_packet,
+                             decode_with_scapy)
+
+CORPUS_SIZE = 400
+
+def _v4(rng):
+    return ".".join(str(rng.randrange(1, 255)) for _ in range(4))
+
+def _v6(rng):
+    return "2001:db8::" + ":".join(f"{rng.randrange(1, 0xFFFF):x}" for _ in range(3))
+
+def _transport(rng, v6):
+    kind = rng.choice(['tcp', 'udp', 'icmp'])
+    sport, dport = rng.randrange(1, 65536), rng.randrange(1, 65536)
+    if kind == 'tcp':
+        return TCP(sport=sport, dport=dport, flags=rng.randrange(0, 0x200))
+    if kind == 'udp':
+        return UDP(sport=sport, dport=dport)
+    return ICMPv6EchoRequest() if v6 else ICMP(type=rng.choice([0, 3, 8, 11]), code=rng.randrange(0, 4))
+
+def _frame(rng):
+    """(bytes, linktype) for one random frame."""
+    v6 = rng.random() < 0.4
+    if v6:
+        ip = IPv6(src=_v6(rng), dst=_v6(rng))
+        ext = rng.choice([None, IPv6ExtHdrHopByHop(), IPv6ExtHdrDestOpt(), IPv6ExtHdrFragment(m=1, id=rng.randrange(1 << 32))])
+        if ext is not None:
+            ip = ip / ext
+    else:
+        ip = IP(src=_v4(rng), dst=_v4(rng), ttl=rng.randrange(1, 256))
+    packet = ip / _transport(rng, v6) / Raw(bytes(rng.randrange(0, 64)))
+    link = rng.choice(['ether', 'vlan', 'qinq', 'sll', 'raw'])
+    if link == 'raw':
+        return bytes(packet), DLT_RAW
+    if link == 'sll':
+        return bytes(CookedLinux(pkttype=0, proto=0x86DD if v6 else 0x0800) / packet), DLT_LINUX_SLL
+    frame = Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02")
+    if link in ('vlan', 'qinq'):
+        frame = frame / Dot1Q(vlan=rng.randrange(1, 4095))
+    if link == 'qinq':
+        frame = frame / Dot1Q(vlan=rng.randrange(1, 4095))
+    return bytes(frame / packet), DLT_EN10MB
+
+def corpus(size=CORPUS_SIZE, seed=7):
+    rng = random.Random(seed)
+    return [_frame(rng) for _ in range(size)]
+
+@pytest.mark.parametrize("data,linktype", corpus())
+def test_matches_scapy(data, linktype):
+    assert decode_frame(data, linktype) == decode_with_scapy(data, linktype)
+
+def test_ipv4_non_first_fragment_has_no_ports():
+    data = bytes(Ether() / IP(src="10.0.0.1", dst="10.0.0.2", frag=185) / Raw(b"x" * 40))
+    record = decode_frame(data)
+    assert record == decode_with_scapy(data)
+    assert (record.sport, record.dport, record.flags) == (0, 0, 0)
+
+def test_truncated_frame_keeps_wire_length():
+    data = bytes(Ether() / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=1234, dport=80, flags="S") / Raw(b"x" * 500))
+    record = decode_frame(data[:54], wire_len=len(data))
+    assert (record.length, record.sport, record.dport, record.flags) == (len(data), 1234, 80, 0x02)
+
+def test_non_ip_frame():
+    assert decode_frame(bytes(Ether(type=0x0806) / Raw(b"\x00" * 28))) is None
+
+def test_malformed_frame_falls_back():
+    assert decode_packet(b"\x00" * 10) is None
@@ -0,0 +1,104 @@
+"""
+The error bounds stated in src/sketches.py, checked on seeded synthetic
+streams: SpaceSaving never under- or overestimates by more than N/k, and
+HyperLogLog stays within 3 standard errors (1.04 / sqrt(2**p)) of the
+true distinct count.
+"""
+import random
+from collections import Counter
+import pytest
+from src.sketches import HyperLogLog, SpaceSaving, TrafficSketch
+
+def zipf_stream(length, keys, seed, s=1.1):
+    """Heavy-tailed key stream, like per-host packet counts."""
+    rng = random.Random(seed)
+    weights = [1 / (rank ** s) for rank in range(1, keys + 1)]
+    return rng.choices([f"10.0.{i // 256}.{i % 256}" for i in range(keys)], weights, k=length)
+
+def check_space_saving(summary, truth, k):
+    bound = summary.total / k
+    assert summary.total == sum(truth.values())
+    for key, (count, error) in summary.counts.items():
+        assert count - error <= truth[key] <= count
+        assert error <= bound
+    # Every key heavier than N/k must have been kept
+    for key, weight in truth.items():
+        if weight > bound:
+            assert key in summary.counts
+
+@pytest.mark.parametrize("k", [16, 64, 256])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_space_saving_bounds(k, seed):
+    stream = zipf_stream(50000, 5000, seed)
+    summary = SpaceSaving(k)
+    for key in stream:
+        summary.update(key)
+    check_space_saving(summary, Counter(stream), k)
+
+def test_space_saving_weighted_bounds():
+    rng = random.Random(4)
+    stream = [(key, rng.randint(40, 1500)) for key in zipf_stream(30000, 3000, 4)]
+    truth = Counter()
+    summary = SpaceSaving(64)
+    for key, size in stream:
+        summary.update(key, size)
+        truth[key] += size
+    check_space_saving(summary, truth, 64)
+
+def test_space_saving_merged_bounds():
+    k = 64
+    stream = zipf_stream(60000, 5000, 5)
+    workers = [SpaceSaving(k) for _ in range(3)]
+    # Half the keys are sharded by value (like flow hashing), the rest round-robin
+    for i, key in enumerate(stream):
+        workers[len(key) % 3 if i % 2 else i % 3].update(key)
+    merged = SpaceSaving.merged([worker.export_state() for worker in workers])
+    check_space_saving(merged, Counter(stream), k)
+
+def test_space_saving_exact_below_capacity():
+    summary = SpaceSaving(100)
+    stream = zipf_stream(5000, 50, 6)
+    for key in stream:
+        summary.update(key)
+    assert {key: count for key, (count, error) in summary.counts.items()} == Counter(stream)
+    assert all(error == 0 for _count, error in summary.counts.values())
+
+@pytest.mark.parametrize("p", [8, 10, 12])
+@pytest.mark.parametrize("cardinality", [50, 1000, 20000, 200000])
+def test_hyperloglog_relative_error(p, cardinality):
+    hll = HyperLogLog(p)
+    for i in range(cardinality):
+        hll.add(f"192.168.{i}")
+    tolerance = 3 * 1.04 / (1 << p) ** 0.5
+    assert abs(hll.count() - cardinality) / cardinality <= tolerance
+
+def test_hyperloglog_merge_is_lossless():
+    whole, parts = HyperLogLog(), [HyperLogLog() for _ in range(4)]
+    for i in range(30000):
+        value = f"port-{i}"
+        whole.add(value)
+        parts[i % 4].add(value)
+        parts[(i * 7) % 4].add(value)   # overlap between workers
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.registers == whole.registers
+
+def test_traffic_sketch_bounds_and_fanout():
+    sketch = TrafficSketch(k=32)
+    truth = Counter()
+    for src in zipf_stream(40000, 2000, 7):
+        sketch.add(src, "10.9.9.9", 443, 100)
+        truth[src] += 1
+    # One scanner reaching 3000 distinct hosts on 500 ports
+    for i in range(3000):
+        sketch.add("10.66.66.66", f"172.16.{i // 256}.{i % 256}", 1 + i % 500, 60)
+        truth["10.66.66.66"] += 1
+    bound = sketch.error_bound('src', 'packets')
+    for src, count, error in sketch.top('src', 'packets', limit=10):
+        assert count - error <= truth[src] <= count
+        assert error <= bound
+    hosts, ports = sketch.distinct("10.66.66.66")
+    tolerance = 3 * 1.04 / (1 << sketch.precision) ** 0.5
+    assert abs(hosts - 3000) / 3000 <= tolerance
+    assert abs(ports - 500) / 500 <= tolerance